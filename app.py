@@ -1,14 +1,34 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Blueprint, request, jsonify, render_template, Response, stream_with_context
 import os
 import json
+import atexit
+import socket
 import subprocess
-import google.generativeai as genai
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
 import logging
+import threading
 import time
+import queue
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError
+from llm_cache import LLMResponseCache, ttls_from_env
+from backends import get_backend
+from result_digest import ResultDigester
+from llm_governor import governor_from_env
+from plan_templates import PlanTemplateRegistry, BUILTIN_TEMPLATES
+from speculation import SpeculationTracker, guess_search_query
+from report_engine import ReportEngine, REPORT_MODES, choose_report_mode
+from plan_graph import plan_dependencies, is_critical, step_number
+from deadline import Deadline, DeadlineExceeded, TimeoutCounter
+from jobs import JobManager, JobQueueFull
+from history import HistoryStore, entry_kind
+from html_parsing import PREVIEW_LENGTH, ParsePool, PagePreview, declared_charset, parse_page, parse_serp
+from http_client import HttpClient, FetchStats, DEFAULT_USER_AGENT
+from http_cache import HttpCache
+from enrichment import ResultEnricher
+from search_cache import SearchCache
+from local_index import LatencyStats, LocalIndex
+from cancellation import CancellationToken, JobCancelled, kill_process_tree, popen_group_options
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -17,9 +37,53 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Configure Google Generative AI
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
+MODEL_NAME = 'gemini-1.5-flash'
+EXAMPLE_API_KEY = "EXAMPLE_API_KEY_FOR_DEVELOPMENT_ONLY"
+
+# Gemini model parameters for better results
+generation_config = {
+    "temperature": 0.2,  # Lower temperature for more deterministic outputs
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+}
+
+safety_settings = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    }
+]
+
+# The Gemini client, the model and the API key check are all initialized on first use
+# so that importing this module never touches the network
+_genai = None
+_model = None
+_model_generation_config = None
+_init_lock = threading.Lock()
+
+# Result of the background API key validation, cached for /api/health
+api_key_state = {"status": "unchecked", "valid": None, "error": None, "checked_at": None}
+_api_key_checked = threading.Event()
+
+def resolve_api_key():
+    """Read the Google API key from the environment"""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if api_key:
+        return api_key
+
     logger.error("GOOGLE_API_KEY not found in environment variables")
     print("\n" + "=" * 60)
     print("ERROR: GOOGLE_API_KEY not found in environment variables")
@@ -34,92 +98,866 @@ if not GOOGLE_API_KEY:
     # In production, this should be removed
     if os.path.exists(".env.example"):
         print("Using example API key for development purposes only.")
-        GOOGLE_API_KEY = "EXAMPLE_API_KEY_FOR_DEVELOPMENT_ONLY"
+        os.environ["GOOGLE_API_KEY"] = EXAMPLE_API_KEY
+        return EXAMPLE_API_KEY
+    raise ValueError("GOOGLE_API_KEY not found in environment variables")
+
+def get_genai():
+    """Import and configure the Google Generative AI client on first use"""
+    global _genai
+    if _genai is None:
+        with _init_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=resolve_api_key())
+                _genai = genai
+    return _genai
+
+def get_model():
+    """Return the shared Gemini model, creating it on first use"""
+    global _model, _model_generation_config
+    if _model is None:
+        genai = get_genai()
+        with _init_lock:
+            if _model is None:
+                try:
+                    _model = genai.GenerativeModel(
+                        model_name=MODEL_NAME,
+                        generation_config=generation_config,
+                        safety_settings=safety_settings
+                    )
+                    _model_generation_config = generation_config
+                    logger.info("Gemini model initialized successfully with custom configuration")
+                except Exception as e:
+                    logger.error(f"Error initializing Gemini model with custom configuration: {str(e)}")
+                    # Fall back to default configuration
+                    _model = genai.GenerativeModel(MODEL_NAME)
+                    _model_generation_config = {}
+                    logger.info("Gemini model initialized with default configuration")
+    return _model
+
+def validate_api_key():
+    """Check the API key with a small Gemini request and cache the outcome"""
+    try:
+        if resolve_api_key() == EXAMPLE_API_KEY:
+            logger.warning("Using example API key - AI features will be limited")
+            valid, error_message = False, "Using example API key"
+        else:
+            test_model = get_genai().GenerativeModel(MODEL_NAME)
+            test_model.generate_content("Hello")
+            logger.info("API key validated successfully")
+            valid, error_message = True, None
+    except Exception as e:
+        valid, error_message = False, str(e)
+        logger.error(f"Error configuring Google Generative AI: {str(e)}")
+        print("\n" + "=" * 60)
+        print(f"ERROR: Failed to configure Google Generative AI: {str(e)}")
+        print("=" * 60)
+        print("\nPlease check your API key and internet connection.")
+        print("=" * 60 + "\n")
+
+        # For development purposes, we'll continue without raising an exception
+        print("Continuing in development mode with limited functionality.")
+        print("The AI features will not work, but you can test the UI.")
+
+    api_key_state.update({
+        "status": "valid" if valid else "invalid",
+        "valid": valid,
+        "error": error_message,
+        "checked_at": datetime.now().isoformat()
+    })
+    _api_key_checked.set()
+    return valid
+
+def start_api_key_validation():
+    """Validate the API key on a background thread (only the first call starts a check)"""
+    with _init_lock:
+        if api_key_state["status"] != "unchecked":
+            return
+        api_key_state["status"] = "pending"
+    threading.Thread(target=validate_api_key, name="api-key-validation", daemon=True).start()
+
+def wait_for_api_key_validation(timeout=None):
+    """Block until the background API key check finishes and return whether the key is valid"""
+    _api_key_checked.wait(timeout)
+    return api_key_state["valid"]
+
+def api_key_rejected():
+    """True once the background check has found the API key to be missing or invalid"""
+    return api_key_state["valid"] is False
+
+# Cache Gemini responses so that identical prompts skip the LLM round trip
+response_cache = LLMResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+    ttls=ttls_from_env(),
+    disk_dir=os.getenv("LLM_CACHE_DIR") or None
+)
+
+# Every Gemini call that misses the cache waits its turn here, planning ahead of reports
+llm_governor = governor_from_env()
+
+# Well-known instruction shapes are planned from templates instead of a planning call
+plan_templates = PlanTemplateRegistry(
+    BUILTIN_TEMPLATES,
+    max_learned=int(os.getenv("PLAN_TEMPLATES_MAX_LEARNED", "200")),
+    learn=os.getenv("PLAN_TEMPLATES_LEARN", "true").lower() == "true"
+)
+
+# Bounded pool for running independent LLM calls of a single step concurrently
+llm_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_MAX_PARALLEL_CALLS", "4")),
+    thread_name_prefix="llm"
+)
+
+# Independent steps of one plan that may run at the same time. Each plan gets its own
+# pool, so the steps of concurrent requests never queue behind each other
+PLAN_MAX_PARALLEL_STEPS = int(os.getenv("PLAN_MAX_PARALLEL_STEPS", "4"))
+
+# Likely first searches are started while the planning call is in flight
+SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "true").lower() == "true"
+speculation_tracker = SpeculationTracker()
+speculation_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPECULATIVE_SEARCH_WORKERS", "2")),
+    thread_name_prefix="speculation"
+)
+
+# Reports of simple jobs are rendered from templates instead of written by Gemini
+REPORT_MODE = os.getenv("REPORT_MODE", "auto")
+REPORT_LLM_COMPLEXITY_THRESHOLD = int(os.getenv("REPORT_LLM_COMPLEXITY_THRESHOLD", "4"))
+report_engine = ReportEngine()
+
+# Time budget of a request, and caps for the individual calls made within it
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "300"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "15"))
+TERMINAL_TIMEOUT_SECONDS = float(os.getenv("TERMINAL_TIMEOUT_SECONDS", "30"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+timeout_counter = TimeoutCounter()
+
+# Pooled keep-alive sessions with retries for every web fetch
+http_client = HttpClient(
+    pool_hosts=int(os.getenv("HTTP_POOL_HOSTS", "10")),
+    per_host_connections=int(os.getenv("HTTP_POOL_PER_HOST", "10")),
+    max_retries=int(os.getenv("HTTP_MAX_RETRIES", "3")),
+    backoff_factor=float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5")),
+    user_agent=os.getenv("HTTP_USER_AGENT", DEFAULT_USER_AGENT)
+)
+
+# On-disk cache of fetched pages with ETag/Last-Modified revalidation, opened on first use
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+_http_cache = None
+
+def get_http_cache():
+    """Return the page cache, opening it on first use; None when it is disabled"""
+    global _http_cache
+    if _http_cache is None and HTTP_CACHE_ENABLED:
+        with _init_lock:
+            if _http_cache is None:
+                _http_cache = HttpCache(
+                    os.getenv("HTTP_CACHE_DIR", os.path.join(".cache", "http")),
+                    max_bytes=int(os.getenv("HTTP_CACHE_MAX_MB", "100")) * 1024 * 1024,
+                    swr_seconds=float(os.getenv("HTTP_CACHE_SWR_SECONDS", "300")),
+                    hot_after=int(os.getenv("HTTP_CACHE_HOT_AFTER", "3"))
+                )
+    return _http_cache
+
+def active_http_cache():
+    """The page cache when fetching live; recorded and replayed runs make every fetch themselves"""
+    return get_http_cache() if get_backend().mode == "live" else None
+
+# Worker processes for HTML parsing; 0 parses on the calling thread
+HTML_PARSE_WORKERS = int(os.getenv("HTML_PARSE_WORKERS", "0"))
+# "targeted" parses only the elements that are read, with lxml when installed; "full" builds the whole tree
+HTML_PARSE_MODE = os.getenv("HTML_PARSE_MODE", "targeted")
+
+# "stream" reads pages for "navigate to" in chunks and stops once the title and preview are
+# known; "full" downloads and parses the whole page
+PAGE_FETCH_MODE = os.getenv("PAGE_FETCH_MODE", "stream")
+PAGE_FETCH_MAX_BYTES = int(os.getenv("PAGE_FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+PAGE_FETCH_CHUNK_BYTES = 16 * 1024
+page_fetch_stats = FetchStats()
+
+# SerpAPI results cached on the normalized query, with identical searches in flight shared
+SERPAPI_CACHE_ENABLED = os.getenv("SERPAPI_CACHE_ENABLED", "true").lower() == "true"
+search_cache = SearchCache(
+    ttl=float(os.getenv("SERPAPI_CACHE_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("SERPAPI_CACHE_MAX_ENTRIES", "500")),
+    fetch_num=int(os.getenv("SERPAPI_FETCH_NUM", "10"))
+) if SERPAPI_CACHE_ENABLED else None
+
+# Fetching the pages of the top search results to give extraction steps their text
+ENRICH_TOP_N = int(os.getenv("ENRICH_TOP_N", "3"))
+ENRICH_MAX_WORKERS = int(os.getenv("ENRICH_MAX_WORKERS", "4"))
+ENRICH_PER_HOST = int(os.getenv("ENRICH_PER_HOST", "2"))
+ENRICH_BUDGET_SECONDS = float(os.getenv("ENRICH_BUDGET_SECONDS", "8"))
+ENRICH_TEXT_CHARS = int(os.getenv("ENRICH_TEXT_CHARS", "2000"))
+parse_pool = ParsePool(HTML_PARSE_WORKERS)
+
+# Entries kept in an agent's history before the oldest are evicted
+HISTORY_MAX_ENTRIES = int(os.getenv("HISTORY_MAX_ENTRIES", "500"))
+
+# The Gemini client cannot be given a timeout, so timed calls are waited for on this pool
+llm_call_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+
+def _call_with_timeout(fn, timeout, what):
+    """Run fn, raising DeadlineExceeded if it has not returned within timeout seconds"""
+    if timeout is None:
+        return fn()
+    future = llm_call_executor.submit(fn)
+    try:
+        return future.result(timeout=timeout)
+    except FuturesTimeoutError:
+        # The call keeps running in the background; its result is dropped
+        raise DeadlineExceeded(f"{what} timed out after {timeout:.1f}s")
+
+# Marks the end of a stream read by _stream_with_timeout
+_STREAM_END = object()
+
+def _stream_with_timeout(fn, timeout, what):
+    """Iterate the stream returned by fn, raising DeadlineExceeded once timeout seconds have passed
+
+    The stream is read on llm_call_executor, so waiting for the governor or for a chunk
+    that never comes is bounded too. An abandoned stream stops at its next chunk.
+    """
+    if timeout is None:
+        yield from fn()
+        return
+    deadline = Deadline(timeout)
+    chunks = queue.Queue()
+    abandoned = threading.Event()
+
+    def produce():
+        stream = fn()
+        try:
+            for chunk in stream:
+                if abandoned.is_set():
+                    return
+                chunks.put((chunk, None))
+            chunks.put((_STREAM_END, None))
+        except Exception as e:
+            chunks.put((_STREAM_END, e))
+        finally:
+            # Releases the governor slot of a stream given up on
+            stream.close()
+
+    llm_call_executor.submit(produce)
+    try:
+        while True:
+            try:
+                chunk, error = chunks.get(timeout=deadline.remaining())
+            except queue.Empty:
+                raise DeadlineExceeded(f"{what} timed out after {timeout:.1f}s")
+            if error is not None:
+                raise error
+            if chunk is _STREAM_END:
+                return
+            yield chunk
+    finally:
+        abandoned.set()
+
+def _cache_key(prompt):
+    config = _model_generation_config if _model is not None else generation_config
+    return response_cache.make_key(MODEL_NAME, config, prompt)
+
+def generate_content(prompt, call_type="general", bypass_cache=False, timeout=None):
+    """Generate a response with Gemini, serving identical prompts from the response cache
+
+    With a timeout, DeadlineExceeded is raised if no response has arrived in time,
+    including the time spent waiting for the governor.
+    """
+    key = _cache_key(prompt)
+
+    if bypass_cache:
+        response_cache.record_bypass()
     else:
-        raise ValueError("GOOGLE_API_KEY not found in environment variables")
-
-# Initialize API key validity flag
-api_key_valid = True
-
-try:
-    genai.configure(api_key=GOOGLE_API_KEY)
-    # Test the API key with a simple request
-    if GOOGLE_API_KEY != "EXAMPLE_API_KEY_FOR_DEVELOPMENT_ONLY":
-        test_model = genai.GenerativeModel('gemini-1.5-flash')
-        test_model.generate_content("Hello")
-        logger.info("API key validated successfully")
-        api_key_valid = True
+        cached_text = response_cache.get(key, call_type)
+        if cached_text is not None:
+            logger.info(f"LLM cache hit for {call_type} prompt")
+            return cached_text
+
+    response_text = _call_with_timeout(
+        lambda: llm_governor.call(
+            lambda: get_backend().llm_generate(call_type, prompt, lambda: get_model().generate_content(prompt).text),
+            call_type=call_type
+        ),
+        timeout, f"Gemini {call_type} call"
+    )
+    response_cache.set(key, call_type, response_text)
+    return response_text
+
+def generate_content_stream(prompt, call_type="general", bypass_cache=False, timeout=None):
+    """Stream a Gemini response as text chunks, caching the complete text once it has arrived
+
+    With a timeout, DeadlineExceeded is raised once it has passed, including while
+    waiting for the governor or for the first chunk.
+    """
+    key = _cache_key(prompt)
+
+    if bypass_cache:
+        response_cache.record_bypass()
     else:
-        api_key_valid = False
-        logger.warning("Using example API key - AI features will be limited")
-except Exception as e:
-    api_key_valid = False
-    logger.error(f"Error configuring Google Generative AI: {str(e)}")
-    print("\n" + "=" * 60)
-    print(f"ERROR: Failed to configure Google Generative AI: {str(e)}")
-    print("=" * 60)
-    print("\nPlease check your API key and internet connection.")
-    print("=" * 60 + "\n")
+        cached_text = response_cache.get(key, call_type)
+        if cached_text is not None:
+            logger.info(f"LLM cache hit for {call_type} prompt")
+            yield cached_text
+            return
+
+    def live_stream():
+        for chunk in get_model().generate_content(prompt, stream=True):
+            yield chunk.text
+
+    chunks = []
+    stream = lambda: llm_governor.stream(lambda: get_backend().llm_stream(call_type, prompt, live_stream), call_type=call_type)
+    for text in _stream_with_timeout(stream, timeout, f"Gemini {call_type} stream"):
+        chunks.append(text)
+        yield text
+    response_cache.set(key, call_type, "".join(chunks))
+
+def http_get(url, cancel_token=None, use_cache=True, **kwargs):
+    """Fetch a URL through the page cache and the active backend
+
+    With a cancel token the body is read in chunks and the connection is closed as soon
+    as the token is cancelled, so a cancelled job does not wait for a slow download.
+    """
+    def fetch(extra_headers, cancel_token=cancel_token):
+        call_kwargs = dict(kwargs)
+        if extra_headers:
+            call_kwargs["headers"] = {**(kwargs.get("headers") or {}), **extra_headers}
+        if cancel_token is None:
+            return get_backend().http_get(url, lambda: http_client.get(url, **call_kwargs))
+        return get_backend().http_get(url, lambda: _cancellable_get(url, cancel_token, **call_kwargs))
+
+    http_cache = active_http_cache() if use_cache else None
+    if http_cache is None:
+        return fetch(None)
+    # Background revalidations outlive the request, so they do not use its cancel token
+    return http_cache.get(url, fetch, background_fetch=lambda extra_headers: fetch(extra_headers, cancel_token=None))
+
+def _abort_response(response):
+    """Shut down the socket of a streamed response, waking up a read blocked on it"""
+    connection = getattr(response.raw, "connection", None) or getattr(response.raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        # A connection that closes after this response has handed its socket to the reader
+        reader = getattr(getattr(response.raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(reader, "raw", None), "_sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+def _cancellable_get(url, cancel_token, **kwargs):
+    cancel_token.check()
+    response = http_client.get(url, stream=True, **kwargs)
+    unregister = cancel_token.on_cancel(lambda: _abort_response(response))
+    try:
+        chunks = []
+        for chunk in response.iter_content(chunk_size=65536):
+            cancel_token.check()
+            chunks.append(chunk)
+        response._content = b"".join(chunks)
+        response._content_consumed = True
+        return response
+    except Exception:
+        # A read failing because the connection was closed on cancel is a cancellation
+        cancel_token.check()
+        raise
+    finally:
+        unregister()
+
+def fetch_page(url, cancel_token=None, parse_timeout=None, preview_length=PREVIEW_LENGTH, **kwargs):
+    """Title and text preview of a page, and how it was fetched
+
+    Fresh pages come from the page cache, which only live runs use, so a recording
+    holds every fetch and a replay does not depend on what is cached. Otherwise, with the live backend and
+    PAGE_FETCH_MODE=stream, the body is fed to an incremental parser as it arrives and
+    the download stops once the preview is complete or PAGE_FETCH_MAX_BYTES were read.
+    What was read goes into the page cache, and a stale stored page is revalidated with
+    a conditional request. Recording and replaying need whole responses, so they use
+    the full fetch.
+    """
+    http_cache = active_http_cache()
+    stored = http_cache.lookup(url) if http_cache is not None else None
+    if stored is not None and stored["fresh"]:
+        page = _stored_page(stored["response"], stored["partial"], parse_timeout, preview_length)
+        if page is not None:
+            http_cache.record_hit()
+            return page, {"source": "cache", "bytes_downloaded": 0, "ttfb_ms": None}
+
+    if PAGE_FETCH_MODE == "stream" and get_backend().mode == "live":
+        page, info = _streamed_page(url, cancel_token, preview_length, stored, parse_timeout, **kwargs)
+    else:
+        start = time.perf_counter()
+        response = http_get(url, cancel_token=cancel_token, **kwargs)
+        info = {"source": "network", "bytes_downloaded": len(response.content),
+                "ttfb_ms": None, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+        page = _stored_page(response, False, parse_timeout, preview_length)
+    page_fetch_stats.record(info)
+    return page, info
+
+def _stored_page(response, partial, parse_timeout=None, preview_length=PREVIEW_LENGTH):
+    """Page from a response with its whole body, or None if a partial body ends before the preview"""
+    charset = declared_charset(response.headers.get("Content-Type"))
+    if not partial:
+        return parse_pool.run(parse_page, response.content, charset, HTML_PARSE_MODE, preview_length,
+                              timeout=parse_timeout)
+    preview = PagePreview(charset, limit=preview_length)
+    preview.feed_bytes(response.content)
+    if not preview.done and preview.bytes_fed < PAGE_FETCH_MAX_BYTES:
+        return None
+    preview.close()
+    return preview.result()
+
+def _streamed_page(url, cancel_token=None, preview_length=PREVIEW_LENGTH, stored=None, parse_timeout=None, **kwargs):
+    if cancel_token is not None:
+        cancel_token.check()
+    http_cache = active_http_cache()
+    # A fresh stored page only gets here when it is too short for this preview
+    revalidate = stored is not None and not stored["fresh"] and stored["validators"]
+    request_kwargs = dict(kwargs)
+    if revalidate:
+        request_kwargs["headers"] = {**(kwargs.get("headers") or {}), **stored["validators"]}
+    start = time.perf_counter()
+    response = http_client.get(url, stream=True, **request_kwargs)
+    ttfb = time.perf_counter() - start
+
+    if response.status_code == 304 and revalidate:
+        response.close()
+        refreshed = http_cache.revalidated(url, response)
+        page = _stored_page(refreshed, stored["partial"], parse_timeout, preview_length) if refreshed is not None else None
+        if page is None:
+            # The stored start of the page is too short for this preview
+            return _streamed_page(url, cancel_token, preview_length, None, parse_timeout, **kwargs)
+        return page, {
+            "source": "revalidated",
+            "bytes_downloaded": 0,
+            "ttfb_ms": round(ttfb * 1000, 1),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
 
-    # For development purposes, we'll continue without raising an exception
-    # In production, this should raise an exception
-    print("Continuing in development mode with limited functionality.")
-    print("The AI features will not work, but you can test the UI.")
-
-# Initialize Flask app
-app = Flask(__name__)
-
-# Create downloads directory if it doesn't exist
-os.makedirs(os.path.join(app.static_folder, 'downloads'), exist_ok=True)
-logger.info(f"Ensuring downloads directory exists: {os.path.join(app.static_folder, 'downloads')}")
-
-# Initialize Gemini model with specific parameters for better results
-try:
-    generation_config = {
-        "temperature": 0.2,  # Lower temperature for more deterministic outputs
-        "top_p": 0.95,
-        "top_k": 40,
-        "max_output_tokens": 8192,
+    unregister = cancel_token.on_cancel(lambda: _abort_response(response)) if cancel_token is not None else None
+    preview = PagePreview(declared_charset(response.headers.get("Content-Type")), limit=preview_length)
+    # Kept for the page cache
+    chunks = [] if http_cache is not None else None
+    stopped_early = truncated = False
+    try:
+        for chunk in response.iter_content(chunk_size=PAGE_FETCH_CHUNK_BYTES):
+            if cancel_token is not None:
+                cancel_token.check()
+            preview.feed_bytes(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+            if preview.done:
+                stopped_early = True
+                break
+            if preview.bytes_fed >= PAGE_FETCH_MAX_BYTES:
+                truncated = True
+                break
+        preview.close()
+    except Exception:
+        # A read failing because the connection was closed on cancel is a cancellation
+        if cancel_token is not None:
+            cancel_token.check()
+        raise
+    finally:
+        if unregister is not None:
+            unregister()
+        # Closing before the end of the body drops the connection instead of reading the rest
+        response.close()
+
+    try:
+        # Bytes read off the wire, before decompression
+        downloaded = response.raw.tell()
+    except Exception:
+        downloaded = preview.bytes_fed
+    if chunks is not None:
+        response._content = b"".join(chunks)
+        response._content_consumed = True
+        http_cache.store(url, response, partial=stopped_early or truncated)
+    return preview.result(), {
+        "source": "network",
+        "bytes_downloaded": downloaded,
+        "ttfb_ms": round(ttfb * 1000, 1),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "stopped_early": stopped_early,
+        "truncated": truncated,
     }
 
-    safety_settings = [
-        {
-            "category": "HARM_CATEGORY_HARASSMENT",
-            "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-        },
-        {
-            "category": "HARM_CATEGORY_HATE_SPEECH",
-            "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-        },
-        {
-            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-            "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-        },
-        {
-            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-            "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-        }
-    ]
+def enrichment_fetch(url, cancel_token, timeout):
+    """Title and main text of a search result page, for the result enricher"""
+    page, _ = fetch_page(url, cancel_token=cancel_token, parse_timeout=timeout,
+                         preview_length=ENRICH_TEXT_CHARS, timeout=min(timeout, HTTP_TIMEOUT_SECONDS))
+    text = page["content_preview"]
+    if text.endswith("..."):
+        text = text[:-3]
+    return {"title": page["title"], "text": " ".join(text.split())}
+
+result_enricher = ResultEnricher(enrichment_fetch, max_workers=ENRICH_MAX_WORKERS, per_host=ENRICH_PER_HOST)
+
+# BM25 index of pages, snippets and generated documents, queried before searching the network
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "true").lower() == "true"
+LOCAL_INDEX_MIN_SCORE = float(os.getenv("LOCAL_INDEX_MIN_SCORE", "6.0"))
+LOCAL_INDEX_MIN_HITS = int(os.getenv("LOCAL_INDEX_MIN_HITS", "3"))
+# Older documents no longer answer searches, so results about "latest ..." do not go stale
+LOCAL_INDEX_MAX_AGE_SECONDS = float(os.getenv("LOCAL_INDEX_MAX_AGE_SECONDS", "86400"))
+_local_index = None
+search_latency = LatencyStats()
+
+def get_local_index():
+    """Return the local index, loading it on first use; None when it is disabled"""
+    global _local_index
+    if _local_index is None and LOCAL_INDEX_ENABLED:
+        with _init_lock:
+            if _local_index is None:
+                _local_index = LocalIndex(
+                    os.getenv("LOCAL_INDEX_DIR", os.path.join(".cache", "index")),
+                    flush_docs=int(os.getenv("LOCAL_INDEX_FLUSH_DOCS", "50")),
+                    max_segments=int(os.getenv("LOCAL_INDEX_MAX_SEGMENTS", "8"))
+                )
+                # Write out the documents still buffered in memory
+                atexit.register(_local_index.close)
+    return _local_index
+
+def local_index_active():
+    """Whether searches use and feed the local index; replayed runs stay independent of it"""
+    return get_backend().mode != "replay" and get_local_index() is not None
+
+DOWNLOADS_DIR = os.path.join("static", "downloads")
+# Extensions of generated documents that are indexed, and the characters kept of each
+INDEXED_DOCUMENT_EXTENSIONS = (".txt", ".md", ".html", ".htm", ".csv", ".json")
+INDEXED_DOCUMENT_CHARS = 20000
+_indexed_downloads = {}
+_indexed_downloads_lock = threading.Lock()
+# Modification time of the downloads directory when it was last scanned
+_downloads_scanned = {}
+
+def index_document(path):
+    """Add a generated document to the local index unless it is unchanged since the last time"""
+    name = os.path.basename(path)
+    local_index = get_local_index()
+    if local_index is None or not name.lower().endswith(INDEXED_DOCUMENT_EXTENSIONS):
+        return
+    try:
+        modified = os.path.getmtime(path)
+        with _indexed_downloads_lock:
+            if _indexed_downloads.get(name) == modified:
+                return
+            _indexed_downloads[name] = modified
+        with open(path, "rb") as f:
+            content = f.read()
+        if name.lower().endswith((".html", ".htm")):
+            page = parse_page(content, None, HTML_PARSE_MODE, INDEXED_DOCUMENT_CHARS)
+            title, text = page["title"] or name, page["content_preview"]
+        else:
+            title, text = name, content.decode("utf-8", errors="replace")[:INDEXED_DOCUMENT_CHARS]
+        local_index.add(f"document:{name}", text, url=f"/static/downloads/{name}", title=title, source="document")
+    except Exception as e:
+        logger.warning(f"Could not index document {path}: {str(e)}")
 
-    model = genai.GenerativeModel(
-        model_name='gemini-1.5-flash',
-        generation_config=generation_config,
-        safety_settings=safety_settings
-    )
+def index_downloads(directory=DOWNLOADS_DIR):
+    """Index new documents in the downloads directory, if files were added since the last scan
+
+    Documents the agent writes are indexed as they are written (see index_step_result),
+    so only files added from elsewhere need the scan.
+    """
+    if get_local_index() is None:
+        return
+    try:
+        modified = os.stat(directory).st_mtime_ns
+    except OSError:
+        return
+    with _indexed_downloads_lock:
+        # A directory changed within the last second may change again without a new mtime
+        if _downloads_scanned.get(directory) == modified and time.time_ns() - modified > 1_000_000_000:
+            return
+        _downloads_scanned[directory] = modified
+    for name in sorted(os.listdir(directory)):
+        index_document(os.path.join(directory, name))
+
+def index_step_result(result):
+    """Add what a successful step read or wrote to the local index"""
+    if not local_index_active() or result.get("status") != "success":
+        return
+    local_index = get_local_index()
+    try:
+        if result.get("url") and result.get("content_preview"):
+            text = result["content_preview"]
+            local_index.add(f"page:{result['url']}", text[:-3] if text.endswith("...") else text,
+                            url=result["url"], title=result.get("title") or "", source="page")
+        if result.get("source") in ("serpapi", "direct_web") and not result.get("generated"):
+            for item in result.get("results") or []:
+                link = item.get("link")
+                if not link or link == "#":
+                    continue
+                local_index.add(f"snippet:{link}", item.get("snippet") or "", url=link,
+                                title=item.get("title") or "", source="snippet")
+                page = item.get("page")
+                if page and page.get("text"):
+                    local_index.add(f"page:{link}", page["text"], url=link,
+                                    title=page.get("title") or item.get("title") or "", source="page")
+        if result.get("filename"):
+            index_document(os.path.join(DOWNLOADS_DIR, os.path.basename(result["filename"])))
+    except Exception as e:
+        logger.warning(f"Could not index step result: {str(e)}")
+
+def serpapi_search(params, timeout=None, bypass_cache=False):
+    """Run a SerpAPI Google search through the search cache and the active backend
+
+    With bypass_cache the cached results are not used, but the fresh ones are stored.
+    """
+    def search(call_params):
+        def live_search():
+            from serpapi import GoogleSearch
+            search = GoogleSearch(call_params)
+            if timeout is not None:
+                search.timeout = timeout
+            return search.get_dict()
+
+        return get_backend().serpapi_search(call_params, live_search)
+
+    if search_cache is None:
+        return search(params)
+    return search_cache.get(params, search, timeout=timeout, bypass_cache=bypass_cache)
+
+# Planning prompt shared by single and batch planning
+PLANNING_INTRO = """
+        You are an autonomous AI agent that can execute tasks across different environments:
+        - Browser: web navigation and data extraction
+        - Terminal: running commands and scripts
+        - File System: creating, reading, and modifying files
+        - General Response: providing direct answers and creating documents
+"""
+
+PLAN_STRUCTURE = """
+            "task_analysis": "Brief analysis of what the task requires",
+            "environments_needed": ["list of environments needed: browser, terminal, file_system"],
+            "execution_steps": [
+                {
+                    "step_number": 1,
+                    "environment": "Which environment this step uses (must be one of: browser, terminal, file_system)",
+                    "action": "Detailed description of the action to take",
+                    "expected_outcome": "What this step should accomplish"
+                },
+                ...
+            ]
+"""
+
+PLANNING_GUIDELINES = """
+        IMPORTANT GUIDELINES FOR ACTIONS:
+
+        For browser environment actions, use these formats:
+        - "navigate to https://example.com"
+        - "search for Python programming"
+        - "extract headlines from search results"
+        - "extract pros and cons from smartphone reviews"
+        - "analyze trends in renewable energy"
+        - "find top 5 AI news headlines"
+        - "collect information about climate change"
+
+        For terminal environment actions, use actual commands like:
+        - "echo Hello World"
+        - "ls -la"
+        - "dir"
+        - "python --version"
+
+        For file system environment actions, use these formats:
+        - "create file example.txt with content Hello World"
+        - "read file example.txt"
+        - "write to file example.txt content: New content"
+        - "append to file example.txt content: Additional content"
+        - "delete file example.txt"
+        - "save headlines to file ai_news.txt"
+        - "save extracted information as file report.txt"
+        - "create directory reports"
+        - "list files in reports"
 
-    logger.info("Gemini model initialized successfully with custom configuration")
-except Exception as e:
-    logger.error(f"Error initializing Gemini model with custom configuration: {str(e)}")
-    # Fall back to default configuration
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    logger.info("Gemini model initialized with default configuration")
+        For general response environment actions, use these formats:
+        - "respond to query: What is artificial intelligence?"
+        - "respond to query: Create a document about renewable energy"
+        - "respond to query: Generate a PDF report on cybersecurity"
+
+        IMPORTANT: For any requests involving PDF creation, document generation, or report creation,
+        always use the general_response environment, not terminal or file_system.
+
+        For complex tasks that involve multiple steps, break them down appropriately. For example:
+
+        Task: "Find top 5 AI headlines and save to file"
+        Steps:
+        1. Browser: "search for latest AI news headlines"
+        2. Browser: "extract headlines from search results"
+        3. File System: "save headlines to file ai_headlines.txt"
+
+        Task: "Research renewable energy, analyze trends, create report"
+        Steps:
+        1. Browser: "search for renewable energy trends 2024"
+        2. Browser: "analyze trends in renewable energy"
+        3. File System: "save extracted information as file renewable_energy_report.txt"
+"""
+
+def build_planning_prompt(instruction):
+    """Prompt asking Gemini for the execution plan of one instruction"""
+    return f"""{PLANNING_INTRO}
+        Analyze this instruction and create a detailed execution plan:
+        "{instruction}"
+
+        IMPORTANT: Your response MUST be a valid JSON object with the following structure and nothing else.
+        Do not include any explanations, markdown formatting, or additional text outside the JSON.
+
+        {{{PLAN_STRUCTURE}        }}
+{PLANNING_GUIDELINES}
+        Return ONLY the JSON object and nothing else.
+        """
+
+def build_batch_planning_prompt(instructions):
+    """Prompt asking Gemini for the execution plans of several instructions in one call"""
+    numbered = "\n".join(f'        {i + 1}. "{instruction}"' for i, instruction in enumerate(instructions))
+    return f"""{PLANNING_INTRO}
+        Analyze each of these {len(instructions)} instructions and create a detailed execution plan for each one:
+{numbered}
+
+        IMPORTANT: Your response MUST be a valid JSON array with exactly {len(instructions)} objects, one per instruction
+        and in the same order, and nothing else. Each object must have the following structure.
+        Do not include any explanations, markdown formatting, or additional text outside the JSON.
+
+        [
+            {{
+            "instruction_number": 1,{PLAN_STRUCTURE}            }},
+            ...
+        ]
+{PLANNING_GUIDELINES}
+        Return ONLY the JSON array and nothing else.
+        """
+
+def parse_json_response(response_text):
+    """Extract a JSON object or array from a Gemini response"""
+    import re
+
+    # Sometimes the model might include markdown formatting or additional text
+    json_match = re.search(r'```json\s*([\s\S]*?)\s*```', response_text)
+    if json_match:
+        # Extract JSON from code block
+        json_str = json_match.group(1)
+        logger.info(f"Extracted JSON from code block: {json_str[:500]}...")
+        return json.loads(json_str)
+
+    # Try to parse the whole response as JSON
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        # Try to find any JSON-like structure in the response
+        json_like_match = re.search(r'(\{[\s\S]*\}|\[[\s\S]*\])', response_text)
+        if json_like_match:
+            json_str = json_like_match.group(1)
+            logger.info(f"Extracted JSON-like structure: {json_str[:500]}...")
+            return json.loads(json_str)
+        raise ValueError("Could not find valid JSON in the response")
 
 class AIAgent:
-    def __init__(self):
-        self.history = []
+    def __init__(self, bypass_cache=False, report_mode=None, deadline_seconds=None, cancel_token=None):
+        self.history = HistoryStore(HISTORY_MAX_ENTRIES)
         self.current_task = None
         self.task_status = "idle"
         self.report = ""
+        self.bypass_cache = bypass_cache
+        self.report_mode = report_mode or REPORT_MODE
+        # The budget starts when the agent is created for a request
+        self.deadline = Deadline(REQUEST_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds)
+        self.cancel_token = cancel_token or CancellationToken()
+        self.metrics = {}
+        self._speculation = None
+        self._step_context = threading.local()
+        self._history_mark = -1
+        self._step_results = {}
+
+    def _generate(self, prompt, call_type):
+        """Send a prompt to Gemini through the shared response cache"""
+        self.cancel_token.check()
+        timeout = self.deadline.timeout(LLM_TIMEOUT_SECONDS, f"the Gemini {call_type} call")
+        return generate_content(prompt, call_type=call_type, bypass_cache=self.bypass_cache, timeout=timeout)
+
+    def _generate_concurrently(self, calls):
+        """Run independent Gemini calls on the shared LLM executor and join the results
+
+        calls maps a name to a (prompt, call_type) tuple. Returns the response texts by
+        name and a timing breakdown showing how much of the work overlapped.
+        """
+        def timed_call(prompt, call_type):
+            call_start = time.perf_counter()
+            text = self._generate(prompt, call_type)
+            return text, call_start, time.perf_counter()
+
+        start = time.perf_counter()
+        futures = {name: llm_executor.submit(timed_call, prompt, call_type) for name, (prompt, call_type) in calls.items()}
+
+        texts = {}
+        timing = {"calls": {}}
+        for name, future in futures.items():
+            text, call_start, call_end = future.result()
+            texts[name] = text
+            timing["calls"][name] = {
+                "started_after_seconds": round(call_start - start, 3),
+                "duration_seconds": round(call_end - call_start, 3)
+            }
+
+        wall_seconds = time.perf_counter() - start
+        sequential_seconds = sum(call["duration_seconds"] for call in timing["calls"].values())
+        timing["wall_seconds"] = round(wall_seconds, 3)
+        timing["sequential_seconds"] = round(sequential_seconds, 3)
+        timing["overlap_seconds"] = round(max(0.0, sequential_seconds - wall_seconds), 3)
+        return texts, timing
+
+    def _search_response(self, query, search_results, source, started=None):
+        """Result of a search step, with the pages of the top results attached"""
+        response = {
+            "status": "success",
+            "query": query,
+            "results": search_results,
+            "source": source
+        }
+        if ENRICH_TOP_N > 0 and search_results:
+            remaining = self.deadline.remaining()
+            budget = ENRICH_BUDGET_SECONDS if remaining is None else min(ENRICH_BUDGET_SECONDS, remaining)
+            response["results"], response["enrichment"] = result_enricher.enrich(
+                search_results, top_n=ENRICH_TOP_N, budget_seconds=budget, cancel_token=self.cancel_token)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            search_latency.record("network", elapsed)
+            response["latency_ms"] = round(elapsed * 1000, 2)
+        return response
+
+    def _local_search(self, query):
+        """A search step answered from the local index, or None without enough good hits"""
+        if not local_index_active() or self.bypass_cache:
+            return None
+        index_downloads()
+        start = time.perf_counter()
+        hits = [hit for hit in get_local_index().search(query, limit=5, max_age=LOCAL_INDEX_MAX_AGE_SECONDS or None)
+                if hit["score"] >= LOCAL_INDEX_MIN_SCORE]
+        if len(hits) < LOCAL_INDEX_MIN_HITS:
+            return None
+
+        search_results = []
+        for hit in hits:
+            result = {"title": hit["title"], "link": hit["url"] or "#", "snippet": hit["excerpt"], "score": hit["score"]}
+            if hit["source"] != "snippet":
+                result["page"] = {"title": hit["title"], "text": hit["text"][:ENRICH_TEXT_CHARS]}
+            search_results.append(result)
+        elapsed = time.perf_counter() - start
+        search_latency.record("local", elapsed)
+        logger.info(f"Answered search for {query!r} from the local index in {elapsed * 1000:.1f} ms")
+        return {
+            "status": "success",
+            "query": query,
+            "results": search_results,
+            "source": "local_index",
+            "latency_ms": round(elapsed * 1000, 2)
+        }
+
+    @staticmethod
+    def _result_text(result, default="No content available"):
+        """Page text of an enriched search result, or its snippet"""
+        return (result.get("page") or {}).get("text") or result.get("snippet") or default
 
     def _extract_features_from_snippet(self, snippet, device_type="general"):
         """Extract features from a search result snippet based on device type"""
@@ -240,270 +1078,306 @@ class AIAgent:
     
     def process_instruction(self, instruction):
         """Process the user instruction and determine the execution plan"""
-        self.current_task = instruction
-        self.task_status = "processing"
-        self.history.append({"role": "user", "content": instruction})
+        self._start_task(instruction)
+        plan = self.create_plan(instruction)
+        return self.execute_plan(plan)
 
-        # Check if this is a document or report request
-        instruction_lower = instruction.lower()
-        is_document_request = any(keyword in instruction_lower for keyword in ["create document", "make document", "generate document", "create a document", "make a document", "generate a document"])
-        is_report_request = any(keyword in instruction_lower for keyword in ["create report", "make report", "generate report", "create a report", "make a report", "generate a report"])
-        is_pdf_request = "pdf" in instruction_lower
+    def process_instruction_iter(self, instruction, stream_report=True):
+        """Generator form of process_instruction that yields (event, data) progress events
 
-        # Check if this is a mobile phone search request
-        is_mobile_search = any(keyword in instruction_lower for keyword in ["mobile phone", "smartphone", "latest phones", "new phones", "best phones"])
-
-        # Check if this is a laptop search request
-        is_laptop_search = any(keyword in instruction_lower for keyword in ["laptop", "notebook", "latest laptops", "new laptops", "best laptops"])
-
-        # If it's a document or report request, use the general_response environment directly
-        if (is_document_request or is_report_request) and is_pdf_request:
-            logger.info(f"PDF document/report request detected: {instruction}")
-            fallback_plan = {
-                "task_analysis": f"Creating a {'report' if is_report_request else 'document'} in PDF format about: {instruction}",
-                "environments_needed": ["general_response"],
-                "execution_steps": [
-                    {
-                        "step_number": 1,
-                        "environment": "general_response",
-                        "action": f"respond to query: {instruction}",
-                        "expected_outcome": f"Generate a PDF {'report' if is_report_request else 'document'} based on the user's request"
-                    }
-                ]
-            }
-            return self.execute_plan(fallback_plan)
-
-        # If it's a mobile phone search request, create a specialized plan
-        elif is_mobile_search or "list" in instruction_lower and any(term in instruction_lower for term in ["mobile", "phone", "smartphone"]):
-            logger.info(f"Mobile phone search detected: {instruction}")
-            fallback_plan = {
-                "task_analysis": f"Searching for and listing the latest mobile phones",
-                "environments_needed": ["browser"],
-                "execution_steps": [
-                    {
-                        "step_number": 1,
-                        "environment": "browser",
-                        "action": f"search for latest mobile phones 2024",
-                        "expected_outcome": "Find information about the latest mobile phones"
-                    },
-                    {
-                        "step_number": 2,
-                        "environment": "browser",
-                        "action": f"extract headlines from search results",
-                        "expected_outcome": "Extract a list of the latest mobile phones with their features"
-                    }
-                ]
-            }
-            return self.execute_plan(fallback_plan)
+        Events are plan_created, step_started, step_finished, report_token and done.
+        The data of the done event is the same dict process_instruction returns.
+        """
+        self._start_task(instruction)
+        plan = self.create_plan(instruction)
+        yield "plan_created", plan
+        yield from self.execute_plan_iter(plan, stream_report=stream_report)
 
-        # If it's a laptop search request, create a specialized plan
-        elif is_laptop_search or "list" in instruction_lower and any(term in instruction_lower for term in ["laptop", "notebook", "computer"]):
-            logger.info(f"Laptop search detected: {instruction}")
-            fallback_plan = {
-                "task_analysis": f"Searching for and listing the latest laptops",
-                "environments_needed": ["browser", "general_response"],
-                "execution_steps": [
-                    {
-                        "step_number": 1,
-                        "environment": "browser",
-                        "action": f"search for latest laptops 2024",
-                        "expected_outcome": "Find information about the latest laptops"
-                    },
-                    {
-                        "step_number": 2,
-                        "environment": "browser",
-                        "action": f"extract headlines from search results",
-                        "expected_outcome": "Extract a list of the latest laptops with their features"
-                    },
-                    {
-                        "step_number": 3,
-                        "environment": "general_response",
-                        "action": f"respond to query: Create a report on the latest laptops based on the search results",
-                        "expected_outcome": "Generate a comprehensive report on the latest laptops"
-                    }
-                ]
-            }
-            return self.execute_plan(fallback_plan)
+    def _start_task(self, instruction):
+        self.current_task = instruction
+        self.task_status = "processing"
+        self.history.append({"role": "user", "content": instruction})
 
+    def template_plan(self, instruction):
+        """Return a plan from the template registry for well-known request shapes, or None"""
+        matched = plan_templates.match(instruction)
+        if matched is None:
+            return None
+        plan, template_name = matched
+        logger.info(f"Plan template '{template_name}' matched: {instruction}")
+        self.metrics["plan_template"] = template_name
+        return plan
+
+    def create_plan(self, instruction):
+        """Determine the execution plan for an instruction"""
+        matched_plan = self.template_plan(instruction)
+        if matched_plan is not None:
+            return matched_plan
+
+        self._start_speculation(instruction)
+        plan = self._plan_with_llm(instruction)
+        if self._speculation is not None:
+            self._speculation.resolve(plan)
+        return plan
+
+    def _start_speculation(self, instruction):
+        """Start the likely first search of the plan before the planning call returns"""
+        query = guess_search_query(instruction) if SPECULATIVE_SEARCH else None
+        if query is None:
+            return
+        self._speculation = speculation_tracker.start(speculation_executor, query, self.browser_execution)
+        self.metrics["speculative_search"] = self._speculation.info
+
+    def _plan_with_llm(self, instruction):
+        """Ask Gemini for the execution plan, falling back to a keyword plan on errors"""
         # Ask Gemini to analyze the task and create an execution plan
-        prompt = f"""
-        You are an autonomous AI agent that can execute tasks across different environments:
-        - Browser: web navigation and data extraction
-        - Terminal: running commands and scripts
-        - File System: creating, reading, and modifying files
-        - General Response: providing direct answers and creating documents
-
-        Analyze this instruction and create a detailed execution plan:
-        "{instruction}"
-
-        IMPORTANT: Your response MUST be a valid JSON object with the following structure and nothing else.
-        Do not include any explanations, markdown formatting, or additional text outside the JSON.
-
-        {{
-            "task_analysis": "Brief analysis of what the task requires",
-            "environments_needed": ["list of environments needed: browser, terminal, file_system"],
-            "execution_steps": [
-                {{
-                    "step_number": 1,
-                    "environment": "Which environment this step uses (must be one of: browser, terminal, file_system)",
-                    "action": "Detailed description of the action to take",
-                    "expected_outcome": "What this step should accomplish"
-                }},
-                ...
-            ]
-        }}
-
-        IMPORTANT GUIDELINES FOR ACTIONS:
-
-        For browser environment actions, use these formats:
-        - "navigate to https://example.com"
-        - "search for Python programming"
-        - "extract headlines from search results"
-        - "extract pros and cons from smartphone reviews"
-        - "analyze trends in renewable energy"
-        - "find top 5 AI news headlines"
-        - "collect information about climate change"
-
-        For terminal environment actions, use actual commands like:
-        - "echo Hello World"
-        - "ls -la"
-        - "dir"
-        - "python --version"
-
-        For file system environment actions, use these formats:
-        - "create file example.txt with content Hello World"
-        - "read file example.txt"
-        - "write to file example.txt content: New content"
-        - "append to file example.txt content: Additional content"
-        - "delete file example.txt"
-        - "save headlines to file ai_news.txt"
-        - "save extracted information as file report.txt"
-        - "create directory reports"
-        - "list files in reports"
-
-        For general response environment actions, use these formats:
-        - "respond to query: What is artificial intelligence?"
-        - "respond to query: Create a document about renewable energy"
-        - "respond to query: Generate a PDF report on cybersecurity"
-
-        IMPORTANT: For any requests involving PDF creation, document generation, or report creation,
-        always use the general_response environment, not terminal or file_system.
-
-        For complex tasks that involve multiple steps, break them down appropriately. For example:
-
-        Task: "Find top 5 AI headlines and save to file"
-        Steps:
-        1. Browser: "search for latest AI news headlines"
-        2. Browser: "extract headlines from search results"
-        3. File System: "save headlines to file ai_headlines.txt"
-
-        Task: "Research renewable energy, analyze trends, create report"
-        Steps:
-        1. Browser: "search for renewable energy trends 2024"
-        2. Browser: "analyze trends in renewable energy"
-        3. File System: "save extracted information as file renewable_energy_report.txt"
+        prompt = build_planning_prompt(instruction)
 
-        Return ONLY the JSON object and nothing else.
-        """
-        
         try:
-            response = model.generate_content(prompt)
-
             # Get the response text
-            response_text = response.text
+            planning_start = time.perf_counter()
+            response_text = self._generate(prompt, "planning")
             logger.info(f"Raw model response: {response_text[:500]}...")
 
-            # Try to extract JSON from the response
-            # Sometimes the model might include markdown formatting or additional text
-            import re
-            json_match = re.search(r'```json\s*([\s\S]*?)\s*```', response_text)
-
-            if json_match:
-                # Extract JSON from code block
-                json_str = json_match.group(1)
-                logger.info(f"Extracted JSON from code block: {json_str[:500]}...")
-                plan = json.loads(json_str)
-            else:
-                # Try to parse the whole response as JSON
-                try:
-                    plan = json.loads(response_text)
-                except json.JSONDecodeError:
-                    # Try to find any JSON-like structure in the response
-                    json_like_match = re.search(r'(\{[\s\S]*\})', response_text)
-                    if json_like_match:
-                        json_str = json_like_match.group(1)
-                        logger.info(f"Extracted JSON-like structure: {json_str[:500]}...")
-                        plan = json.loads(json_str)
-                    else:
-                        raise ValueError("Could not find valid JSON in the response")
-
+            plan = parse_json_response(response_text)
+            planning_seconds = time.perf_counter() - planning_start
+            self.metrics["planning_seconds"] = round(planning_seconds, 3)
+            plan_templates.record_planning(planning_seconds)
+            plan_templates.learn_plan(instruction, plan)
             logger.info(f"Execution plan created: {plan}")
-            return self.execute_plan(plan)
+            return plan
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse execution plan: {str(e)}")
             # Create a simple fallback plan based on the instruction
             fallback_plan = self.create_fallback_plan(instruction)
             logger.info(f"Using fallback plan: {fallback_plan}")
-            return self.execute_plan(fallback_plan)
+            return fallback_plan
         except Exception as e:
             logger.error(f"Error creating execution plan: {str(e)}")
+            if isinstance(e, TimeoutError):
+                timeout_counter.add("planning")
             # Create a simple fallback plan based on the instruction
             fallback_plan = self.create_fallback_plan(instruction)
             logger.info(f"Using fallback plan: {fallback_plan}")
-            return self.execute_plan(fallback_plan)
+            return fallback_plan
     
     def execute_plan(self, plan):
         """Execute the plan across different environments"""
+        final_result = None
+        for event, data in self.execute_plan_iter(plan):
+            if event == "done":
+                final_result = data
+        return final_result
+
+    def execute_plan_iter(self, plan, stream_report=False):
+        """Execute the plan, yielding (event, data) progress events
+
+        Each step runs on the plan's own step pool as soon as the earlier steps it depends
+        on have finished (see plan_graph), so step_finished events arrive in completion
+        order while the results keep the plan order. A failing general_response step or
+        last step still stops the plan: as in a sequential run, the steps before it
+        still run and no step after it is started.
+
+        With stream_report the report is produced with Gemini streaming and each
+        chunk is yielded as a report_token event before the final done event.
+        """
+        steps = plan.get("execution_steps", [])
+        dependencies = plan_dependencies(steps)
+        self._history_mark = self.history.mark()
+        self._step_results = {}
+
+        finished = {}
+        pending = list(range(len(steps)))
+        running = {}
+        stopped = False
+        deadline_exceeded = False
+        cancelled = False
+        # Completes when the job is cancelled, waking up the wait for running steps
+        cancel_waiter = Future()
+        unregister_cancel = self.cancel_token.on_cancel(lambda: cancel_waiter.set_result(None))
+        # Threads are started only as steps are submitted, so a sequential plan uses one
+        step_executor = ThreadPoolExecutor(
+            max_workers=max(1, min(PLAN_MAX_PARALLEL_STEPS, len(steps))),
+            thread_name_prefix="step"
+        )
+
+        while (pending and not stopped) or running:
+            if not stopped and self.cancel_token.cancelled:
+                logger.info(f"Job cancelled with {len(pending)} steps not started")
+                stopped = cancelled = True
+            if not stopped and pending and self.deadline.expired():
+                logger.warning(f"Deadline of {self.deadline.seconds:g}s exceeded with {len(pending)} steps not started")
+                stopped = deadline_exceeded = True
+            if not stopped:
+                for index in [index for index in pending if dependencies[index] <= finished.keys()]:
+                    pending.remove(index)
+                    step = steps[index]
+                    yield "step_started", {
+                        "step_number": step.get("step_number"),
+                        "environment": step.get("environment", ""),
+                        "action": step.get("action", "")
+                    }
+                    running[step_executor.submit(self._run_step, index, step)] = index
+
+            if not running:
+                break
+            done, _ = wait([*running, cancel_waiter], timeout=self.deadline.remaining(), return_when=FIRST_COMPLETED)
+            if cancel_waiter in done or not done:
+                # Cancelled or out of time: give up on the running steps instead of holding the request
+                cancelled = cancel_waiter in done
+                for future, index in sorted(running.items(), key=lambda item: item[1]):
+                    step = steps[index]
+                    if future.done():
+                        step_result, raised = future.result()
+                    elif cancelled:
+                        step_result, raised = {"status": "error", "message": "Step cancelled", "cancelled": True}, None
+                    else:
+                        step_result, raised = {
+                            "status": "error",
+                            "message": f"Step did not finish before the deadline of {self.deadline.seconds:g}s",
+                            "timed_out": True
+                        }, None
+                        timeout_counter.add(step.get("environment", "").lower())
+                    step_result.setdefault("step_number", step.get("step_number"))
+                    step_result.setdefault("environment", step.get("environment", ""))
+                    step_result.setdefault("action", step.get("action", ""))
+                    finished[index] = (step_result, raised)
+                    yield "step_finished", step_result
+                running.clear()
+                stopped = True
+                deadline_exceeded = not cancelled
+                break
+
+            for future in sorted(done, key=running.get):
+                index = running.pop(future)
+                step = steps[index]
+                step_result, raised = future.result()
+                finished[index] = (step_result, raised)
+                yield "step_finished", step_result
+
+                critical = is_critical(step, index, len(steps))
+                if raised is not None:
+                    logger.error(f"Exception in step {step.get('step_number')}: {raised}")
+                elif step_result.get("status") == "error":
+                    logger.warning(f"Step {step.get('step_number')} failed: {step_result.get('message', 'Unknown error')}")
+                    if not critical:
+                        logger.info(f"Continuing execution despite error in step {step.get('step_number')}")
+                if critical and (raised is not None or step_result.get("status") == "error"):
+                    # Stop execution for critical errors; steps already running are allowed to finish
+                    pending = [earlier for earlier in pending if earlier < index]
+
+        unregister_cancel()
+        # Steps given up on at the deadline finish in the background
+        step_executor.shutdown(wait=False)
+        if self._speculation is not None:
+            # A speculative search that no step claimed, for example because its step was skipped, is a miss
+            self._speculation.discard()
+        # A job cancelled after its last step still skips the report
+        cancelled = cancelled or self.cancel_token.cancelled
+
+        # Work out the outcome in plan order, as a sequential run would have
         results = []
         has_error = False
         error_message = ""
-
-        for step in plan.get("execution_steps", []):
-            try:
-                step_result = self.execute_step(step)
-                results.append(step_result)
-
-                # Check if this step failed
-                if step_result.get("status") == "error":
+        for index in sorted(finished):
+            step_result, raised = finished[index]
+            results.append(step_result)
+            if raised is not None:
+                error_message = raised
+                if is_critical(steps[index], index, len(steps)):
                     has_error = True
-                    error_message = step_result.get("message", "Unknown error")
-                    logger.warning(f"Step {step.get('step_number')} failed: {error_message}")
+            elif step_result.get("status") == "error":
+                has_error = True
+                error_message = step_result.get("message", "Unknown error")
+
+        self.metrics["deadline_seconds"] = self.deadline.seconds
+        self.metrics["deadline_remaining_seconds"] = None if self.deadline.seconds is None else round(self.deadline.remaining(), 3)
+        skipped = [step_number(steps[index], index) for index in range(len(steps)) if index not in finished]
+        # Report on the steps that finished, so each result stays next to its step
+        finished_plan = dict(plan, execution_steps=[steps[index] for index in sorted(finished)])
+        if cancelled:
+            # Nobody is waiting for a report
+            self.task_status = "cancelled"
+            self.report = ""
+            message = f"Cancelled ({self.cancel_token.reason}): {len(finished)} of {len(steps)} steps finished"
+            yield "done", {"status": "cancelled", "message": message, "results": results, "skipped_steps": skipped,
+                           "report": self.report, "metrics": self.metrics}
+        elif deadline_exceeded:
+            # Return what was finished, with a report, rather than nothing
+            timeout_counter.add_exceeded()
+            self.task_status = "partial"
+            message = f"Deadline of {self.deadline.seconds:g}s exceeded: {len(finished)} of {len(steps)} steps finished"
+            yield from self._report_iter(finished_plan, results, stream_report)
+            yield "done", {"status": "partial", "message": message, "results": results, "skipped_steps": skipped,
+                           "report": self.report, "metrics": self.metrics}
+        elif has_error and error_message:
+            self.task_status = "failed"
+            yield from self._report_iter(finished_plan, results, stream_report)
+            yield "done", {"status": "failed", "message": error_message, "report": self.report, "metrics": self.metrics}
+        else:
+            self.task_status = "completed"
+            yield from self._report_iter(plan, results, stream_report)
+            yield "done", {"status": "completed", "results": results, "report": self.report, "metrics": self.metrics}
 
-                    # If this is not the last step and it's not a critical error, continue
-                    if step.get("environment") != "general_response" and step.get("step_number") < len(plan.get("execution_steps", [])):
-                        logger.info(f"Continuing execution despite error in step {step.get('step_number')}")
-                        continue
-                    else:
-                        # Stop execution for critical errors
-                        self.task_status = "failed"
-                        self.generate_report(plan, results)
-                        return {"status": "failed", "message": error_message, "report": self.report}
-            except Exception as e:
-                error_message = str(e)
-                logger.error(f"Exception in step {step.get('step_number')}: {error_message}")
-                results.append({
-                    "status": "error",
-                    "message": f"An error occurred: {error_message}",
-                    "step_number": step.get("step_number"),
-                    "environment": step.get("environment", ""),
-                    "action": step.get("action", "")
-                })
+    def _run_step(self, index, step):
+        """Run one step on a pool thread; returns the result and the exception message, if any"""
+        self._step_context.index = index
+        try:
+            step_result = self.execute_step(step)
+            self._step_results[index] = step_result
+            return step_result, None
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"An error occurred: {str(e)}",
+                "step_number": step.get("step_number"),
+                "environment": step.get("environment", ""),
+                "action": step.get("action", "")
+            }, str(e)
+        finally:
+            self._step_context.index = None
 
-                # Continue with next step unless this is a critical step
-                if step.get("environment") == "general_response" or step.get("step_number") == len(plan.get("execution_steps", [])):
-                    has_error = True
-                    break
+    def _latest_result(self, kind):
+        """The newest history entry of a kind ("search", "extraction", ...) visible to the current step
 
-        # Generate report even if there were non-critical errors
-        if has_error and error_message:
-            self.task_status = "failed"
-            self.generate_report(plan, results)
-            return {"status": "failed", "message": error_message, "report": self.report}
+        A step running on the step pool sees what it would in a sequential run: the
+        results of the earlier steps of the plan, then the history from before the plan.
+        """
+        index = getattr(self._step_context, "index", None)
+        if index is None:
+            return self.history.latest(kind)
+        for earlier in range(index - 1, -1, -1):
+            result = self._step_results.get(earlier)
+            if result is not None and entry_kind(result) == kind:
+                return result
+        return self.history.latest(kind, until=self._history_mark)
+
+    def _report_iter(self, plan, results, stream_report):
+        """Produce the report, yielding report_token events when streaming
+
+        Depending on the report mode the report is rendered from templates or
+        written by Gemini; the choice and the time it took go into the metrics.
+        """
+        report_start = time.perf_counter()
+        mode = choose_report_mode(self.report_mode, self.current_task, plan, results, REPORT_LLM_COMPLEXITY_THRESHOLD)
+        if self.deadline.expired():
+            # No budget left for an LLM report
+            mode = "template"
+        if mode == "template" and self.generate_template_report(plan, results):
+            if stream_report:
+                yield "report_token", {"text": self.report}
+        elif stream_report:
+            mode = "llm"
+            for chunk in self.generate_report_stream(plan, results):
+                if self.cancel_token.cancelled:
+                    break
+                yield "report_token", {"text": chunk}
         else:
-            self.task_status = "completed"
+            mode = "llm"
             self.generate_report(plan, results)
-            return {"status": "completed", "results": results, "report": self.report}
-    
+        self.metrics["report_mode"] = mode
+        self.metrics["report_seconds"] = round(time.perf_counter() - report_start, 3)
+
     def execute_step(self, step):
         """Execute a single step in the appropriate environment"""
         environment = step.get("environment", "").lower()
@@ -514,7 +1388,9 @@ class AIAgent:
             result = None
 
             if environment == "browser":
-                result = self.browser_execution(action)
+                result = self._speculation.claim(action) if self._speculation is not None else None
+                if result is None:
+                    result = self.browser_execution(action)
             elif environment == "terminal":
                 result = self.terminal_execution(action)
             elif environment == "file_system":
@@ -529,9 +1405,11 @@ class AIAgent:
             result["environment"] = environment
             result["action"] = action
             result["expected_outcome"] = expected_outcome
+            self._count_timeout(result, environment)
 
             # Store the result in history for potential future reference
             self.history.append(result)
+            index_step_result(result)
 
             return result
         except Exception as e:
@@ -544,8 +1422,19 @@ class AIAgent:
                 "action": action,
                 "expected_outcome": expected_outcome
             }
+            if isinstance(e, TimeoutError):
+                error_result["timed_out"] = True
+            self._count_timeout(error_result, environment)
             self.history.append(error_result)
             return error_result
+
+    def _count_timeout(self, result, environment):
+        """Flag and count a step that failed because a call or the request deadline timed out"""
+        if result.get("status") != "error":
+            return
+        if result.get("timed_out") or self.deadline.expired() or "timed out" in str(result.get("message", "")).lower():
+            result["timed_out"] = True
+            timeout_counter.add(environment)
     
     def browser_execution(self, action):
         """Execute actions in the browser environment"""
@@ -569,19 +1458,16 @@ class AIAgent:
                     return {"status": "error", "message": "Could not determine URL from action"}
 
             try:
-                response = requests.get(url)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                title = soup.title.string if soup.title else "No title"
-
-                # Extract main content (simplified)
-                main_content = soup.find('main') or soup.find('body')
-                content_text = main_content.get_text()[:500] + "..." if main_content else "Could not extract content"
+                page, fetch = fetch_page(url, cancel_token=self.cancel_token,
+                                         parse_timeout=self.deadline.remaining(),
+                                         timeout=self.deadline.timeout(HTTP_TIMEOUT_SECONDS, f"fetching {url}"))
 
                 return {
                     "status": "success",
                     "url": url,
-                    "title": title,
-                    "content_preview": content_text
+                    "title": page["title"],
+                    "content_preview": page["content_preview"],
+                    "fetch": fetch
                 }
             except Exception as e:
                 return {"status": "error", "message": f"Failed to access URL: {str(e)}"}
@@ -590,14 +1476,18 @@ class AIAgent:
             # Extract search query
             query = action_lower.split("search for")[1].strip().strip('"\'')
 
+            local_result = self._local_search(query)
+            if local_result is not None:
+                return local_result
+            started = time.perf_counter()
+
             try:
                 # Try to use SerpAPI if available
                 serpapi_key = os.getenv("SERPAPI_KEY")
+                serpapi_results = None
 
                 if serpapi_key:
                     try:
-                        from serpapi import GoogleSearch
-
                         # Perform search using SerpAPI
                         search_params = {
                             "q": query,
@@ -605,8 +1495,8 @@ class AIAgent:
                             "num": 5  # Number of results to return
                         }
 
-                        search = GoogleSearch(search_params)
-                        results = search.get_dict()
+                        results = serpapi_search(search_params, timeout=self.deadline.timeout(HTTP_TIMEOUT_SECONDS, "the SerpAPI search"),
+                                                 bypass_cache=self.bypass_cache)
 
                         # Extract and format search results
                         search_results = []
@@ -624,78 +1514,23 @@ class AIAgent:
                                 })
 
                         logger.info(f"SerpAPI search successful for query: {query}")
-                        return {
-                            "status": "success",
-                            "query": query,
-                            "results": search_results,
-                            "source": "serpapi"
-                        }
+                        serpapi_results = search_results
 
                     except Exception as e:
                         logger.error(f"SerpAPI search failed: {str(e)}. Falling back to direct web search.")
                         # Fall back to direct web search
 
+                if serpapi_results is not None:
+                    return self._search_response(query, serpapi_results, "serpapi", started)
+
                 # Direct web search fallback
                 search_url = f"https://www.google.com/search?q={query.replace(' ', '+')}"
 
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                }
-                response = requests.get(search_url, headers=headers)
-                soup = BeautifulSoup(response.text, 'html.parser')
-
-                # Extract search results (improved)
-                search_results = []
-
-                # Try different selectors for different Google search layouts
-                result_selectors = ["div.g", "div.tF2Cxc", "div.yuRUbf", "div.kCrYT"]
-
-                for selector in result_selectors:
-                    results = soup.select(selector)
-                    if results:
-                        for result in results[:5]:  # First 5 results
-                            # Try to extract title
-                            title_elem = result.select_one("h3") or result.select_one(".LC20lb")
-
-                            # Try to extract link
-                            link_elem = result.select_one("a")
-
-                            # Try to extract snippet
-                            snippet_elem = result.select_one(".VwiC3b") or result.select_one(".st") or result.select_one(".aCOpRe")
-
-                            if title_elem and link_elem:
-                                title = title_elem.get_text()
-                                link = link_elem.get("href")
-
-                                # Clean up link if needed
-                                if link.startswith("/url?q="):
-                                    link = link.split("/url?q=")[1].split("&")[0]
-
-                                # Extract snippet if available
-                                snippet = snippet_elem.get_text() if snippet_elem else "No description available"
-
-                                search_results.append({
-                                    "title": title,
-                                    "link": link,
-                                    "snippet": snippet
-                                })
-
-                        # If we found results with this selector, break the loop
-                        if search_results:
-                            break
-
-                # If we still don't have results, try a more generic approach
-                if not search_results:
-                    for a_tag in soup.select("a"):
-                        if a_tag.get("href", "").startswith("http") and a_tag.text and len(a_tag.text.strip()) > 10:
-                            search_results.append({
-                                "title": a_tag.text.strip(),
-                                "link": a_tag.get("href"),
-                                "snippet": "No description available"
-                            })
-
-                            if len(search_results) >= 5:
-                                break
+                response = http_get(search_url, cancel_token=self.cancel_token,
+                                    timeout=self.deadline.timeout(HTTP_TIMEOUT_SECONDS, "the Google search"))
+                search_results = parse_pool.run(parse_serp, response.content,
+                                                declared_charset(response.headers.get("Content-Type")), 5, HTML_PARSE_MODE,
+                                                timeout=self.deadline.remaining())
 
                 # If we don't have enough search results, use the LLM to generate some
                 if not search_results or len(search_results) < 3:
@@ -716,8 +1551,7 @@ class AIAgent:
 
                     try:
                         # Use the LLM to generate search results
-                        llm_response = model.generate_content(search_prompt)
-                        llm_text = llm_response.text
+                        llm_text = self._generate(search_prompt, "search")
 
                         # Try to extract JSON from the response
                         import re
@@ -729,29 +1563,32 @@ class AIAgent:
                             llm_results = json.loads(json_match.group(0))
                             logger.info(f"Successfully generated {len(llm_results)} results using LLM")
                             search_results = llm_results
+                            # Generated links are only plausible, not worth fetching
+                            return {
+                                "status": "success",
+                                "query": query,
+                                "results": search_results,
+                                "source": "direct_web",
+                                "generated": True
+                            }
                         else:
                             logger.warning("Could not extract JSON from LLM response")
                     except Exception as e:
                         logger.error(f"Error generating search results with LLM: {str(e)}")
                         # Continue with whatever results we have
 
-                return {
-                    "status": "success",
-                    "query": query,
-                    "results": search_results,
-                    "source": "direct_web"
-                }
+                return self._search_response(query, search_results, "direct_web", started)
             except Exception as e:
                 return {"status": "error", "message": f"Failed to perform search: {str(e)}"}
 
         # Handle extraction, analysis, and review actions
-        elif any(keyword in action_lower for keyword in ["extract", "review", "analyze", "read", "check", "examine", "look at", "visit", "find", "get", "collect"]):
+        elif any(keyword in action_lower for keyword in ["extract", "review", "analyze", "read", "check", "examine", "look at", "visit", "find", "get", "collect", "summarize"]):
             # This is an extraction/analysis action
             # We'll use AI to simulate the extraction and analysis
 
             # Try to extract what needs to be analyzed
             analysis_target = ""
-            for keyword in ["extract", "review", "analyze", "read", "check", "examine", "look at", "visit", "find", "get", "collect"]:
+            for keyword in ["extract", "review", "analyze", "read", "check", "examine", "look at", "visit", "find", "get", "collect", "summarize"]:
                 if keyword in action_lower:
                     parts = action_lower.split(keyword)
                     if len(parts) > 1:
@@ -760,10 +1597,9 @@ class AIAgent:
 
             # If we have a previous search, use those results
             previous_results = []
-            for result in self.history:
-                if isinstance(result, dict) and "results" in result:
-                    previous_results = result.get("results", [])
-                    break
+            latest_search = self._latest_result("search")
+            if latest_search is not None:
+                previous_results = latest_search.get("results", [])
 
             # Determine what kind of extraction/analysis is needed
             extraction_type = "general"
@@ -803,9 +1639,9 @@ class AIAgent:
 
                         # Add features if this is a mobile or laptop search
                         if "mobile" in analysis_target.lower() or "phone" in analysis_target.lower():
-                            headline_entry["features"] = self._extract_features_from_snippet(snippet, "mobile")
+                            headline_entry["features"] = self._extract_features_from_snippet(self._result_text(result, snippet), "mobile")
                         elif "laptop" in analysis_target.lower() or "notebook" in analysis_target.lower():
-                            headline_entry["features"] = self._extract_features_from_snippet(snippet, "laptop")
+                            headline_entry["features"] = self._extract_features_from_snippet(self._result_text(result, snippet), "laptop")
 
                         extracted_content.append(headline_entry)
                 else:
@@ -838,8 +1674,7 @@ class AIAgent:
 
                     try:
                         # Use the LLM to generate content
-                        llm_response = model.generate_content(llm_prompt)
-                        llm_text = llm_response.text
+                        llm_text = self._generate(llm_prompt, "extraction")
 
                         # Try to extract JSON from the response
                         import re
@@ -927,7 +1762,7 @@ class AIAgent:
                 if previous_results:
                     summary_text = "Based on the search results, "
                     for i, result in enumerate(previous_results[:3]):
-                        summary_text += result.get("snippet", "No information available") + " "
+                        summary_text += self._result_text(result, "No information available") + " "
                     summary_text += "In conclusion, this topic shows significant developments and ongoing research."
                 else:
                     summary_text = "The analysis shows important developments in this field with several key findings. " + \
@@ -952,7 +1787,7 @@ class AIAgent:
                     for result in previous_results[:5]:
                         extracted_content.append({
                             "title": result.get("title", "No title"),
-                            "content": result.get("snippet", "No content available"),
+                            "content": self._result_text(result),
                             "source": result.get("link", "#")
                         })
                 else:
@@ -1017,16 +1852,36 @@ class AIAgent:
             return {"status": "error", "message": f"Command not allowed for security reasons: {command_parts[0]}"}
 
         try:
-            # Execute the command
-            result = subprocess.run(command_parts, capture_output=True, text=True, shell=True)
+            # Execute the command, never past the request deadline
+            self.cancel_token.check()
+            timeout = self.deadline.timeout(TERMINAL_TIMEOUT_SECONDS, "running the command")
+            # In its own process group, so that a timeout or cancel kills everything it started
+            process = subprocess.Popen(command_parts, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                       shell=True, **popen_group_options())
+            unregister = self.cancel_token.on_cancel(lambda: kill_process_tree(process))
+            try:
+                stdout, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                kill_process_tree(process)
+                process.communicate()
+                raise
+            finally:
+                unregister()
+            self.cancel_token.check()
 
             return {
-                "status": "success" if result.returncode == 0 else "error",
+                "status": "success" if process.returncode == 0 else "error",
                 "command": command,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "return_code": result.returncode
+                "stdout": stdout,
+                "stderr": stderr,
+                "return_code": process.returncode
             }
+        except subprocess.TimeoutExpired as e:
+            return {"status": "error", "message": f"Command timed out after {e.timeout:.1f}s", "command": command, "timed_out": True}
+        except DeadlineExceeded as e:
+            return {"status": "error", "message": str(e), "command": command, "timed_out": True}
+        except JobCancelled as e:
+            return {"status": "error", "message": str(e), "command": command, "cancelled": True}
         except Exception as e:
             return {"status": "error", "message": f"Failed to execute command: {str(e)}"}
     
@@ -1049,16 +1904,14 @@ class AIAgent:
             their specifications, features, and performance characteristics. Make sure to include real, up-to-date information about current products.
             """
 
-            response = model.generate_content(prompt)
-            response_text = response.text
-
             # Check if the query is asking for a document or report
             is_document_request = any(keyword in query.lower() for keyword in ["create document", "make document", "generate document", "create a document", "make a document", "generate a document"])
             is_report_request = any(keyword in query.lower() for keyword in ["create report", "make report", "generate report", "create a report", "make a report", "generate a report"])
             is_pdf_request = "pdf" in query.lower()
 
-            document_type = None
-            document_content = None
+            # The chat answer and the document body do not depend on each other,
+            # so both prompts are sent to Gemini at the same time
+            llm_calls = {"response": (prompt, "response")}
 
             if is_document_request or is_report_request:
                 # Check if this is a laptop or mobile phone report
@@ -1080,9 +1933,16 @@ class AIAgent:
 
                 {"Include specific information about the latest mobile phone models, their specifications (processors, cameras, displays, battery life), unique features, and target audiences. Focus on real, current models from major manufacturers like Apple, Samsung, Google, Xiaomi, and OnePlus." if is_mobile_report else ""}
                 """
+                llm_calls["document"] = (document_prompt, "document")
 
-                document_response = model.generate_content(document_prompt)
-                document_content = document_response.text
+            llm_texts, timing = self._generate_concurrently(llm_calls)
+            response_text = llm_texts["response"]
+
+            document_type = None
+            document_content = None
+
+            if is_document_request or is_report_request:
+                document_content = llm_texts["document"]
 
                 # Determine document type
                 if is_pdf_request:
@@ -1393,14 +2253,16 @@ class AIAgent:
                     "document_created": True,
                     "document_type": document_type,
                     "document_filename": filename,
-                    "document_content_preview": document_content[:200] + "..." if len(document_content) > 200 else document_content
+                    "document_content_preview": document_content[:200] + "..." if len(document_content) > 200 else document_content,
+                    "timing": timing
                 }
             else:
                 # Return a general response
                 return {
                     "status": "success",
                     "action_type": "general_response",
-                    "response": response_text
+                    "response": response_text,
+                    "timing": timing
                 }
 
         except Exception as e:
@@ -1548,103 +2410,99 @@ class AIAgent:
                 # Find the content to save from previous extraction or search results
                 content_to_save = ""
 
-                # Look for extraction results in history
-                for result in self.history:
-                    if isinstance(result, dict) and result.get("action_type") == "extraction":
-                        extraction_type = result.get("extraction_type", "")
-                        extracted_content = result.get("extracted_content", [])
-
-                        if extraction_type == "headlines":
-                            # Check if this is a mobile phone search
-                            is_mobile_search = any("mobile" in item.get('headline', '').lower() or "phone" in item.get('headline', '').lower() for item in extracted_content)
-                            # Check if this is a laptop search
-                            is_laptop_search = any("laptop" in item.get('headline', '').lower() or "macbook" in item.get('headline', '').lower() or "thinkpad" in item.get('headline', '').lower() for item in extracted_content)
-
-                            if is_mobile_search:
-                                content_to_save = "# Latest Mobile Phones (2024)\n\n"
-                                for i, item in enumerate(extracted_content):
-                                    content_to_save += f"{i+1}. {item.get('headline', 'No headline')}\n"
-                                    if 'features' in item:
-                                        content_to_save += f"   Features: {item.get('features', '')}\n"
-                                    content_to_save += f"   Source: {item.get('source', 'Unknown')}\n"
-                                    content_to_save += f"   URL: {item.get('url', '#')}\n\n"
-                            elif is_laptop_search:
-                                content_to_save = "# Latest Laptops (2024)\n\n"
-                                for i, item in enumerate(extracted_content):
-                                    content_to_save += f"{i+1}. {item.get('headline', 'No headline')}\n"
-                                    if 'features' in item:
-                                        content_to_save += f"   Features: {item.get('features', '')}\n"
-                                    content_to_save += f"   Source: {item.get('source', 'Unknown')}\n"
-                                    content_to_save += f"   URL: {item.get('url', '#')}\n\n"
-                            else:
-                                content_to_save = "# Top Headlines\n\n"
-                                for i, item in enumerate(extracted_content):
-                                    content_to_save += f"{i+1}. {item.get('headline', 'No headline')}\n"
-                                    content_to_save += f"   Source: {item.get('source', 'Unknown')}\n"
-                                    content_to_save += f"   URL: {item.get('url', '#')}\n\n"
-
-                        elif extraction_type == "pros_cons":
-                            content_to_save = "# Product Reviews: Pros and Cons\n\n"
-                            for item in extracted_content:
-                                content_to_save += f"## {item.get('product', 'Unknown Product')}\n\n"
-                                content_to_save += "### Pros\n"
-                                for pro in item.get('pros', []):
-                                    content_to_save += f"- {pro}\n"
-                                content_to_save += "\n### Cons\n"
-                                for con in item.get('cons', []):
-                                    content_to_save += f"- {con}\n"
-                                content_to_save += f"\nSource: {item.get('source', 'Unknown')}\n\n"
-
-                        elif extraction_type == "trends":
-                            content_to_save = "# Trend Analysis\n\n"
-                            content_to_save += "## Key Trends\n\n"
-                            for topic in extracted_content.get('trend_topics', []):
-                                content_to_save += f"- {topic}\n"
-
-                            content_to_save += "\n## Trend Data\n\n"
-                            content_to_save += "Year | Value\n"
-                            content_to_save += "-----|------\n"
-                            for data_point in extracted_content.get('trend_data', []):
-                                content_to_save += f"{data_point.get('year', 'N/A')} | {data_point.get('value', 'N/A')}\n"
-
-                            content_to_save += "\n## Sources\n\n"
-                            for source in extracted_content.get('sources', []):
-                                content_to_save += f"- {source}\n"
-
-                        elif extraction_type == "summary":
-                            content_to_save = "# Summary Report\n\n"
-                            content_to_save += f"{extracted_content.get('summary', 'No summary available')}\n\n"
-                            content_to_save += "## Key Points\n\n"
-                            for point in extracted_content.get('key_points', []):
-                                content_to_save += f"- {point}\n"
-
-                            content_to_save += "\n## Sources\n\n"
-                            for source in extracted_content.get('sources', []):
-                                content_to_save += f"- {source}\n"
-
+                # Use the latest extraction result
+                result = self._latest_result("extraction")
+                if result is not None:
+                    extraction_type = result.get("extraction_type", "")
+                    extracted_content = result.get("extracted_content", [])
+
+                    if extraction_type == "headlines":
+                        # Check if this is a mobile phone search
+                        is_mobile_search = any("mobile" in item.get('headline', '').lower() or "phone" in item.get('headline', '').lower() for item in extracted_content)
+                        # Check if this is a laptop search
+                        is_laptop_search = any("laptop" in item.get('headline', '').lower() or "macbook" in item.get('headline', '').lower() or "thinkpad" in item.get('headline', '').lower() for item in extracted_content)
+
+                        if is_mobile_search:
+                            content_to_save = "# Latest Mobile Phones (2024)\n\n"
+                            for i, item in enumerate(extracted_content):
+                                content_to_save += f"{i+1}. {item.get('headline', 'No headline')}\n"
+                                if 'features' in item:
+                                    content_to_save += f"   Features: {item.get('features', '')}\n"
+                                content_to_save += f"   Source: {item.get('source', 'Unknown')}\n"
+                                content_to_save += f"   URL: {item.get('url', '#')}\n\n"
+                        elif is_laptop_search:
+                            content_to_save = "# Latest Laptops (2024)\n\n"
+                            for i, item in enumerate(extracted_content):
+                                content_to_save += f"{i+1}. {item.get('headline', 'No headline')}\n"
+                                if 'features' in item:
+                                    content_to_save += f"   Features: {item.get('features', '')}\n"
+                                content_to_save += f"   Source: {item.get('source', 'Unknown')}\n"
+                                content_to_save += f"   URL: {item.get('url', '#')}\n\n"
                         else:
-                            # General content
-                            content_to_save = "# Extracted Information\n\n"
-                            for item in extracted_content:
-                                content_to_save += f"## {item.get('title', 'No title')}\n\n"
-                                content_to_save += f"{item.get('content', 'No content')}\n\n"
-                                content_to_save += f"Source: {item.get('source', 'Unknown')}\n\n"
+                            content_to_save = "# Top Headlines\n\n"
+                            for i, item in enumerate(extracted_content):
+                                content_to_save += f"{i+1}. {item.get('headline', 'No headline')}\n"
+                                content_to_save += f"   Source: {item.get('source', 'Unknown')}\n"
+                                content_to_save += f"   URL: {item.get('url', '#')}\n\n"
+
+                    elif extraction_type == "pros_cons":
+                        content_to_save = "# Product Reviews: Pros and Cons\n\n"
+                        for item in extracted_content:
+                            content_to_save += f"## {item.get('product', 'Unknown Product')}\n\n"
+                            content_to_save += "### Pros\n"
+                            for pro in item.get('pros', []):
+                                content_to_save += f"- {pro}\n"
+                            content_to_save += "\n### Cons\n"
+                            for con in item.get('cons', []):
+                                content_to_save += f"- {con}\n"
+                            content_to_save += f"\nSource: {item.get('source', 'Unknown')}\n\n"
+
+                    elif extraction_type == "trends":
+                        content_to_save = "# Trend Analysis\n\n"
+                        content_to_save += "## Key Trends\n\n"
+                        for topic in extracted_content.get('trend_topics', []):
+                            content_to_save += f"- {topic}\n"
+
+                        content_to_save += "\n## Trend Data\n\n"
+                        content_to_save += "Year | Value\n"
+                        content_to_save += "-----|------\n"
+                        for data_point in extracted_content.get('trend_data', []):
+                            content_to_save += f"{data_point.get('year', 'N/A')} | {data_point.get('value', 'N/A')}\n"
+
+                        content_to_save += "\n## Sources\n\n"
+                        for source in extracted_content.get('sources', []):
+                            content_to_save += f"- {source}\n"
+
+                    elif extraction_type == "summary":
+                        content_to_save = "# Summary Report\n\n"
+                        content_to_save += f"{extracted_content.get('summary', 'No summary available')}\n\n"
+                        content_to_save += "## Key Points\n\n"
+                        for point in extracted_content.get('key_points', []):
+                            content_to_save += f"- {point}\n"
+
+                        content_to_save += "\n## Sources\n\n"
+                        for source in extracted_content.get('sources', []):
+                            content_to_save += f"- {source}\n"
 
-                        break
+                    else:
+                        # General content
+                        content_to_save = "# Extracted Information\n\n"
+                        for item in extracted_content:
+                            content_to_save += f"## {item.get('title', 'No title')}\n\n"
+                            content_to_save += f"{item.get('content', 'No content')}\n\n"
+                            content_to_save += f"Source: {item.get('source', 'Unknown')}\n\n"
 
                 # If no extraction results, check for search results
                 if not content_to_save:
-                    for result in self.history:
-                        if isinstance(result, dict) and "results" in result:
-                            search_results = result.get("results", [])
-                            content_to_save = f"# Search Results for '{result.get('query', 'Unknown query')}'\n\n"
-
-                            for i, item in enumerate(search_results):
-                                content_to_save += f"{i+1}. {item.get('title', 'No title')}\n"
-                                content_to_save += f"   URL: {item.get('link', '#')}\n"
-                                content_to_save += f"   {item.get('snippet', 'No description')}\n\n"
+                    result = self._latest_result("search")
+                    if result is not None:
+                        search_results = result.get("results", [])
+                        content_to_save = f"# Search Results for '{result.get('query', 'Unknown query')}'\n\n"
 
-                            break
+                        for i, item in enumerate(search_results):
+                            content_to_save += f"{i+1}. {item.get('title', 'No title')}\n"
+                            content_to_save += f"   URL: {item.get('link', '#')}\n"
+                            content_to_save += f"   {item.get('snippet', 'No description')}\n\n"
 
                 # If still no content, create a default message
                 if not content_to_save:
@@ -1842,6 +2700,44 @@ class AIAgent:
 
     def generate_report(self, plan, results):
         """Generate a professional report of the task execution"""
+        prompt = self._build_report_prompt(plan, results)
+
+        try:
+            self.report = self._generate(prompt, "report")
+            logger.info("Report generated successfully")
+        except Exception as e:
+            logger.error(f"Error generating report: {str(e)}")
+            self.report = self._error_report(e, results)
+
+    def generate_template_report(self, plan, results):
+        """Render the report from the per-environment templates; returns False if rendering failed"""
+        try:
+            self.report = report_engine.render(self.current_task, plan, results, self.task_status)
+            logger.info("Report rendered from templates")
+            return True
+        except Exception as e:
+            logger.error(f"Error rendering report template: {str(e)}")
+            return False
+
+    def generate_report_stream(self, plan, results):
+        """Generate the report with Gemini streaming, yielding text chunks as they arrive"""
+        prompt = self._build_report_prompt(plan, results)
+        chunks = []
+
+        try:
+            timeout = self.deadline.timeout(LLM_TIMEOUT_SECONDS, "the Gemini report call")
+            for chunk in generate_content_stream(prompt, call_type="report", bypass_cache=self.bypass_cache, timeout=timeout):
+                chunks.append(chunk)
+                yield chunk
+            self.report = "".join(chunks)
+            logger.info("Report generated successfully")
+        except Exception as e:
+            logger.error(f"Error generating report: {str(e)}")
+            # The done event carries this report, replacing any partially streamed text
+            self.report = self._error_report(e, results)
+
+    def _build_report_prompt(self, plan, results):
+        """Create the prompt Gemini uses to write the execution report"""
         # Check if this is a mobile phone search
         is_mobile_search = False
         if self.current_task and ("mobile" in self.current_task.lower() or "phone" in self.current_task.lower() or "smartphone" in self.current_task.lower()):
@@ -1862,6 +2758,10 @@ class AIAgent:
                 "result": result
             })
 
+        # Send a compact digest of the results instead of the raw, indented dump
+        raw_results = json.dumps(steps_results, indent=2, default=str)
+        digested_results = ResultDigester().serialize(steps_results)
+
         # Add special instructions based on the search type
         special_instructions = ""
         if is_mobile_search:
@@ -1877,7 +2777,7 @@ class AIAgent:
         Execution Plan Analysis: {plan.get("task_analysis", "")}
 
         Execution Results:
-        {json.dumps(steps_results, indent=2)}
+        {digested_results}
 
         The report should include:
         1. Executive Summary
@@ -1890,19 +2790,21 @@ class AIAgent:
 
         Format the report in a professional manner with clear sections and concise language.
         """
-        
-        try:
-            response = model.generate_content(prompt)
-            self.report = response.text
-            logger.info("Report generated successfully")
-        except Exception as e:
-            logger.error(f"Error generating report: {str(e)}")
-            self.report = f"""
+
+        raw_prompt_chars = len(prompt) - len(digested_results) + len(raw_results)
+        self.metrics["report_prompt_chars_raw"] = raw_prompt_chars
+        self.metrics["report_prompt_chars_digested"] = len(prompt)
+        self.metrics["report_prompt_reduction"] = round(1 - len(prompt) / raw_prompt_chars, 3) if raw_prompt_chars else 0.0
+        return prompt
+
+    def _error_report(self, error, results):
+        """Basic report used when Gemini could not write one"""
+        return f"""
 # Execution Report
 
 ## Error Generating Detailed Report
 
-There was an error generating the detailed report: {str(e)}
+There was an error generating the detailed report: {str(error)}
 
 ## Task Summary
 
@@ -1915,14 +2817,127 @@ Status: {self.task_status}
 {len(results)} steps were executed.
 """
 
-# Use the global api_key_valid variable
+# Batch processing: instructions are planned several per Gemini call and executed on a worker pool
+BATCH_PLANNING_SIZE = int(os.getenv("BATCH_PLANNING_SIZE", "5"))
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+BATCH_MAX_INSTRUCTIONS = int(os.getenv("BATCH_MAX_INSTRUCTIONS", "100"))
+
+def plan_batch(instructions, bypass_cache=False):
+    """Plan several instructions with a single Gemini call
+
+    Returns a (plan, source) tuple per instruction. Instructions matching a plan
+    template skip the LLM; plans missing from the batch response are returned as (None, None)
+    so the caller can plan them individually.
+    """
+    planner = AIAgent(bypass_cache=bypass_cache)
+    plans = [(None, None)] * len(instructions)
+    pending = []
+    for index, instruction in enumerate(instructions):
+        matched_plan = planner.template_plan(instruction)
+        if matched_plan is not None:
+            plans[index] = (matched_plan, "template")
+        else:
+            pending.append(index)
+
+    if not pending:
+        return plans
+
+    prompt = build_batch_planning_prompt([instructions[index] for index in pending])
+    try:
+        planning_start = time.perf_counter()
+        response_text = generate_content(prompt, call_type="planning", bypass_cache=bypass_cache)
+        parsed = parse_json_response(response_text)
+        planning_seconds = (time.perf_counter() - planning_start) / len(pending)
+        if isinstance(parsed, dict):
+            parsed = parsed.get("plans", [parsed])
+
+        for position, plan in enumerate(parsed):
+            if not isinstance(plan, dict) or not plan.get("execution_steps"):
+                continue
+            number = plan.pop("instruction_number", position + 1)
+            try:
+                index = pending[int(number) - 1]
+            except (TypeError, ValueError, IndexError):
+                continue
+            if plans[index][0] is None:
+                plans[index] = (plan, "batch")
+                plan_templates.record_planning(planning_seconds)
+                plan_templates.learn_plan(instructions[index], plan)
+    except Exception as e:
+        logger.error(f"Error creating batch execution plan: {str(e)}")
+
+    missing = sum(1 for index in pending if plans[index][0] is None)
+    if missing:
+        logger.warning(f"Batch planning returned no plan for {missing} of {len(pending)} instructions")
+    return plans
+
+def _run_batch_item(index, instruction, plan, plan_source, options, start_time):
+    """Execute one batch instruction and build its result record"""
+    agent = AIAgent(**options)
+    record = {"index": index, "instruction": instruction}
+    try:
+        agent._start_task(instruction)
+        if plan is None:
+            plan = agent.create_plan(instruction)
+            plan_source = "individual"
+        record["plan_source"] = plan_source
+        record.update(agent.execute_plan(plan))
+    except Exception as e:
+        logger.error(f"Error processing batch instruction {index}: {str(e)}")
+        record.update({
+            "status": "error",
+            "message": f"An error occurred while processing your instruction: {str(e)}",
+            "report": agent._error_report(e, [])
+        })
+    record["elapsed_seconds"] = round(time.time() - start_time, 3)
+    return record
+
+def process_batch_iter(instructions, bypass_cache=False, planning_size=None, max_workers=None, report_mode=None,
+                       deadline_seconds=None):
+    """Process a list of instructions, yielding one result record per instruction as it finishes
+
+    Planning chunks and plan execution share a worker pool, so the first plans start
+    executing while later chunks are still being planned. Records carry the index of
+    the instruction and arrive in completion order.
+    """
+    planning_size = max(1, planning_size or BATCH_PLANNING_SIZE)
+    # The deadline applies to each instruction from the moment its execution starts
+    options = {"bypass_cache": bypass_cache, "report_mode": report_mode, "deadline_seconds": deadline_seconds}
+    start_time = time.time()
+    executor = ThreadPoolExecutor(max_workers=max_workers or BATCH_MAX_WORKERS, thread_name_prefix="batch")
+    try:
+        planning = {}
+        for offset in range(0, len(instructions), planning_size):
+            chunk = instructions[offset:offset + planning_size]
+            planning[executor.submit(plan_batch, chunk, bypass_cache)] = offset
+
+        running = set(planning)
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in planning:
+                    offset = planning[future]
+                    try:
+                        chunk_plans = future.result()
+                    except Exception as e:
+                        logger.error(f"Error planning batch chunk at {offset}: {str(e)}")
+                        chunk_plans = [(None, None)] * len(instructions[offset:offset + planning_size])
+                    for position, (plan, plan_source) in enumerate(chunk_plans):
+                        index = offset + position
+                        running.add(executor.submit(_run_batch_item, index, instructions[index], plan, plan_source,
+                                                    options, start_time))
+                else:
+                    yield future.result()
+    finally:
+        # Stop queued work if the client goes away before the batch is finished
+        executor.shutdown(wait=False, cancel_futures=True)
 
 # Routes
-@app.route('/')
-def index():
-    global api_key_valid
+bp = Blueprint('agent', __name__)
 
-    if not api_key_valid:
+@bp.route('/')
+def index():
+    if api_key_rejected():
         return render_template('error.html',
                               error_title="API Key Error",
                               error_message="The Google API key is missing or invalid. Please set up your API key to use the Autonomous AI Agent.",
@@ -1930,7 +2945,7 @@ def index():
 
     return render_template('index.html')
 
-@app.route('/error')
+@bp.route('/error')
 def error():
     error_type = request.args.get('type', 'general')
 
@@ -1946,34 +2961,73 @@ def error():
                           error_message=error_message,
                           error_type=error_type)
 
-@app.route('/api/health', methods=['GET'])
+@bp.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint to verify the server is running"""
     return jsonify({
         "status": "ok",
-        "api_key_valid": api_key_valid,
-        "model": "gemini-1.5-flash",
+        "api_key_valid": api_key_state["valid"],
+        "api_key_status": api_key_state["status"],
+        "api_key_checked_at": api_key_state["checked_at"],
+        "model": MODEL_NAME,
         "version": "1.0.0"
     })
 
-@app.route('/api/process', methods=['POST'])
-def process_instruction():
-
-    if not api_key_valid:
-        return jsonify({
-            "status": "error",
-            "message": "API key is missing or invalid. Please set up your API key to use the Autonomous AI Agent."
-        }), 401
-
-    data = request.json
-    instruction = data.get('instruction')
-
-    if not instruction:
-        return jsonify({"status": "error", "message": "No instruction provided"}), 400
+@bp.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Runtime counters for the caches and executors used by the agent"""
+    http_cache = get_http_cache()
+    local_index = get_local_index()
+    return jsonify({
+        "llm_cache": response_cache.stats(),
+        "llm_governor": llm_governor.stats(),
+        "plan_templates": plan_templates.stats(),
+        "speculative_search": speculation_tracker.stats(),
+        "timeouts": timeout_counter.stats(),
+        "jobs": job_manager.stats(),
+        "html_parse_pool": parse_pool.stats(),
+        "http_client": http_client.stats(),
+        "http_cache": http_cache.stats() if http_cache is not None else {"enabled": False},
+        "enrichment": result_enricher.stats(),
+        "serpapi_cache": search_cache.stats() if search_cache is not None else {"enabled": False},
+        "local_index": {**(local_index.stats() if local_index is not None else {"enabled": False}),
+                        "min_score": LOCAL_INDEX_MIN_SCORE, "max_age_seconds": LOCAL_INDEX_MAX_AGE_SECONDS,
+                        "search_latency": search_latency.stats()},
+        "page_fetch": {"mode": PAGE_FETCH_MODE, "max_bytes": PAGE_FETCH_MAX_BYTES, **page_fetch_stats.stats()},
+        "backend": get_backend().stats()
+    })
 
+def agent_options(data):
+    """Read the per-request AIAgent options from a payload; returns (options, error message)"""
+    report_mode = data.get('report_mode') or REPORT_MODE
+    if report_mode not in REPORT_MODES:
+        return None, f"report_mode must be one of: {', '.join(REPORT_MODES)}"
+
+    deadline_seconds = data.get('deadline_seconds')
+    if deadline_seconds is not None and (isinstance(deadline_seconds, bool) or not isinstance(deadline_seconds, (int, float)) or deadline_seconds < 0):
+        return None, "deadline_seconds must be a non-negative number of seconds (0 disables the deadline)"
+
+    return {
+        "bypass_cache": bool(data.get('bypass_cache', False)),
+        "report_mode": report_mode,
+        "deadline_seconds": deadline_seconds
+    }, None
+
+def _record_events(job, events):
+    """Feed progress events into the job; returns the data of the done event"""
+    result = None
+    for event, data in events:
+        job.record(event, data)
+        if event == "done":
+            result = data
+    return result
+
+def run_instruction_job(job):
+    """Run the instruction of a job on a job worker and return its result"""
+    instruction = job.instruction
     try:
         # Create a new agent instance
-        agent = AIAgent()
+        agent = AIAgent(**job.options, cancel_token=job.cancel_token)
 
         # Process the instruction
         start_time = time.time()
@@ -2002,22 +3056,25 @@ def process_instruction():
 
             try:
                 # Try the normal processing first
-                result = agent.process_instruction(instruction)
+                result = _record_events(job, agent.process_instruction_iter(instruction, stream_report=False))
             except Exception as e:
                 # If it fails, use our fallback plan
                 logger.error(f"Error in normal processing for laptop report: {str(e)}")
                 logger.info("Using fallback plan for laptop report")
-                result = agent.execute_plan(fallback_plan)
+                result = _record_events(job, agent.execute_plan_iter(fallback_plan))
         else:
             # Normal processing for other instructions
-            result = agent.process_instruction(instruction)
+            result = _record_events(job, agent.process_instruction_iter(instruction, stream_report=False))
 
         # Log processing time
         processing_time = time.time() - start_time
         logger.info(f"Instruction processed in {processing_time:.2f} seconds with status: {result.get('status', 'unknown')}")
 
-        return jsonify(result)
+        return result
     except Exception as e:
+        if job.cancel_token.cancelled:
+            return {"status": "cancelled", "message": f"Cancelled ({job.cancel_token.reason})"}
+
         error_message = str(e)
         logger.error(f"Error processing instruction: {error_message}")
 
@@ -2041,9 +3098,8 @@ def process_instruction():
 
             try:
                 # Create a new agent and execute the direct plan
-                direct_agent = AIAgent()
-                result = direct_agent.execute_plan(direct_plan)
-                return jsonify(result)
+                direct_agent = AIAgent(**job.options, cancel_token=job.cancel_token)
+                return _record_events(job, direct_agent.execute_plan_iter(direct_plan))
             except Exception as direct_error:
                 logger.error(f"Error in direct document generation: {str(direct_error)}")
                 # Fall through to the general error handler
@@ -2065,11 +3121,220 @@ An error occurred while processing your instruction: {error_message}
 - For document or report creation, try using "create a report on [topic]" format
 """
 
-        return jsonify({
+        return {
             "status": "error",
             "message": f"An error occurred while processing your instruction: {str(e)}",
             "report": error_report
-        }), 500
+        }
+
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "4"))
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "100"))
+JOBS_RESULT_TTL_SECONDS = float(os.getenv("JOBS_RESULT_TTL_SECONDS", "3600"))
+# Extra time /api/process waits beyond the request deadline, for queueing and the report
+PROCESS_WAIT_MARGIN_SECONDS = float(os.getenv("PROCESS_WAIT_MARGIN_SECONDS", "60"))
+job_manager = JobManager(run_instruction_job, max_workers=JOBS_MAX_WORKERS, max_queued=JOBS_MAX_QUEUED,
+                         result_ttl=JOBS_RESULT_TTL_SECONDS)
+
+def read_instruction_request():
+    """Validate an instruction payload; returns (instruction, options, error response)"""
+    if api_key_rejected():
+        return None, None, (jsonify({
+            "status": "error",
+            "message": "API key is missing or invalid. Please set up your API key to use the Autonomous AI Agent."
+        }), 401)
+
+    data = request.json or {}
+    instruction = data.get('instruction')
+
+    if not instruction:
+        return None, None, (jsonify({"status": "error", "message": "No instruction provided"}), 400)
+
+    options, options_error = agent_options(data)
+    if options_error:
+        return None, None, (jsonify({"status": "error", "message": options_error}), 400)
+    return instruction, options, None
+
+def submit_job(instruction, options):
+    """Queue an instruction; returns (job, error response)"""
+    try:
+        return job_manager.submit(instruction, options), None
+    except JobQueueFull as e:
+        return None, (jsonify({"status": "error", "message": str(e)}), 503)
+
+@bp.route('/api/process', methods=['POST'])
+def process_instruction():
+    """Process an instruction and return the result once it has finished"""
+    instruction, options, error_response = read_instruction_request()
+    if error_response:
+        return error_response
+
+    job, error_response = submit_job(instruction, options)
+    if error_response:
+        return error_response
+
+    deadline = Deadline(REQUEST_DEADLINE_SECONDS if options["deadline_seconds"] is None else options["deadline_seconds"])
+    wait_seconds = None if deadline.seconds is None else deadline.seconds + PROCESS_WAIT_MARGIN_SECONDS
+    if not job.wait(wait_seconds):
+        # The job keeps running; its result can still be polled
+        logger.warning(f"Job {job.id} did not finish within {wait_seconds:g}s")
+        return jsonify({
+            "status": "error",
+            "message": f"The job did not finish within {wait_seconds:g}s; poll its url for the result",
+            "job_id": job.id,
+            "url": f"/api/jobs/{job.id}"
+        }), 504
+    if job.status == "error":
+        return jsonify(job.result), 500
+    return jsonify(job.result)
+
+@bp.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue an instruction and return its job id without waiting for it"""
+    instruction, options, error_response = read_instruction_request()
+    if error_response:
+        return error_response
+
+    job, error_response = submit_job(instruction, options)
+    if error_response:
+        return error_response
+
+    return jsonify({"status": "queued", "job_id": job.id, "url": f"/api/jobs/{job.id}"}), 202
+
+@bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, per-step progress and, once finished, the result of a job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown or expired job"}), 404
+    return jsonify(job.to_dict())
+
+@bp.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a job; it stops at the next step boundary and its in-flight fetches and commands are aborted"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown or expired job"}), 404
+    if job.finished:
+        return jsonify({"status": "error", "message": f"Job has already finished with status {job.status}"}), 409
+    job_manager.cancel(job_id)
+    return jsonify(job.to_dict()), 202
+
+def format_sse(event, data):
+    """Format a single Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@bp.route('/api/process/stream', methods=['POST'])
+def process_instruction_stream():
+    """Process an instruction, streaming progress to the client as Server-Sent Events"""
+    instruction, options, error_response = read_instruction_request()
+    if error_response:
+        return error_response
+
+    # Registered as a job so that it can be polled and cancelled like the queued ones
+    job = job_manager.create(instruction, options)
+    agent = AIAgent(**options, cancel_token=job.cancel_token)
+
+    def generate_events():
+        start_time = time.time()
+        logger.info(f"Streaming instruction: {instruction}")
+        result = None
+        try:
+            yield format_sse("job_created", {"job_id": job.id})
+            for event, payload in agent.process_instruction_iter(instruction):
+                job.record(event, payload)
+                if event == "done":
+                    result = payload
+                yield format_sse(event, payload)
+            logger.info(f"Streamed instruction processed in {time.time() - start_time:.2f} seconds with status: {agent.task_status}")
+        except GeneratorExit:
+            # The client went away; stop the work nobody will read
+            logger.info(f"Client disconnected, cancelling job {job.id}")
+            job_manager.cancel(job.id, "client disconnected")
+            result = {"status": "cancelled", "message": "Cancelled (client disconnected)"}
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming instruction: {str(e)}")
+            result = {
+                "status": "error",
+                "message": f"An error occurred while processing your instruction: {str(e)}"
+            }
+            yield format_sse("error", result)
+        finally:
+            job_manager.complete(job, result or {"status": "error", "message": "The stream ended without a result"})
+
+    return Response(stream_with_context(generate_events()), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@bp.route('/api/process/batch', methods=['POST'])
+def process_batch():
+    """Process a list of instructions, streaming one JSON record per line as each one finishes"""
+    if api_key_rejected():
+        return jsonify({
+            "status": "error",
+            "message": "API key is missing or invalid. Please set up your API key to use the Autonomous AI Agent."
+        }), 401
+
+    data = request.json or {}
+    instructions = data.get('instructions')
+
+    if not isinstance(instructions, list) or not instructions:
+        return jsonify({"status": "error", "message": "No instructions provided"}), 400
+    if not all(isinstance(instruction, str) and instruction.strip() for instruction in instructions):
+        return jsonify({"status": "error", "message": "Every instruction must be a non-empty string"}), 400
+    if len(instructions) > BATCH_MAX_INSTRUCTIONS:
+        return jsonify({
+            "status": "error",
+            "message": f"A batch can contain at most {BATCH_MAX_INSTRUCTIONS} instructions"
+        }), 413
+
+    options, options_error = agent_options(data)
+    if options_error:
+        return jsonify({"status": "error", "message": options_error}), 400
+
+    def generate_records():
+        start_time = time.time()
+        logger.info(f"Processing batch of {len(instructions)} instructions")
+        for record in process_batch_iter(instructions, **options):
+            yield json.dumps(record, default=str) + "\n"
+        logger.info(f"Batch of {len(instructions)} instructions processed in {time.time() - start_time:.2f} seconds")
+
+    return Response(stream_with_context(generate_records()), mimetype='application/x-ndjson', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def create_app(validate_api_key=True):
+    """Create the Flask application
+
+    The Gemini model is created lazily on the first LLM call. The API key is checked
+    on a background thread so that startup never waits on the network.
+    """
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+
+    # Create downloads directory if it doesn't exist
+    os.makedirs(os.path.join(app.static_folder, 'downloads'), exist_ok=True)
+    logger.info(f"Ensuring downloads directory exists: {os.path.join(app.static_folder, 'downloads')}")
+
+    if validate_api_key:
+        start_api_key_validation()
+
+    return app
+
+_default_app = None
+
+def __getattr__(name):
+    # Keep `from app import app, api_key_valid` working without creating the app at import time
+    global _default_app
+    if name == "app":
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    if name == "api_key_valid":
+        return api_key_state["valid"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
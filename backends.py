@@ -0,0 +1,307 @@
+"""
+Pluggable backends for the agent's network calls.
+Every Gemini request, HTTP fetch and SerpAPI search goes through the active backend:
+- LiveBackend performs the real call
+- RecordingBackend performs the real call and captures the exchange in a cassette file
+- ReplayBackend serves exchanges from a cassette file with configurable synthetic latency
+
+The backend is chosen with AGENT_BACKEND_MODE (live, record, replay) and AGENT_CASSETTE,
+or programmatically with set_backend().
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+import tempfile
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode when a request has no recorded exchange"""
+
+
+def _hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def llm_key(call_type, prompt):
+    return _hash({"kind": "llm", "call_type": call_type, "prompt": prompt})
+
+
+def http_key(method, url):
+    return _hash({"kind": "http", "method": method.upper(), "url": url})
+
+
+def serpapi_key(params):
+    # The API key is never part of the match key or the cassette
+    return _hash({"kind": "serpapi", "params": {k: v for k, v in params.items() if k != "api_key"}})
+
+
+def serialize_response(response):
+    """Convert a requests.Response into a JSON-friendly dict"""
+    content = response.content or b""
+    record = {
+        "status_code": response.status_code,
+        "url": response.url,
+        "headers": dict(response.headers),
+        "encoding": response.encoding,
+    }
+    try:
+        record["body"] = content.decode("utf-8")
+    except UnicodeDecodeError:
+        record["body_base64"] = base64.b64encode(content).decode("ascii")
+    return record
+
+
+def deserialize_response(record):
+    """Rebuild a requests.Response from a recorded dict"""
+    response = requests.Response()
+    response.status_code = record.get("status_code", 200)
+    response.url = record.get("url", "")
+    response.headers = CaseInsensitiveDict(record.get("headers", {}))
+    response.encoding = record.get("encoding") or "utf-8"
+    if "body_base64" in record:
+        response._content = base64.b64decode(record["body_base64"])
+    else:
+        response._content = record.get("body", "").encode("utf-8")
+    response._content_consumed = True
+    return response
+
+
+class LiveBackend:
+    """Performs every call against the real service"""
+    mode = "live"
+
+    def llm_generate(self, call_type, prompt, live_call):
+        return live_call()
+
+    def llm_stream(self, call_type, prompt, live_stream):
+        return live_stream()
+
+    def http_get(self, url, live_call):
+        return live_call()
+
+    def serpapi_search(self, params, live_call):
+        return live_call()
+
+    def stats(self):
+        return {"mode": self.mode}
+
+
+class Cassette:
+    """A JSON file of recorded exchanges"""
+
+    def __init__(self, path):
+        self.path = path
+        self.interactions = []
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.interactions = data.get("interactions", [])
+
+    def append(self, interaction):
+        with self._lock:
+            self.interactions.append(interaction)
+            self._save()
+
+    def _save(self):
+        # Caller must hold the lock
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": CASSETTE_VERSION, "interactions": self.interactions}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class RecordingBackend(LiveBackend):
+    """Performs real calls and appends each exchange to a cassette"""
+    mode = "record"
+
+    def __init__(self, cassette_path):
+        self.cassette = Cassette(cassette_path)
+        self.recorded = 0
+
+    def _record(self, kind, key, request, response, duration, group=None):
+        self.cassette.append({
+            "kind": kind,
+            "key": key,
+            "group": group,
+            "request": request,
+            "response": response,
+            "duration": round(duration, 4)
+        })
+        self.recorded += 1
+
+    def llm_generate(self, call_type, prompt, live_call):
+        start = time.perf_counter()
+        text = live_call()
+        self._record("llm", llm_key(call_type, prompt), {"call_type": call_type, "prompt": prompt},
+                     {"text": text}, time.perf_counter() - start, group=call_type)
+        return text
+
+    def llm_stream(self, call_type, prompt, live_stream):
+        start = time.perf_counter()
+        chunks = []
+        for chunk in live_stream():
+            chunks.append(chunk)
+            yield chunk
+        self._record("llm", llm_key(call_type, prompt), {"call_type": call_type, "prompt": prompt},
+                     {"text": "".join(chunks), "chunks": chunks}, time.perf_counter() - start, group=call_type)
+
+    def http_get(self, url, live_call):
+        start = time.perf_counter()
+        response = live_call()
+        self._record("http", http_key("GET", url), {"method": "GET", "url": url},
+                     serialize_response(response), time.perf_counter() - start,
+                     group=requests.utils.urlparse(url).netloc)
+        return response
+
+    def serpapi_search(self, params, live_call):
+        start = time.perf_counter()
+        results = live_call()
+        public_params = {k: v for k, v in params.items() if k != "api_key"}
+        self._record("serpapi", serpapi_key(params), {"params": public_params},
+                     results, time.perf_counter() - start, group="serpapi")
+        return results
+
+    def stats(self):
+        return {"mode": self.mode, "cassette": self.cassette.path, "recorded": self.recorded}
+
+
+class ReplayBackend:
+    """Serves recorded exchanges from a cassette without touching the network
+
+    latency is either "recorded" (sleep for the recorded duration times latency_scale)
+    or a fixed number of seconds per call. With strict=False a request that was not
+    recorded falls back to the recorded exchanges of the same kind and group
+    (call type for LLM calls, host for HTTP) in recording order.
+    """
+    mode = "replay"
+
+    def __init__(self, cassette_path, latency="recorded", latency_scale=1.0, strict=False):
+        self.cassette = Cassette(cassette_path)
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._by_group = {}
+        self._cursors = {}
+        self.counters = {"exact_hits": 0, "loose_hits": 0, "misses": 0, "simulated_latency_seconds": 0.0}
+
+        for interaction in self.cassette.interactions:
+            self._by_key.setdefault(interaction["key"], interaction)
+            group = (interaction["kind"], interaction.get("group"))
+            self._by_group.setdefault(group, []).append(interaction)
+
+    def _lookup(self, kind, key, group):
+        with self._lock:
+            interaction = self._by_key.get(key)
+            if interaction is not None:
+                self.counters["exact_hits"] += 1
+                return interaction
+
+            candidates = self._by_group.get((kind, group)) if not self.strict else None
+            if candidates:
+                cursor = self._cursors.get((kind, group), 0)
+                self._cursors[(kind, group)] = cursor + 1
+                self.counters["loose_hits"] += 1
+                return candidates[cursor % len(candidates)]
+
+            self.counters["misses"] += 1
+        raise CassetteMissError(f"No recorded {kind} exchange for {group or key}")
+
+    def _delay(self, interaction, fraction=1.0):
+        if self.latency == "recorded":
+            seconds = interaction.get("duration", 0.0) * self.latency_scale
+        else:
+            seconds = float(self.latency)
+        seconds *= fraction
+        if seconds > 0:
+            time.sleep(seconds)
+            with self._lock:
+                self.counters["simulated_latency_seconds"] += seconds
+
+    def llm_generate(self, call_type, prompt, live_call):
+        interaction = self._lookup("llm", llm_key(call_type, prompt), call_type)
+        self._delay(interaction)
+        return interaction["response"]["text"]
+
+    def llm_stream(self, call_type, prompt, live_stream):
+        interaction = self._lookup("llm", llm_key(call_type, prompt), call_type)
+        chunks = interaction["response"].get("chunks") or [interaction["response"]["text"]]
+        for chunk in chunks:
+            # Spread the recorded latency over the chunks
+            self._delay(interaction, fraction=1.0 / len(chunks))
+            yield chunk
+
+    def http_get(self, url, live_call):
+        interaction = self._lookup("http", http_key("GET", url), requests.utils.urlparse(url).netloc)
+        self._delay(interaction)
+        return deserialize_response(interaction["response"])
+
+    def serpapi_search(self, params, live_call):
+        interaction = self._lookup("serpapi", serpapi_key(params), "serpapi")
+        self._delay(interaction)
+        return json.loads(json.dumps(interaction["response"]))
+
+    def stats(self):
+        with self._lock:
+            return {"mode": self.mode, "cassette": self.cassette.path, "interactions": len(self.cassette.interactions),
+                    **self.counters,
+                    "simulated_latency_seconds": round(self.counters["simulated_latency_seconds"], 3)}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend_from_env():
+    """Build the backend described by AGENT_BACKEND_MODE and related variables"""
+    mode = os.getenv("AGENT_BACKEND_MODE", "live").lower()
+    cassette_path = os.getenv("AGENT_CASSETTE", os.path.join("fixtures", "cassettes", "recorded.json"))
+
+    if mode == "record":
+        return RecordingBackend(cassette_path)
+    if mode == "replay":
+        latency = os.getenv("AGENT_REPLAY_LATENCY", "recorded")
+        return ReplayBackend(
+            cassette_path,
+            latency=latency if latency == "recorded" else float(latency),
+            latency_scale=float(os.getenv("AGENT_REPLAY_LATENCY_SCALE", "1.0")),
+            strict=os.getenv("AGENT_REPLAY_STRICT", "false").lower() == "true"
+        )
+    if mode != "live":
+        logger.warning(f"Unknown AGENT_BACKEND_MODE '{mode}', using live backend")
+    return LiveBackend()
+
+
+def get_backend():
+    """Return the active backend, creating it from the environment on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = backend_from_env()
+                logger.info(f"Using {_backend.mode} backend")
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the active backend and return the previous one"""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
@@ -0,0 +1,129 @@
+"""
+Parse throughput benchmark for the browser environment.
+Parses the fixture SERP corpus from concurrent request threads, inline and through parse
+pools of different sizes, and reports the requests per second of each. The fixture pages
+are padded with the inline scripts and repeated result blocks that make real result
+pages several hundred kilobytes, so parsing costs about what it does live.
+It first compares, on a single thread, the SERP extractors on the same parsed trees (the
+selector cascade against the single-pass extractor) and the parse modes end to end (the
+full html.parser tree against the targeted parse: lxml when installed, SoupStrainer,
+bounded text extraction and the single-pass extractor).
+
+Usage:
+    python benchmark_parsing.py --requests 200 --concurrency 8 --workers 0,1,4,8 --modes full,targeted
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from html_parsing import SERP_EXTRACTOR, ParsePool, html_parser, parse_page, parse_serp, select_serp_results
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "serp")
+
+def load_corpus(directory, inflate):
+    """Fixture pages as bytes, each padded inflate times"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, "rb") as f:
+            html = f.read()
+        head, _, rest = html.partition(b"</head>")
+        body, _, tail = rest.partition(b"</body>")
+        padding_script = b"<script>" + b"var x=" + b"1+" * 2000 + b"1;</script>"
+        padding_block = b'<div class="related"><div><span><a href="/search?q=more">More results</a></span></div></div>'
+        pages.append(head + padding_script * inflate + b"</head>" + body + padding_block * (50 * inflate) + b"</body>" + tail)
+    return pages
+
+def run_extraction_benchmark(pages, iterations):
+    """Milliseconds per results page of each SERP extractor on pre-parsed trees"""
+    from bs4 import BeautifulSoup
+
+    soups = [BeautifulSoup(page, "html.parser", from_encoding="utf-8") for page in pages]
+    timings = {}
+    for name, extract in (("cascade", select_serp_results), ("single-pass", SERP_EXTRACTOR.extract)):
+        start = time.perf_counter()
+        for i in range(iterations):
+            for soup in soups:
+                extract(soup, 5)
+        timings[name] = round((time.perf_counter() - start) * 1000 / (iterations * len(soups)), 2)
+    mismatched = [i for i, soup in enumerate(soups) if select_serp_results(soup, 5) != SERP_EXTRACTOR.extract(soup, 5)]
+    return timings, mismatched
+
+def run_mode_benchmark(pages, iterations, mode):
+    """Milliseconds per page and per results page of one parse mode, on one thread"""
+    timings = {}
+    for name, parse in (("page", parse_page), ("serp", parse_serp)):
+        parse(pages[0], "utf-8", mode=mode)
+        start = time.perf_counter()
+        for i in range(iterations):
+            parse(pages[i % len(pages)], "utf-8", mode=mode)
+        timings[name] = round((time.perf_counter() - start) * 1000 / iterations, 2)
+    return timings
+
+def run_benchmark(pages, requests, concurrency, workers):
+    pool = ParsePool(workers)
+    try:
+        # Start the worker processes before timing
+        pool.run(parse_serp, pages[0])
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as threads:
+            outcomes = list(threads.map(lambda i: pool.run(parse_serp, pages[i % len(pages)]), range(requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+    return {
+        "workers": workers,
+        "requests": requests,
+        "concurrency": concurrency,
+        "parsed": sum(1 for results in outcomes if results),
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2) if elapsed else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML parse benchmark for the Autonomous AI Agent")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Directory of fixture result pages")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="Request threads parsing at the same time")
+    parser.add_argument("--workers", default="0,1,4,8", help="Comma-separated parse pool sizes; 0 parses inline")
+    parser.add_argument("--modes", default="full,targeted", help="Comma-separated parse modes to compare")
+    parser.add_argument("--iterations", type=int, default=20, help="Parses per mode in the mode comparison")
+    parser.add_argument("--inflate", type=int, default=20, help="Padding added to each fixture page")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.inflate)
+    if not pages:
+        print(f"No fixture pages found in {args.corpus}")
+        return 1
+
+    print("=" * 60)
+    print("Autonomous AI Agent - HTML Parse Benchmark")
+    print(f"{len(pages)} pages, {sum(map(len, pages)) // len(pages) // 1024} KB on average, "
+          f"{os.cpu_count()} CPUs")
+    print("=" * 60)
+    timings, mismatched = run_extraction_benchmark(pages, args.iterations)
+    print(f"{'extractor':>12} {'serp (ms)':>12}")
+    for name, milliseconds in timings.items():
+        print(f"{name:>12} {milliseconds:>12}")
+    if mismatched:
+        print(f"Extractors disagree on pages: {mismatched}")
+    print()
+    print(f"Targeted mode parser: {html_parser()}")
+    print(f"{'mode':>8} {'page (ms)':>12} {'serp (ms)':>12}")
+    for mode in args.modes.split(","):
+        timings = run_mode_benchmark(pages, args.iterations, mode)
+        print(f"{mode:>8} {timings['page']:>12} {timings['serp']:>12}")
+    print()
+    print(f"{'workers':>8} {'requests/s':>12} {'elapsed (s)':>12}")
+    for workers in (int(value) for value in args.workers.split(",")):
+        results = run_benchmark(pages, args.requests, args.concurrency, workers)
+        label = "inline" if workers == 0 else str(workers)
+        print(f"{label:>8} {results['requests_per_second']:>12} {results['elapsed_seconds']:>12}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Offline throughput benchmark for the Autonomous AI Agent.
+Runs instructions end to end against a recorded cassette, so Gemini, web and SerpAPI
+latency is simulated and results are reproducible without network access.
+
+Usage:
+    python benchmark_replay.py --iterations 20 --concurrency 4 --latency-scale 0.1
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from app import AIAgent
+from backends import ReplayBackend, set_backend
+
+DEFAULT_CASSETTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "cassettes", "benchmark.json")
+
+INSTRUCTIONS = [
+    "Research the python programming language and summarize what it is used for",
+    "Look up python web frameworks and give me an overview",
+    "Gather information about python for data science",
+    "Investigate the history of the python programming language",
+]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def run_instruction(instruction):
+    # Bypass the response cache so every run pays the simulated LLM latency
+    agent = AIAgent(bypass_cache=True)
+    start = time.perf_counter()
+    result = agent.process_instruction(instruction)
+    return time.perf_counter() - start, result.get("status")
+
+def run_benchmark(cassette, iterations, concurrency, latency_scale):
+    backend = ReplayBackend(cassette, latency="recorded", latency_scale=latency_scale)
+    previous = set_backend(backend)
+    try:
+        instructions = [INSTRUCTIONS[i % len(INSTRUCTIONS)] for i in range(iterations)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(run_instruction, instructions))
+        elapsed = time.perf_counter() - start
+    finally:
+        set_backend(previous)
+
+    latencies = [latency for latency, _ in outcomes]
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "latency_scale": latency_scale,
+        "completed": sum(1 for _, status in outcomes if status == "completed"),
+        "elapsed_seconds": round(elapsed, 3),
+        "instructions_per_second": round(iterations / elapsed, 2) if elapsed else 0.0,
+        "p50_seconds": round(percentile(latencies, 0.5), 3),
+        "p95_seconds": round(percentile(latencies, 0.95), 3),
+        "backend": backend.stats(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay benchmark for the Autonomous AI Agent")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-scale", type=float, default=0.1,
+                        help="Multiplier applied to the recorded latency of each exchange")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_benchmark(args.cassette, args.iterations, args.concurrency, args.latency_scale)
+
+    print("=" * 60)
+    print("Autonomous AI Agent - Replay Benchmark")
+    print("=" * 60)
+    for name, value in results.items():
+        print(f"{name:>24}: {value}")
+    return 0 if results["completed"] == results["iterations"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
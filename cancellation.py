@@ -0,0 +1,87 @@
+"""
+Cooperative cancellation.
+A CancellationToken is shared by a job and the agent running it. The agent checks it between
+steps, and the code blocked on I/O registers a callback that aborts the I/O when the token
+is cancelled: closing the connection of an HTTP fetch, or killing a command's process tree.
+"""
+
+import os
+import signal
+import subprocess
+import threading
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its token has been cancelled"""
+
+
+class CancellationToken:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._callbacks = {}
+        self._next_id = 0
+        self.reason = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        """Cancel the token and run the registered callbacks; returns False if it already was"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # Aborting is best effort; the cancelled code notices the token anyway
+                pass
+        return True
+
+    def check(self):
+        if self._event.is_set():
+            raise JobCancelled(f"Job cancelled: {self.reason}")
+
+    def on_cancel(self, callback):
+        """Run callback when the token is cancelled (at once if it already is)
+
+        Returns a function that unregisters the callback.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                callback_id = self._next_id
+                self._next_id += 1
+                self._callbacks[callback_id] = callback
+                return lambda: self._remove(callback_id)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback_id):
+        with self._lock:
+            self._callbacks.pop(callback_id, None)
+
+
+def popen_group_options():
+    """Popen keyword arguments that start the command in its own process group"""
+    if os.name == "posix":
+        return {"start_new_session": True}
+    return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+
+def kill_process_tree(process):
+    """Kill a process started with popen_group_options() and everything it started"""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+    except OSError:
+        process.kill()
@@ -0,0 +1,70 @@
+"""
+Request deadlines.
+Each request gets a time budget when it arrives. The budget is carried by the agent into
+every step, and each network call, command and LLM call derives its timeout from what is
+left of it (capped per call type), so one slow site or model call cannot hold a worker
+past the deadline.
+"""
+
+import time
+import threading
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the request's time budget has run out"""
+
+
+class Deadline:
+    """A point in time by which a request must finish; seconds=None means no deadline"""
+
+    def __init__(self, seconds=None, clock=time.monotonic):
+        self.seconds = seconds if seconds and seconds > 0 else None
+        self.clock = clock
+        self.started = clock()
+
+    def remaining(self):
+        """Seconds left, or None without a deadline"""
+        if self.seconds is None:
+            return None
+        return max(0.0, self.seconds - (self.clock() - self.started))
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def check(self, what="request"):
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g}s exceeded before {what}")
+
+    def timeout(self, cap=None, what="call"):
+        """Timeout for a single call: the remaining budget, capped at cap seconds
+
+        Raises DeadlineExceeded if nothing is left.
+        """
+        self.check(what)
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(cap, remaining)
+
+
+class TimeoutCounter:
+    """Process-wide count of timeouts per environment"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.deadlines_exceeded = 0
+
+    def add(self, environment):
+        with self._lock:
+            self.counts[environment] = self.counts.get(environment, 0) + 1
+
+    def add_exceeded(self):
+        with self._lock:
+            self.deadlines_exceeded += 1
+
+    def stats(self):
+        with self._lock:
+            return {"by_environment": dict(self.counts), "total": sum(self.counts.values()),
+                    "deadlines_exceeded": self.deadlines_exceeded}
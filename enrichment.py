@@ -0,0 +1,121 @@
+"""
+Enrichment of search results with the text of their pages.
+A search returns a title, link and snippet per result; without the pages themselves the
+extraction steps work from the snippets and the LLM fills the gaps. The enricher fetches
+the top results' pages concurrently on a bounded pool, with a limit on concurrent fetches
+per host, and attaches the main text of each page to the result that linked to it. The
+whole batch has a time budget: fetches still running when it runs out are aborted and
+their results are left as they were.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+from cancellation import CancellationToken, JobCancelled
+
+logger = logging.getLogger(__name__)
+
+
+def result_host(result):
+    """Host of a result's link, or None for links that cannot be fetched"""
+    parsed = urlparse(result.get("link") or "")
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return None
+    return parsed.netloc.lower()
+
+
+class ResultEnricher:
+    """Fetches the pages of search results on a shared pool
+
+    fetch(url, cancel_token, timeout) returns a dict with the page "title" and "text".
+    """
+
+    def __init__(self, fetch, max_workers=4, per_host=2):
+        self.fetch = fetch
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="enrich")
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self.counters = {"batches": 0, "requested": 0, "enriched": 0, "failed": 0, "dropped": 0}
+
+    def _slots(self, host):
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def enrich(self, results, top_n=3, budget_seconds=8.0, cancel_token=None):
+        """Copies of results with a "page" attached to the first top_n fetchable ones
+
+        Returns the results and a summary of the batch. A cancelled parent token cancels
+        the fetches in flight.
+        """
+        results = [dict(result) for result in results]
+        targets = [result for result in results if result_host(result)][:max(0, top_n)]
+        summary = {"requested": len(targets), "enriched": 0, "failed": 0, "dropped": 0, "elapsed_ms": 0.0}
+        if not targets or budget_seconds <= 0:
+            summary["dropped"] = len(targets)
+            self._add(summary)
+            return results, summary
+
+        start = time.monotonic()
+        deadline = start + budget_seconds
+        # Cancelled when the budget runs out, which aborts the downloads still in flight
+        batch_token = CancellationToken()
+        unregister = cancel_token.on_cancel(lambda: batch_token.cancel("job cancelled")) if cancel_token else None
+        futures = {self._executor.submit(self._fetch_one, result, deadline, batch_token): result
+                   for result in targets}
+        try:
+            done, not_done = wait(futures, timeout=budget_seconds)
+            for future in not_done:
+                future.cancel()
+            batch_token.cancel("enrichment budget exhausted")
+        finally:
+            if unregister is not None:
+                unregister()
+
+        for future, result in futures.items():
+            if future in not_done:
+                summary["dropped"] += 1
+                continue
+            outcome = future.exception() or future.result()
+            if isinstance(outcome, dict):
+                result["page"] = outcome
+                summary["enriched"] += 1
+            elif isinstance(outcome, JobCancelled):
+                summary["dropped"] += 1
+            else:
+                logger.info(f"Could not enrich {result.get('link')}: {str(outcome)}")
+                summary["failed"] += 1
+
+        if cancel_token is not None:
+            cancel_token.check()
+        summary["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+        self._add(summary)
+        return results, summary
+
+    def _fetch_one(self, result, deadline, batch_token):
+        slots = self._slots(result_host(result))
+        if not slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise JobCancelled("No free connection to the host within the enrichment budget")
+        try:
+            batch_token.check()
+            started = time.monotonic()
+            page = self.fetch(result["link"], batch_token, max(0.1, deadline - started))
+            return {**page, "fetch_ms": round((time.monotonic() - started) * 1000, 1)}
+        finally:
+            slots.release()
+
+    def _add(self, summary):
+        with self._lock:
+            self.counters["batches"] += 1
+            for name in ("requested", "enriched", "failed", "dropped"):
+                self.counters[name] += summary[name]
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "max_workers": self.max_workers, "per_host": self.per_host}
@@ -0,0 +1,110 @@
+"""
+Agent history.
+The agent keeps every user message and step result so that later steps can use earlier
+results: extraction steps read the latest search results, and "save ... to file" steps the
+latest extraction. The history store indexes the entries by kind (search, extraction, ...),
+extraction type and step number, so those lookups do not scan the whole history, and holds
+at most max_entries entries, evicting the oldest first.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+def entry_kind(entry):
+    """The kind an entry is indexed under: message, search, the result's action_type, or step"""
+    if not isinstance(entry, dict):
+        return "step"
+    if "role" in entry:
+        return "message"
+    if "results" in entry:
+        return "search"
+    return entry.get("action_type") or "step"
+
+
+class HistoryStore:
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._next_seq = 0
+        # Each index maps a key to the sequence numbers of its entries, oldest first
+        self._by_kind = {}
+        self._by_extraction_type = {}
+        self._by_step = {}
+        self.evicted = 0
+
+    def _indexes(self, entry):
+        yield self._by_kind, entry_kind(entry)
+        if isinstance(entry, dict):
+            if entry.get("action_type") == "extraction":
+                yield self._by_extraction_type, entry.get("extraction_type", "")
+            if entry.get("step_number") is not None:
+                yield self._by_step, entry["step_number"]
+
+    def append(self, entry):
+        """Add an entry, evicting the oldest ones beyond max_entries; returns its sequence number"""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._entries[seq] = entry
+            for index, key in self._indexes(entry):
+                index.setdefault(key, OrderedDict())[seq] = None
+            while len(self._entries) > self.max_entries:
+                self._evict()
+            return seq
+
+    def _evict(self):
+        seq, entry = self._entries.popitem(last=False)
+        for index, key in self._indexes(entry):
+            seqs = index[key]
+            del seqs[seq]
+            if not seqs:
+                del index[key]
+        self.evicted += 1
+
+    def mark(self):
+        """Sequence number of the newest entry, for lookups that must not see later entries"""
+        with self._lock:
+            return self._next_seq - 1
+
+    def _latest(self, index, key, until):
+        seqs = index.get(key)
+        if not seqs:
+            return None
+        for seq in reversed(seqs):
+            # Only entries added after the mark are skipped, so this stays short
+            if until is None or seq <= until:
+                return self._entries[seq]
+        return None
+
+    def latest(self, kind, until=None):
+        """The newest entry of a kind (optionally added no later than the mark until), or None"""
+        with self._lock:
+            return self._latest(self._by_kind, kind, until)
+
+    def latest_extraction(self, extraction_type, until=None):
+        """The newest extraction result of an extraction type, or None"""
+        with self._lock:
+            return self._latest(self._by_extraction_type, extraction_type, until)
+
+    def by_step(self, step_number):
+        """The newest result of a step number, or None"""
+        with self._lock:
+            return self._latest(self._by_step, step_number, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries.values()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "evicted": self.evicted,
+                "by_kind": {kind: len(seqs) for kind, seqs in self._by_kind.items()}
+            }
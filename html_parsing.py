@@ -0,0 +1,375 @@
+"""
+HTML parsing for the browser environment.
+Parsing a page with BeautifulSoup is CPU-bound, and on the request thread it holds the GIL,
+so concurrent requests take turns parsing. The parse functions here take the raw response
+bytes and return only the compact fields the agent uses (a title and preview, or a result
+list). They are plain module-level functions, so the optional parse pool can run them in
+worker processes; with no workers they run inline.
+
+In the default "targeted" mode the bytes are decoded once with the declared charset, lxml
+is used when it is installed, and a SoupStrainer keeps only the elements that are read
+(the title and page body, or the result containers), and results pages go through the
+single-pass SerpExtractor. The "full" mode builds the whole html.parser tree and runs the
+selector cascade as before.
+"""
+
+import re
+import codecs
+import threading
+from html.parser import HTMLParser
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from serp_extractor import SERP_LAYOUTS, SerpExtractor
+
+# Google search layouts of the selector cascade, tried in order until one yields results
+SERP_RESULT_SELECTORS = [layout["container"] for layout in SERP_LAYOUTS]
+
+SERP_EXTRACTOR = SerpExtractor()
+
+PREVIEW_LENGTH = 500
+
+# Bytes a streamed page is read past a full <body> preview in case a <main> follows
+MAIN_LOOKAHEAD_BYTES = 64 * 1024
+
+PARSE_MODES = ("targeted", "full")
+
+CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+
+# Bytes searched for a <meta> charset, as browsers do
+META_SNIFF_BYTES = 2048
+
+_parser = None
+
+
+def html_parser():
+    """lxml when it is installed, otherwise the standard library parser"""
+    global _parser
+    if _parser is None:
+        try:
+            import lxml  # noqa: F401
+            _parser = "lxml"
+        except ImportError:
+            _parser = "html.parser"
+    return _parser
+
+
+def declared_charset(content_type):
+    """Charset of a Content-Type header, or None when it does not declare one"""
+    match = CHARSET_RE.search(content_type or "")
+    return match.group(1) if match else None
+
+
+def sniff_charset(content, encoding=None):
+    """Codec for page bytes: a BOM, the declared charset, a <meta> charset or UTF-8"""
+    candidates = [encoding]
+    for bom, bom_encoding in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"),
+                              (codecs.BOM_UTF16_BE, "utf-16")):
+        if content.startswith(bom):
+            candidates.insert(0, bom_encoding)
+    match = META_CHARSET_RE.search(content[:META_SNIFF_BYTES])
+    if match:
+        candidates.append(match.group(1).decode("ascii", "ignore"))
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            return codecs.lookup(candidate).name
+        except LookupError:
+            continue
+    return "utf-8"
+
+
+def decode_html(content, encoding=None):
+    """Decode page bytes with the charset found by sniff_charset
+
+    This replaces the statistical detection of requests and BeautifulSoup, which reads
+    the whole page and costs more than parsing it.
+    """
+    if isinstance(content, str):
+        return content
+    return content.decode(sniff_charset(content, encoding), errors="replace")
+
+
+def _make_soup(content, encoding, mode, parse_only=None):
+    # Imported on first use to keep server startup fast
+    from bs4 import BeautifulSoup
+
+    if mode == "full":
+        return BeautifulSoup(content, 'html.parser', from_encoding=encoding)
+    return BeautifulSoup(decode_html(content, encoding), html_parser(), parse_only=parse_only)
+
+
+def _text_preview(element, limit):
+    """Text of element cut to limit characters, without walking the rest of it"""
+    parts = []
+    length = 0
+    for text in element.strings:
+        parts.append(text)
+        length += len(text)
+        if length >= limit:
+            break
+    return "".join(parts)[:limit]
+
+
+def parse_page(content, encoding=None, mode="targeted", limit=PREVIEW_LENGTH):
+    """Title and text preview of a page, of up to limit characters"""
+    from bs4 import SoupStrainer
+
+    soup = _make_soup(content, encoding, mode, parse_only=SoupStrainer(["title", "main", "body"]))
+    title = soup.title.string if soup.title else "No title"
+
+    # Extract main content (simplified)
+    main_content = soup.find('main') or soup.find('body')
+    if main_content is None:
+        content_text = "Could not extract content"
+    elif mode == "full":
+        content_text = main_content.get_text()[:limit] + "..."
+    else:
+        content_text = _text_preview(main_content, limit) + "..."
+
+    # Plain strings, so that the result does not drag the parse tree back from a worker
+    return {"title": str(title) if title is not None else None, "content_preview": content_text}
+
+
+def class_pattern(names):
+    """Regex for SoupStrainer(class_=...) matching elements that have any of the classes
+
+    Since bs4 4.13 a list of class names does not match elements with more than one class
+    (class="egMi0 kCrYT"), so the individual classes are matched with a regex instead.
+    """
+    alternatives = "|".join(re.escape(name) for name in names)
+    return re.compile(rf"(?:^|\s)(?:{alternatives})(?:\s|$)")
+
+
+def parse_serp(content, encoding=None, limit=5, mode="targeted"):
+    """Organic results of a Google results page as title, link and snippet dicts"""
+    from bs4 import SoupStrainer
+
+    if mode == "full":
+        return select_serp_results(_make_soup(content, encoding, mode), limit)
+
+    # Decode once for both passes below
+    content = decode_html(content, encoding)
+    # Only the result containers, with everything inside them
+    soup = _make_soup(content, encoding, mode, parse_only=SoupStrainer(class_=class_pattern(SERP_EXTRACTOR.container_classes)))
+    search_results = SERP_EXTRACTOR.extract(soup, limit, fallback_links=False)
+    if not search_results:
+        # The strained tree holds no links outside result containers; parse the links only
+        soup = _make_soup(content, encoding, mode, parse_only=SoupStrainer("a"))
+        search_results = SERP_EXTRACTOR.extract_links(soup, limit)
+    return search_results
+
+
+def select_serp_results(soup, limit=5):
+    """The selector cascade of the full parse mode: a select per layout until one yields results"""
+    # Extract search results (improved)
+    search_results = []
+
+    # Try different selectors for different Google search layouts
+    for selector in SERP_RESULT_SELECTORS:
+        results = soup.select(selector)
+        if results:
+            for result in results[:limit]:
+                # Try to extract title
+                title_elem = result.select_one("h3") or result.select_one(".LC20lb")
+
+                # Try to extract link
+                link_elem = result.select_one("a")
+
+                # Try to extract snippet
+                snippet_elem = result.select_one(".VwiC3b") or result.select_one(".st") or result.select_one(".aCOpRe")
+
+                if title_elem and link_elem:
+                    title = title_elem.get_text()
+                    link = link_elem.get("href")
+
+                    # Clean up link if needed
+                    if link.startswith("/url?q="):
+                        link = link.split("/url?q=")[1].split("&")[0]
+
+                    # Extract snippet if available
+                    snippet = snippet_elem.get_text() if snippet_elem else "No description available"
+
+                    search_results.append({
+                        "title": title,
+                        "link": link,
+                        "snippet": snippet
+                    })
+
+            # If we found results with this selector, break the loop
+            if search_results:
+                break
+
+    # If we still don't have results, try a more generic approach
+    if not search_results:
+        for a_tag in soup.select("a"):
+            if a_tag.get("href", "").startswith("http") and a_tag.text and len(a_tag.text.strip()) > 10:
+                search_results.append({
+                    "title": a_tag.text.strip(),
+                    "link": a_tag.get("href"),
+                    "snippet": "No description available"
+                })
+
+                if len(search_results) >= limit:
+                    break
+
+    return search_results
+
+
+class PagePreview(HTMLParser):
+    """Incremental title and preview extraction for a streamed page
+
+    feed_bytes() takes the body as it arrives; done turns true once the title is known
+    and the preview is complete, so the rest of the page need not be downloaded. The
+    result matches parse_page: the text of the first <main>, or of <body> without one,
+    leaving out scripts, styles and templates.
+    """
+
+    SKIPPED_TAGS = {"script", "style", "template"}
+
+    def __init__(self, encoding=None, limit=PREVIEW_LENGTH, main_lookahead=MAIN_LOOKAHEAD_BYTES):
+        super().__init__(convert_charrefs=True)
+        self.encoding = encoding
+        self.limit = limit
+        self.main_lookahead = main_lookahead
+        self.bytes_fed = 0
+        self._head = b""
+        self._decoder = None
+        self._skip_depth = 0
+        self._title_parts = None
+        self._title_done = False
+        self._body = {"seen": False, "open": False, "parts": [], "length": 0}
+        self._main = {"seen": False, "open": False, "parts": [], "length": 0, "depth": 0}
+        self._body_full_at = None
+
+    def feed_bytes(self, chunk):
+        self.bytes_fed += len(chunk)
+        if self._decoder is None:
+            self._head += chunk
+            # Without a declared charset wait for the bytes that may hold a <meta> charset
+            if self.encoding is None and len(self._head) < META_SNIFF_BYTES:
+                return
+            self._start_decoding()
+        else:
+            self.feed(self._decoder.decode(chunk))
+
+    def _start_decoding(self):
+        charset = sniff_charset(self._head, self.encoding)
+        self._decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+        head, self._head = self._head, b""
+        self.feed(self._decoder.decode(head))
+
+    def close(self):
+        if self._decoder is None:
+            self._start_decoding()
+        self.feed(self._decoder.decode(b"", final=True))
+        super().close()
+
+    @property
+    def done(self):
+        title_known = self._title_done or self._body["seen"]
+        main = self._main
+        if main["seen"]:
+            return title_known and (main["length"] >= self.limit or not main["open"])
+        if self._body["seen"] and not self._body["open"]:
+            return title_known
+        return (title_known and self._body_full_at is not None
+                and self.bytes_fed - self._body_full_at >= self.main_lookahead)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == "title" and self._title_parts is None:
+            self._title_parts = []
+        elif tag == "body" and not self._body["seen"]:
+            self._body.update(seen=True, open=True)
+        elif tag == "main":
+            main = self._main
+            if not main["seen"]:
+                main.update(seen=True, open=True)
+            if main["open"]:
+                main["depth"] += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "title" and self._title_parts is not None:
+            self._title_done = True
+        elif tag == "body":
+            self._body["open"] = False
+        elif tag == "main" and self._main["open"]:
+            self._main["depth"] -= 1
+            if self._main["depth"] == 0:
+                self._main["open"] = False
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._title_parts is not None and not self._title_done:
+            self._title_parts.append(data)
+        for section in (self._body, self._main):
+            if section["open"] and section["length"] < self.limit:
+                section["parts"].append(data)
+                section["length"] += len(data)
+        if self._body_full_at is None and self._body["length"] >= self.limit:
+            self._body_full_at = self.bytes_fed
+
+    def result(self):
+        """Title and preview in the shape parse_page returns"""
+        if self._title_parts is None:
+            title = "No title"
+        else:
+            title = "".join(self._title_parts) or None
+        section = self._main if self._main["seen"] else self._body
+        if section["seen"]:
+            content_text = "".join(section["parts"])[:self.limit] + "..."
+        else:
+            content_text = "Could not extract content"
+        return {"title": title, "content_preview": content_text}
+
+
+class ParsePool:
+    """Runs parse functions in worker processes, or inline with workers=0
+
+    Only the raw bytes go to a worker and only the extracted fields come back. The pool
+    is started on first use with the spawn method, so workers do not inherit the locks
+    of a threaded server.
+    """
+
+    def __init__(self, workers=0, timeout=None):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self.inline_parses = 0
+        self.pool_parses = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def run(self, parse, content, *args, timeout=None):
+        """Run parse(content, *args), in a worker process if the pool has any"""
+        with self._lock:
+            if not self.workers:
+                self.inline_parses += 1
+            else:
+                self.pool_parses += 1
+        if not self.workers:
+            return parse(content, *args)
+        return self._get_executor().submit(parse, content, *args).result(
+            timeout=timeout if timeout is not None else self.timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def stats(self):
+        return {"workers": self.workers, "inline_parses": self.inline_parses, "pool_parses": self.pool_parses}
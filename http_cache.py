@@ -0,0 +1,360 @@
+"""
+HTTP response cache for fetched pages.
+Pages fetched by the browser environment are stored on disk with their validators (ETag,
+Last-Modified) and served while fresh according to Cache-Control (or Expires, or the
+usual 10% of the Last-Modified age). Stale entries with validators are revalidated with a
+conditional request, so an unchanged page costs a round trip and a 304 instead of the
+download. Hot URLs may be served stale while they are revalidated in the background. The
+store is bounded in bytes and evicts the least recently used pages first.
+
+Streamed fetches that stop reading once they have what they need store the start of the
+body as a partial entry. Partial entries serve and revalidate later streamed fetches;
+full fetches through get() treat them as missing.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from backends import serialize_response, deserialize_response
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL_RE = re.compile(r'([\w-]+)\s*(?:=\s*("[^"]*"|[^,\s]*))?')
+
+# Statuses whose responses are stored
+CACHEABLE_STATUSES = (200, 203)
+
+
+def parse_cache_control(value):
+    """Cache-Control directives as a dict of lower-case name to value (None without one)"""
+    directives = {}
+    for name, argument in CACHE_CONTROL_RE.findall(value or ""):
+        directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def _seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness(headers, now):
+    """Seconds a response stays fresh, and the stale-while-revalidate window it allows"""
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    swr = _seconds(directives.get("stale-while-revalidate")) or 0
+    if "no-cache" in directives:
+        return 0, 0
+    if "must-revalidate" in directives:
+        swr = 0
+    max_age = _seconds(directives.get("max-age"))
+    if max_age is not None:
+        return max_age, swr
+
+    date = _http_date(headers.get("Date")) or now
+    expires = _http_date(headers.get("Expires"))
+    if expires is not None:
+        return max(0, expires - date), swr
+    last_modified = _http_date(headers.get("Last-Modified"))
+    if last_modified is not None:
+        # Heuristic freshness: a tenth of the time since the page last changed
+        return max(0, (date - last_modified) / 10), swr
+    return 0, swr
+
+
+def is_storable(response):
+    if response.status_code not in CACHEABLE_STATUSES:
+        return False
+    directives = parse_cache_control(response.headers.get("Cache-Control"))
+    if "no-store" in directives or response.headers.get("Vary", "").strip() == "*":
+        return False
+    # Without a freshness lifetime or a validator a stored page could never be used
+    has_validator = "ETag" in response.headers or "Last-Modified" in response.headers
+    return has_validator or freshness(response.headers, time.time())[0] > 0
+
+
+class HttpCache:
+    """On-disk page cache
+
+    fetch(extra_headers) performs the GET and returns a requests.Response; the cache
+    adds If-None-Match / If-Modified-Since to revalidate a stored page. URLs looked up
+    at least hot_after times are served stale for up to swr_seconds past their freshness
+    (or the stale-while-revalidate the server allows) while a background fetch revalidates
+    them.
+    """
+
+    def __init__(self, disk_dir, max_bytes=100 * 1024 * 1024, swr_seconds=0, hot_after=3,
+                 revalidate_workers=2, clock=time.time):
+        self.disk_dir = disk_dir
+        self.max_bytes = max_bytes
+        self.swr_seconds = swr_seconds
+        self.hot_after = hot_after
+        self.clock = clock
+        self._lock = threading.Lock()
+        # url key -> {"size", "lookups"} in least recently used order
+        self._index = OrderedDict()
+        self._bytes = 0
+        self._revalidating = set()
+        self._executor = ThreadPoolExecutor(max_workers=revalidate_workers, thread_name_prefix="http-revalidate")
+        self.counters = {"hits": 0, "stale_hits": 0, "revalidations": 0, "misses": 0, "stores": 0,
+                         "evictions": 0, "uncacheable": 0}
+
+        os.makedirs(self.disk_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def get(self, url, fetch, background_fetch=None):
+        """Return the response for url from the cache or through fetch"""
+        key = self.make_key(url)
+        entry = self._read(key)
+        now = self.clock()
+
+        if entry is None or entry.get("partial"):
+            return self._fetch_and_store(key, url, fetch, "misses")
+
+        with self._lock:
+            lookups = self._touch(key)
+        age = now - entry["stored"]
+        if age <= entry["fresh_for"]:
+            self._count("hits")
+            return deserialize_response(entry["response"])
+
+        swr = max(entry["swr"], self.swr_seconds)
+        if lookups >= self.hot_after and age <= entry["fresh_for"] + swr and self._validators(entry):
+            self._count("stale_hits")
+            self._revalidate_in_background(key, url, entry, background_fetch or fetch)
+            return deserialize_response(entry["response"])
+
+        return self._revalidate(key, url, entry, fetch)
+
+    def lookup(self, url):
+        """The stored entry for url without fetching or counting anything, or None
+
+        Returns a dict with the stored "response", whether it is "fresh", whether only
+        the start of its body was stored ("partial") and the "validators" that revalidate it.
+        """
+        key = self.make_key(url)
+        entry = self._read(key)
+        if entry is None:
+            return None
+        with self._lock:
+            self._touch(key)
+        return {
+            "response": deserialize_response(entry["response"]),
+            "fresh": self.clock() - entry["stored"] <= entry["fresh_for"],
+            "partial": bool(entry.get("partial")),
+            "validators": self._validators(entry),
+        }
+
+    def record_hit(self):
+        """Count a stored response served by a caller of lookup()"""
+        self._count("hits")
+
+    def revalidated(self, url, response):
+        """Refresh the stored entry for url with the headers of a 304 and return its response"""
+        key = self.make_key(url)
+        entry = self._read(key)
+        if entry is None:
+            return None
+        return self._refresh(key, url, entry, response)
+
+    def store(self, url, response, partial=False):
+        """Store a response fetched outside get(), whose content holds the body read
+
+        With partial only the start of the body was read.
+        """
+        return self._store_response(self.make_key(url), url, response, "misses", partial=partial)
+
+    def _validators(self, entry):
+        headers = {}
+        stored = entry["response"]["headers"]
+        if stored.get("ETag"):
+            headers["If-None-Match"] = stored["ETag"]
+        if stored.get("Last-Modified"):
+            headers["If-Modified-Since"] = stored["Last-Modified"]
+        return headers
+
+    def _revalidate(self, key, url, entry, fetch):
+        validators = self._validators(entry)
+        if not validators:
+            return self._fetch_and_store(key, url, fetch, "misses")
+
+        response = fetch(validators)
+        if response.status_code != 304:
+            return self._store_response(key, url, response, "misses")
+        return self._refresh(key, url, entry, response)
+
+    def _refresh(self, key, url, entry, response):
+        # Unchanged: refresh the stored entry with the headers of the 304
+        self._count("revalidations")
+        stored = entry["response"]
+        for name in ("Cache-Control", "Expires", "Date", "ETag", "Last-Modified"):
+            if name in response.headers:
+                stored["headers"][name] = response.headers[name]
+        self._write(key, self._entry(url, stored, stored["headers"], entry.get("partial", False)))
+        return deserialize_response(stored)
+
+    def _revalidate_in_background(self, key, url, entry, fetch):
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                self._revalidate(key, url, entry, fetch)
+            except Exception as e:
+                logger.warning(f"Background revalidation of {url} failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        self._executor.submit(run)
+
+    def _fetch_and_store(self, key, url, fetch, counter):
+        return self._store_response(key, url, fetch({}), counter)
+
+    def _store_response(self, key, url, response, counter, partial=False):
+        self._count(counter)
+        if is_storable(response):
+            record = serialize_response(response)
+            self._write(key, self._entry(url, record, response.headers, partial))
+            self._count("stores")
+        else:
+            self._count("uncacheable")
+            self._delete(key)
+        return response
+
+    def _entry(self, url, record, headers, partial=False):
+        fresh_for, swr = freshness(headers, self.clock())
+        entry = {"url": url, "stored": self.clock(), "fresh_for": fresh_for, "swr": swr, "response": record}
+        if partial:
+            entry["partial"] = True
+        return entry
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _touch(self, key):
+        # Caller must hold the lock
+        meta = self._index.get(key)
+        if meta is None:
+            return 0
+        self._index.move_to_end(key)
+        meta["lookups"] += 1
+        return meta["lookups"]
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """Index the pages already on disk, oldest first"""
+        found = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    found.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(found):
+            self._index[key] = {"size": size, "lookups": 0}
+            self._bytes += size
+        with self._lock:
+            self._evict()
+
+    def _read(self, key):
+        with self._lock:
+            if key not in self._index:
+                return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read cached page {key}: {str(e)}")
+            self._delete(key)
+            return None
+
+    def _write(self, key, entry):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps(entry)
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write cached page {path}: {str(e)}")
+            return
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous["size"]
+            self._index[key] = {"size": len(data), "lookups": previous["lookups"] if previous else 0}
+            self._bytes += len(data)
+            self._evict()
+
+    def _delete(self, key):
+        with self._lock:
+            meta = self._index.pop(key, None)
+            if meta is None:
+                return
+            self._bytes -= meta["size"]
+        self._remove_file(key)
+
+    def _evict(self):
+        # Caller must hold the lock
+        while self._bytes > self.max_bytes and self._index:
+            key, meta = self._index.popitem(last=False)
+            self._bytes -= meta["size"]
+            self.counters["evictions"] += 1
+            self._remove_file(key)
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def close(self):
+        """Wait for background revalidations to finish"""
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["stale_hits"] + self.counters["revalidations"] + self.counters["misses"]
+
+            def rate(*names):
+                return round(sum(self.counters[name] for name in names) / lookups, 4) if lookups else 0.0
+
+            return {
+                **self.counters,
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": rate("hits", "stale_hits"),
+                "revalidation_rate": rate("revalidations"),
+                "miss_rate": rate("misses"),
+            }
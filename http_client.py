@@ -0,0 +1,157 @@
+"""
+Shared HTTP client for the browser environment and other fetchers.
+A bare requests.get opens a new TCP and TLS connection for every fetch and gives up on the
+first transient error. The client keeps one session with a connection pool per host (with
+a limit on connections per host), retries idempotent requests with exponential backoff,
+negotiates compressed responses and sends one consistent User-Agent. It counts new and
+reused connections, so the savings of keep-alive can be checked at /api/metrics.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/91.0.4472.124 Safari/537.36"
+)
+
+# Statuses worth retrying: rate limits and transient server or gateway errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def accept_encoding():
+    """Encodings urllib3 can decode here; brotli only when a brotli package is installed"""
+    encodings = ["gzip", "deflate"]
+    try:
+        import brotli  # noqa: F401
+        encodings.append("br")
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            encodings.append("br")
+        except ImportError:
+            pass
+    return ", ".join(encodings)
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.retries = 0
+
+    def add(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def _counting_pool(pool_class, counters):
+    class CountingPool(pool_class):
+        def _new_conn(self):
+            counters.add("new_connections")
+            return super()._new_conn()
+    return CountingPool
+
+
+def _counting_retry(counters):
+    class CountingRetry(Retry):
+        def increment(self, *args, **kwargs):
+            counters.add("retries")
+            return super().increment(*args, **kwargs)
+    return CountingRetry
+
+
+class _PoolAdapter(HTTPAdapter):
+    def __init__(self, counters, **kwargs):
+        self._counters = counters
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self._counters),
+            "https": _counting_pool(HTTPSConnectionPool, self._counters),
+        }
+
+
+class FetchStats:
+    """Bytes downloaded and time to first byte of page fetches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.bytes_downloaded = 0
+        self.stopped_early = 0
+        self.truncated = 0
+        self._ttfb_total = 0.0
+        self._ttfb_count = 0
+
+    def record(self, info):
+        with self._lock:
+            self.fetches += 1
+            self.bytes_downloaded += info.get("bytes_downloaded", 0)
+            self.stopped_early += 1 if info.get("stopped_early") else 0
+            self.truncated += 1 if info.get("truncated") else 0
+            if info.get("ttfb_ms") is not None:
+                self._ttfb_total += info["ttfb_ms"]
+                self._ttfb_count += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "fetches": self.fetches,
+                "bytes_downloaded": self.bytes_downloaded,
+                "stopped_early": self.stopped_early,
+                "truncated": self.truncated,
+                "avg_ttfb_ms": round(self._ttfb_total / self._ttfb_count, 1) if self._ttfb_count else None,
+            }
+
+
+class HttpClient:
+    """One pooled session shared by all fetches
+
+    pool_hosts is the number of hosts whose connection pools are kept and
+    per_host_connections the connections per host; further requests to a busy host
+    wait for a free connection.
+    """
+
+    def __init__(self, pool_hosts=10, per_host_connections=10, max_retries=3, backoff_factor=0.5,
+                 user_agent=DEFAULT_USER_AGENT):
+        self.counters = _Counters()
+        self.retry = _counting_retry(self.counters)(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+            # A long Retry-After would outlast the request deadline
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = _PoolAdapter(self.counters, pool_connections=pool_hosts, pool_maxsize=per_host_connections,
+                               pool_block=True, max_retries=self.retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": user_agent, "Accept-Encoding": accept_encoding()})
+
+    def get(self, url, **kwargs):
+        self.counters.add("requests")
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        counters = self.counters
+        with counters._lock:
+            reused = max(0, counters.requests - counters.new_connections)
+            return {
+                "requests": counters.requests,
+                "new_connections": counters.new_connections,
+                "reused_connections": reused,
+                "reuse_rate": round(reused / counters.requests, 3) if counters.requests else 0.0,
+                "retries": counters.retries,
+                "accept_encoding": self.session.headers["Accept-Encoding"],
+            }
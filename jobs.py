@@ -0,0 +1,196 @@
+"""
+Asynchronous jobs.
+An instruction submitted as a job is queued on a fixed worker pool and the request returns
+its id at once, so long jobs do not hold a WSGI worker. Clients poll the job for its status,
+per-step progress and, once it has finished, the result and report. The number of queued
+jobs is bounded, and finished jobs are forgotten after a TTL. A job can be cancelled through
+its cancellation token, which the agent running it checks.
+"""
+
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import CancellationToken
+
+JOB_STATES = ("queued", "running", "completed", "partial", "failed", "cancelled", "error")
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its limit"""
+
+
+class Job:
+    def __init__(self, instruction, options, clock=time.time):
+        self.id = uuid.uuid4().hex
+        self.instruction = instruction
+        self.options = options
+        self.status = "queued"
+        self.created_at = clock()
+        self.started_at = None
+        self.finished_at = None
+        self.total_steps = None
+        self.steps = {}
+        self.result = None
+        self.cancel_token = CancellationToken()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def record(self, event, data):
+        """Update the progress from an (event, data) pair of AIAgent.process_instruction_iter"""
+        with self._lock:
+            if event == "plan_created":
+                self.total_steps = len(data.get("execution_steps", [])) if isinstance(data, dict) else 0
+            elif event == "step_started":
+                self.steps[data.get("step_number")] = {
+                    "step_number": data.get("step_number"),
+                    "environment": data.get("environment", ""),
+                    "action": data.get("action", ""),
+                    "status": "running"
+                }
+            elif event == "step_finished":
+                step = self.steps.setdefault(data.get("step_number"), {"step_number": data.get("step_number")})
+                step["status"] = data.get("status", "success")
+                if data.get("status") == "error":
+                    step["message"] = data.get("message", "")
+
+    def wait(self, timeout=None):
+        """Wait for the job to finish; returns False if the timeout ran out first"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        with self._lock:
+            steps = [dict(step) for _, step in sorted(self.steps.items(), key=lambda item: (item[0] is None, item[0] or 0))]
+            job = {
+                "job_id": self.id,
+                "instruction": self.instruction,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "progress": {
+                    "total_steps": self.total_steps,
+                    "finished_steps": sum(1 for step in steps if step.get("status") not in (None, "running")),
+                    "steps": steps
+                }
+            }
+            if self.result is not None:
+                job["result"] = self.result
+            return job
+
+
+class JobManager:
+    """Runs jobs on a worker pool and keeps them until their results expire
+
+    runner(job) does the work, reporting progress with job.record(), and returns the
+    result dict; its "status" becomes the status of the job.
+    """
+
+    def __init__(self, runner, max_workers=4, max_queued=100, result_ttl=3600, clock=time.time):
+        self.runner = runner
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.queued = 0
+        self.running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.cancelled = 0
+
+    def create(self, instruction, options=None):
+        """Register a job that the caller runs itself (a streaming request), finishing it with complete()"""
+        job = Job(instruction, options or {}, clock=self.clock)
+        job.status = "running"
+        job.started_at = self.clock()
+        with self._lock:
+            self._prune()
+            self.running += 1
+            self.submitted += 1
+            self._jobs[job.id] = job
+        return job
+
+    def submit(self, instruction, options=None):
+        """Queue an instruction; raises JobQueueFull when max_queued jobs are waiting"""
+        job = Job(instruction, options or {}, clock=self.clock)
+        with self._lock:
+            self._prune()
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                raise JobQueueFull(f"The job queue is full ({self.max_queued} jobs waiting)")
+            self.queued += 1
+            self.submitted += 1
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """Return the job, or None if it is unknown or its result has expired"""
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id, reason="cancelled by the client"):
+        """Cancel a queued or running job; returns the job, or None if it is unknown"""
+        job = self.get(job_id)
+        if job is not None and not job.finished and job.cancel_token.cancel(reason):
+            with self._lock:
+                self.cancelled += 1
+        return job
+
+    def _run(self, job):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        job.status = "running"
+        job.started_at = self.clock()
+        try:
+            if job.cancel_token.cancelled:
+                # Cancelled while it was waiting for a worker
+                result = {"status": "cancelled", "message": f"Cancelled ({job.cancel_token.reason}) before it started"}
+            else:
+                result = self.runner(job)
+        except Exception as e:
+            result = {"status": "error", "message": f"An error occurred while processing your instruction: {str(e)}"}
+        self.complete(job, result)
+
+    def complete(self, job, result):
+        """Store the result of a running job and wake up the callers waiting for it"""
+        status = result.get("status", "completed") if isinstance(result, dict) else "completed"
+        with job._lock:
+            job.result = result
+            job.status = status if status in JOB_STATES else "completed"
+            job.finished_at = self.clock()
+        with self._lock:
+            self.running -= 1
+        job._done.set()
+
+    def _prune(self):
+        """Forget finished jobs older than the TTL; the caller holds the lock"""
+        cutoff = self.clock() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+            self.expired += 1
+
+    def stats(self):
+        with self._lock:
+            self._prune()
+            return {
+                "queued": self.queued,
+                "running": self.running,
+                "stored": len(self._jobs),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "cancelled": self.cancelled,
+                "max_queued": self.max_queued
+            }
@@ -0,0 +1,158 @@
+"""
+Response cache for Gemini generate_content calls.
+Responses are keyed on the model name, the generation config and a hash of the prompt,
+held in an in-memory LRU tier and optionally persisted to an on-disk tier.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Default time-to-live (seconds) for each type of LLM call
+DEFAULT_TTLS = {
+    "planning": 24 * 3600,
+    "search": 6 * 3600,
+    "extraction": 6 * 3600,
+    "response": 3600,
+    "document": 3600,
+    "report": 3600,
+}
+DEFAULT_TTL = 3600
+
+
+def ttls_from_env(prefix="LLM_CACHE_TTL_"):
+    """Read per-call-type TTL overrides such as LLM_CACHE_TTL_PLANNING=600 from the environment"""
+    ttls = dict(DEFAULT_TTLS)
+    for name, value in os.environ.items():
+        if name.startswith(prefix):
+            try:
+                ttls[name[len(prefix):].lower()] = float(value)
+            except ValueError:
+                logger.warning(f"Ignoring invalid cache TTL {name}={value}")
+    return ttls
+
+
+class LLMResponseCache:
+    def __init__(self, max_entries=256, ttls=None, default_ttl=DEFAULT_TTL, disk_dir=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.disk_dir = disk_dir
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model_name, generation_config, prompt):
+        """Build a content-addressed key for a prompt sent to a given model and config"""
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        config = json.dumps(generation_config or {}, sort_keys=True, default=str)
+        material = f"{model_name}\n{config}\n{prompt_hash}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, call_type):
+        return self.ttls.get(call_type, self.default_ttl)
+
+    def get(self, key, call_type="general"):
+        """Return the cached response text for a key, or None if missing or expired"""
+        now = self.clock()
+        ttl = self.ttl_for(call_type)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry["created"] <= ttl:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    self.counters["memory_hits"] += 1
+                    return entry["text"]
+                # Expired entry
+                del self._entries[key]
+
+        entry = self._read_disk(key)
+        if entry is not None and now - entry.get("created", 0) <= ttl:
+            with self._lock:
+                self._remember(key, entry)
+                self.counters["hits"] += 1
+                self.counters["disk_hits"] += 1
+            return entry["text"]
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def set(self, key, call_type, text):
+        """Store a response text in the memory tier and, if enabled, the disk tier"""
+        entry = {"call_type": call_type, "created": self.clock(), "text": text}
+        with self._lock:
+            self._remember(key, entry)
+            self.counters["stores"] += 1
+        self._write_disk(key, entry)
+
+    def record_bypass(self):
+        with self._lock:
+            self.counters["bypassed"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                "disk_enabled": bool(self.disk_dir),
+            }
+
+    def _remember(self, key, entry):
+        # Caller must hold the lock
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read cache entry {path}: {str(e)}")
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write cache entry {path}: {str(e)}")
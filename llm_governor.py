@@ -0,0 +1,200 @@
+"""
+Process-wide governor for Gemini calls.
+Limits the number of calls in flight, paces requests with a token bucket, admits waiting
+calls in priority order (planning ahead of report generation) and retries quota and
+availability errors (429/503) with exponential backoff and full jitter.
+"""
+
+import os
+import heapq
+import random
+import logging
+import threading
+import itertools
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers are admitted first
+DEFAULT_PRIORITIES = {
+    "planning": 0,
+    "search": 1,
+    "extraction": 1,
+    "response": 2,
+    "document": 2,
+    "report": 3,
+}
+DEFAULT_PRIORITY = 2
+
+RETRYABLE_STATUS_CODES = {429, 503}
+RETRYABLE_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable"}
+
+
+def is_retryable(error):
+    """True for quota (429) and availability (503) errors from the Gemini client"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+class LLMGovernor:
+    def __init__(self, max_concurrency=4, rate_per_second=5.0, burst=None, max_retries=4,
+                 backoff_base=1.0, backoff_max=30.0, priorities=None, sleep=time.sleep):
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.burst = burst or max(1, int(rate_per_second))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.priorities = dict(DEFAULT_PRIORITIES if priorities is None else priorities)
+        self.sleep = sleep
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self.counters = {
+            "calls": 0, "retries": 0, "throttled": 0, "failures": 0,
+            "max_queue_depth": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0,
+        }
+
+    def priority_for(self, call_type):
+        return self.priorities.get(call_type, DEFAULT_PRIORITY)
+
+    def _take_token(self):
+        """Take a token from the bucket; returns 0 on success or the seconds until one is available"""
+        # Caller must hold the lock
+        if not self.rate_per_second:
+            return 0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_second)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate_per_second
+
+    def acquire(self, call_type="general"):
+        """Wait for a slot, admitting higher priority calls first; returns the seconds waited"""
+        start = time.monotonic()
+        with self._cond:
+            ticket = (self.priority_for(call_type), next(self._sequence))
+            heapq.heappush(self._queue, ticket)
+            self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], len(self._queue))
+            try:
+                while True:
+                    if self._queue[0] == ticket and self._in_flight < self.max_concurrency:
+                        token_wait = self._take_token()
+                        if token_wait == 0:
+                            heapq.heappop(self._queue)
+                            self._in_flight += 1
+                            break
+                        self._cond.wait(token_wait)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                raise
+            finally:
+                # Let the next caller in the queue check whether it can go
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            self.counters["wait_seconds_total"] += waited
+            self.counters["wait_seconds_max"] = max(self.counters["wait_seconds_max"], waited)
+            return waited
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, call_type="general"):
+        self.acquire(call_type)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _backoff(self, attempt, call_type, error):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        with self._cond:
+            self.counters["retries"] += 1
+            self.counters["throttled"] += 1
+        logger.warning(f"Gemini {call_type} call throttled ({error}); retrying in {delay:.2f}s")
+        self.sleep(delay)
+
+    def call(self, fn, call_type="general"):
+        """Run fn under the governor, retrying 429/503 errors with backoff"""
+        with self._cond:
+            self.counters["calls"] += 1
+        attempt = 0
+        while True:
+            try:
+                with self.slot(call_type):
+                    return fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    with self._cond:
+                        self.counters["failures"] += 1
+                    raise
+                # The slot is released while backing off so other calls can proceed
+                self._backoff(attempt, call_type, e)
+                attempt += 1
+
+    def stream(self, fn, call_type="general"):
+        """Iterate the stream returned by fn under the governor
+
+        Errors raised before the first chunk are retried like call(); once text has
+        been yielded the stream cannot be restarted, so later errors are raised.
+        """
+        with self._cond:
+            self.counters["calls"] += 1
+        attempt = 0
+        while True:
+            started = False
+            try:
+                with self.slot(call_type):
+                    for chunk in fn():
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started or not is_retryable(e) or attempt >= self.max_retries:
+                    with self._cond:
+                        self.counters["failures"] += 1
+                    raise
+                self._backoff(attempt, call_type, e)
+                attempt += 1
+
+    def stats(self):
+        with self._cond:
+            calls = self.counters["calls"]
+            return {
+                **self.counters,
+                "wait_seconds_total": round(self.counters["wait_seconds_total"], 3),
+                "wait_seconds_max": round(self.counters["wait_seconds_max"], 3),
+                "wait_seconds_avg": round(self.counters["wait_seconds_total"] / calls, 3) if calls else 0.0,
+                "queue_depth": len(self._queue),
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "rate_per_second": self.rate_per_second,
+            }
+
+
+def governor_from_env():
+    """Build a governor from LLM_MAX_CONCURRENCY, LLM_RATE_PER_SECOND and related variables"""
+    return LLMGovernor(
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+        rate_per_second=float(os.getenv("LLM_RATE_PER_SECOND", "5")),
+        burst=int(os.getenv("LLM_RATE_BURST", "0")) or None,
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+        backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "1.0")),
+        backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+    )
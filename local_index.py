@@ -0,0 +1,319 @@
+"""
+Local full-text index over everything the agent has read.
+Page text from "navigate to", search result snippets and fetched result pages, and the
+documents the agent generated are indexed so that a repeated research topic can be
+answered without going back to the network. Ranking is BM25.
+
+The index is a log-structured inverted index on disk: added documents collect in an
+in-memory buffer that is written out as an immutable segment file (documents and term
+postings) every flush_docs documents; when there are more than max_segments segments,
+they are merged into one in the background, dropping documents that were replaced.
+Documents are keyed (for example on their URL), and adding a document with a known key
+replaces the older one.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import logging
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how in is it its of on or that the their this
+to was were what when where which who why will with about into than then there these
+those you your our we they them i me my not no but if so do does did can could should
+""".split())
+
+# Characters of a document kept for the excerpt returned with a hit
+EXCERPT_LENGTH = 300
+
+MANIFEST = "manifest.json"
+
+
+def tokenize(text):
+    """Lower-case terms of text without stopwords"""
+    return [term for term in TOKEN_RE.findall((text or "").lower()) if term not in STOPWORDS and len(term) > 1]
+
+
+class Segment:
+    """An immutable set of documents and their postings"""
+
+    def __init__(self, name, docs, postings):
+        self.name = name
+        # doc id -> {"key", "url", "title", "text", "source", "length", "added"}
+        self.docs = docs
+        # term -> [[doc id, term frequency], ...]
+        self.postings = postings
+
+    @classmethod
+    def build(cls, name, docs):
+        postings = defaultdict(list)
+        for doc_id, doc in docs.items():
+            add_postings(postings, doc_id, tokenize(f"{doc['title']} {doc['text']}"))
+        return cls(name, docs, dict(postings))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        docs = {int(doc_id): doc for doc_id, doc in data["docs"].items()}
+        return cls(os.path.basename(path), docs, data["postings"])
+
+    def save(self, directory):
+        _write_json(os.path.join(directory, self.name), {"docs": self.docs, "postings": self.postings})
+
+
+def add_postings(postings, doc_id, terms):
+    """Add a document's terms to a term -> [[doc id, term frequency], ...] mapping"""
+    for term, count in Counter(terms).items():
+        postings[term].append([doc_id, count])
+
+
+def _write_json(path, data):
+    # Write to a temporary file first so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class LatencyStats:
+    """Latency of searches by where they were answered"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+
+    def record(self, kind, seconds):
+        with self._lock:
+            samples = self._samples[kind]
+            samples.append(seconds * 1000)
+            if len(samples) > self.window:
+                del samples[0]
+
+    def stats(self):
+        with self._lock:
+            summary = {}
+            for kind, samples in self._samples.items():
+                ordered = sorted(samples)
+                summary[kind] = {
+                    "count": len(ordered),
+                    "avg_ms": round(sum(ordered) / len(ordered), 2),
+                    "p50_ms": round(ordered[len(ordered) // 2], 2),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+                }
+            return summary
+
+
+class LocalIndex:
+    """BM25 index of documents kept in segment files under directory"""
+
+    def __init__(self, directory, flush_docs=50, max_segments=8, k1=1.2, b=0.75, clock=time.time):
+        self.directory = directory
+        self.flush_docs = flush_docs
+        self.max_segments = max_segments
+        self.k1 = k1
+        self.b = b
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._merger = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-merge")
+        self._segments = []
+        self._buffer = {}
+        # Postings of the buffered documents, kept up to date by add()
+        self._buffer_postings = defaultdict(list)
+        self._next_doc_id = 1
+        self._next_segment = 1
+        # key -> doc id of its current document, and doc id -> document of live documents
+        self._latest = {}
+        self._live = {}
+        self._total_length = 0
+        self.counters = {"added": 0, "replaced": 0, "unchanged": 0, "searches": 0, "flushes": 0, "merges": 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            segments = [Segment.load(os.path.join(self.directory, name)) for name in manifest["segments"]]
+        except Exception as e:
+            logger.warning(f"Could not load the local index in {self.directory}: {str(e)}")
+            return
+        self._next_doc_id = manifest.get("next_doc_id", 1)
+        self._next_segment = manifest.get("next_segment", 1)
+        for segment in segments:
+            self._segments.append(segment)
+            for doc_id, doc in segment.docs.items():
+                self._track(doc_id, doc)
+
+    def _track(self, doc_id, doc):
+        # Caller must hold the lock; later documents replace earlier ones with the same key
+        previous = self._latest.get(doc["key"])
+        if previous is not None and previous in self._live:
+            self._total_length -= self._live.pop(previous)["length"]
+            self.counters["replaced"] += 1
+        self._latest[doc["key"]] = doc_id
+        self._live[doc_id] = doc
+        self._total_length += doc["length"]
+
+    def add(self, key, text, url=None, title="", source="page"):
+        """Index a document, replacing the one with the same key; returns False if unchanged"""
+        text = " ".join((text or "").split())
+        terms = tokenize(f"{title} {text}")
+        length = len(terms)
+        if not length:
+            return False
+        with self._lock:
+            current = self._live.get(self._latest.get(key))
+            if current is not None and current["text"] == text and current["title"] == title:
+                # Seen again, so as current as a new copy; written out with the next merge
+                current["added"] = self.clock()
+                self.counters["unchanged"] += 1
+                return False
+            doc_id = self._next_doc_id
+            self._next_doc_id += 1
+            doc = {"key": key, "url": url, "title": title, "text": text, "source": source,
+                   "length": length, "added": self.clock()}
+            self._buffer[doc_id] = doc
+            add_postings(self._buffer_postings, doc_id, terms)
+            self._track(doc_id, doc)
+            self.counters["added"] += 1
+            if len(self._buffer) >= self.flush_docs:
+                self._flush()
+        return True
+
+    def flush(self):
+        """Write buffered documents out as a segment"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        # Caller must hold the lock
+        if not self._buffer:
+            return
+        segment = Segment(f"segment-{self._next_segment:06d}.json", self._buffer, dict(self._buffer_postings))
+        self._next_segment += 1
+        segment.save(self.directory)
+        self._segments.append(segment)
+        self._buffer = {}
+        self._buffer_postings = defaultdict(list)
+        self._save_manifest()
+        self.counters["flushes"] += 1
+        if len(self._segments) > self.max_segments:
+            self._merger.submit(self.merge)
+
+    def _save_manifest(self):
+        # Caller must hold the lock
+        _write_json(os.path.join(self.directory, MANIFEST), {
+            "segments": [segment.name for segment in self._segments],
+            "next_doc_id": self._next_doc_id,
+            "next_segment": self._next_segment,
+        })
+
+    def merge(self):
+        """Merge all segments into one without the documents that were replaced"""
+        with self._merge_lock:
+            with self._lock:
+                segments = list(self._segments)
+                if len(segments) < 2:
+                    return
+                name = f"segment-{self._next_segment:06d}.json"
+                self._next_segment += 1
+                live = set(self._live)
+            docs = {doc_id: doc for segment in segments for doc_id, doc in segment.docs.items() if doc_id in live}
+            # Built and written outside the lock; searches keep using the old segments meanwhile
+            merged = Segment.build(name, docs)
+            merged.save(self.directory)
+            with self._lock:
+                # Segments flushed during the merge stay after the merged one
+                self._segments = [merged] + [segment for segment in self._segments if segment not in segments]
+                self._save_manifest()
+                self.counters["merges"] += 1
+            for segment in segments:
+                try:
+                    os.remove(os.path.join(self.directory, segment.name))
+                except OSError:
+                    pass
+
+    def search(self, query, limit=5, max_age=None):
+        """Best live documents for query as dicts with their BM25 score, one per URL
+
+        With max_age, documents added more than max_age seconds ago are left out.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        oldest = None if max_age is None else self.clock() - max_age
+        with self._lock:
+            self.counters["searches"] += 1
+            postings_lists = [segment.postings for segment in self._segments] + [self._buffer_postings]
+            live = self._live
+            total_docs = len(live)
+            if not terms or not total_docs:
+                return []
+            avg_length = self._total_length / total_docs
+
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            for term in terms:
+                postings = [(doc_id, count)
+                            for segment_postings in postings_lists
+                            for doc_id, count in segment_postings.get(term, ()) if doc_id in live]
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, count in postings:
+                    norm = self.k1 * (1 - self.b + self.b * live[doc_id]["length"] / avg_length)
+                    scores[doc_id] += idf * count * (self.k1 + 1) / (count + norm)
+                    matched[doc_id] += 1
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            hits = []
+            seen_urls = set()
+            for doc_id, score in ranked:
+                doc = live[doc_id]
+                if oldest is not None and doc["added"] < oldest:
+                    continue
+                if doc["url"] and doc["url"] in seen_urls:
+                    continue
+                seen_urls.add(doc["url"])
+                hits.append({
+                    "title": doc["title"],
+                    "url": doc["url"],
+                    "text": doc["text"],
+                    "excerpt": doc["text"][:EXCERPT_LENGTH],
+                    "source": doc["source"],
+                    "added": doc["added"],
+                    "score": round(score, 4),
+                    "matched_terms": matched[doc_id],
+                    "query_terms": len(terms),
+                })
+                if len(hits) >= limit:
+                    break
+            return hits
+
+    def close(self):
+        self.flush()
+        self._merger.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "documents": len(self._live),
+                "buffered": len(self._buffer),
+                "segments": len(self._segments),
+                "terms_indexed": sum(len(segment.postings) for segment in self._segments),
+            }
@@ -0,0 +1,116 @@
+"""
+Dependency graph of an execution plan.
+Steps only wait for the earlier steps whose results or side effects they use, so that
+independent steps (two searches, a terminal command next to a browser fetch, writes to
+different files) can run at the same time:
+- extraction steps read the search results of earlier steps from the agent history
+- "save ... to file" steps read earlier extraction or search results
+- file system steps touching the same files, and terminal commands, keep their order
+- file system steps wait for earlier terminal commands, which may create or change files
+- steps after a critical step (general_response, or the last step) wait for it, so a
+  failure there still stops the plan before anything later has run
+Plans may also give explicit "depends_on" step numbers, which replace the inferred ones.
+"""
+
+import re
+
+# Keywords browser_execution treats as extraction or analysis of earlier results
+EXTRACTION_KEYWORDS = ["extract", "review", "analyze", "read", "check", "examine", "look at", "visit", "find", "get", "collect", "summarize"]
+
+FILE_NAME_RE = re.compile(r"[\w./\\-]+\.\w+")
+
+# Steps of these kinds can be re-ordered freely with each other
+INDEPENDENT_KINDS = {"search", "navigate", "response"}
+
+
+def step_kind(step):
+    """Classify a step the same way the environment executors dispatch it"""
+    environment = (step.get("environment") or "").lower()
+    action = (step.get("action") or "").lower()
+
+    if environment == "general_response":
+        return "response"
+    if environment == "browser":
+        if "navigate to" in action or "go to" in action:
+            return "navigate"
+        if "search for" in action:
+            return "search"
+        if any(keyword in action for keyword in EXTRACTION_KEYWORDS):
+            return "extraction"
+        return "browser"
+    if environment == "file_system":
+        if "pdf" in action or "report" in action or "document" in action:
+            # Redirected to general_response_execution
+            return "response"
+        if "save" in action and ("to file" in action or "as file" in action):
+            return "save"
+        return "file"
+    if environment == "terminal":
+        if "pdf" in action or "pandoc" in action or "report" in action or "document" in action:
+            return "response"
+        return "terminal"
+    return "unknown"
+
+
+def step_number(step, index):
+    number = step.get("step_number")
+    return number if isinstance(number, int) else index + 1
+
+
+def is_critical(step, index, count):
+    """A failure in a critical step stops the plan (general_response steps and the last step)"""
+    return (step.get("environment") or "") == "general_response" or step_number(step, index) >= count
+
+
+def _files(step):
+    return set(FILE_NAME_RE.findall((step.get("action") or "").lower()))
+
+
+def _conflicting_files(step, other):
+    files, other_files = _files(step), _files(other)
+    # Without file names on both sides (directories, listings) the steps may touch the same files
+    return not files or not other_files or bool(files & other_files)
+
+
+def _inferred(steps, index, kinds):
+    kind = kinds[index]
+    dependencies = set()
+    if kind in INDEPENDENT_KINDS:
+        return dependencies
+    for earlier in range(index):
+        earlier_kind = kinds[earlier]
+        if kind == "extraction" and earlier_kind == "search":
+            dependencies.add(earlier)
+        elif kind == "save" and earlier_kind in ("search", "extraction"):
+            dependencies.add(earlier)
+        elif kind in ("save", "file") and earlier_kind in ("save", "file"):
+            if _conflicting_files(steps[index], steps[earlier]):
+                dependencies.add(earlier)
+        elif kind in ("save", "file") and earlier_kind == "terminal":
+            dependencies.add(earlier)
+        elif kind == "terminal" and earlier_kind in ("terminal", "save", "file"):
+            dependencies.add(earlier)
+        elif kind in ("browser", "unknown") or earlier_kind in ("browser", "unknown"):
+            # Unrecognized actions keep their sequential order
+            dependencies.add(earlier)
+    return dependencies
+
+
+def plan_dependencies(steps):
+    """Return, for each step, the set of indices of the earlier steps it must wait for"""
+    kinds = [step_kind(step) for step in steps]
+    index_by_number = {step_number(step, index): index for index, step in enumerate(steps)}
+    critical = [is_critical(step, index, len(steps)) for index, step in enumerate(steps)]
+
+    dependencies = []
+    for index, step in enumerate(steps):
+        explicit = step.get("depends_on")
+        if isinstance(explicit, (list, tuple)):
+            # Only earlier steps can be dependencies, which keeps the graph acyclic
+            needed = {index_by_number[number] for number in explicit
+                      if number in index_by_number and index_by_number[number] < index}
+        else:
+            needed = _inferred(steps, index, kinds)
+        needed.update(earlier for earlier in range(index) if critical[earlier])
+        dependencies.append(needed)
+    return dependencies
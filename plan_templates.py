@@ -0,0 +1,319 @@
+"""
+Registry of parameterized plan templates.
+Instructions with a well-known shape (PDF reports, phone and laptop searches, "search for X
+and save to file Y", ...) are turned into execution plans without a planning call to Gemini.
+All templates are matched with a single precompiled regular expression; slots such as {q}
+or {file} are captured from the instruction and substituted into the template steps.
+Plans produced by the LLM can be learned back into the registry as cached templates.
+"""
+
+import re
+import copy
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Patterns for named slots; any other slot matches a non-empty run of text
+SLOT_PATTERNS = {
+    "q": r"(?:(?! and )[^,;])+?",
+    "file": r"[\w./\\-]+\.\w+",
+    "url": r"(?:https?://|www\.)\S+",
+}
+DEFAULT_SLOT_PATTERN = r".+?"
+
+ENVIRONMENTS = {"browser", "terminal", "file_system", "general_response"}
+
+_SLOT_RE = re.compile(r"\{(\w+)\}")
+
+# File names and search queries found in LLM plans become slots of learned templates
+_LEARNABLE_VALUES = [
+    ("file", re.compile(r"[\w./\\-]+\.(?:txt|md|csv|json|html|pdf|py|log)\b", re.IGNORECASE)),
+    ("q", re.compile(r"search for (.+)$", re.IGNORECASE)),
+]
+
+
+# A learned template needs this much literal text outside its slots, and its slots may cover
+# at most this share of the instruction; otherwise it would match unrelated instructions
+MIN_LEARNED_LITERAL_CHARS = 8
+MAX_LEARNED_SLOT_SHARE = 0.6
+
+
+def normalize_instruction(instruction):
+    """Collapse whitespace and drop trailing punctuation so equivalent phrasings match"""
+    return re.sub(r"\s+", " ", instruction or "").strip().rstrip(".!?").strip()
+
+
+class PlanTemplate:
+    """A plan with {slot} placeholders and the instruction pattern that fills them
+
+    The pattern is a regular expression in which {name} marks a slot. The steps are
+    (environment, action, expected_outcome) tuples whose text may use the slots and
+    {instruction}, the full instruction.
+    """
+
+    def __init__(self, name, pattern, task_analysis, steps, source="builtin"):
+        self.name = name
+        self.pattern = pattern
+        self.task_analysis = task_analysis
+        self.steps = steps
+        self.source = source
+
+    def slots(self):
+        return _SLOT_RE.findall(self.pattern)
+
+    def render(self, instruction, values):
+        fields = dict(values, instruction=instruction)
+        steps = []
+        for number, (environment, action, expected_outcome) in enumerate(self.steps, start=1):
+            steps.append({
+                "step_number": number,
+                "environment": environment,
+                "action": action.format_map(fields),
+                "expected_outcome": expected_outcome.format_map(fields)
+            })
+        environments = []
+        for step in steps:
+            if step["environment"] not in environments:
+                environments.append(step["environment"])
+        return {
+            "task_analysis": self.task_analysis.format_map(fields),
+            "environments_needed": environments,
+            "execution_steps": steps
+        }
+
+
+def _escape_format(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def learn_template(instruction, plan, name):
+    """Turn an LLM plan into a template, or return None if the plan is not reusable
+
+    File names and search queries that appear both in the instruction and in the plan
+    become slots; the rest of the instruction must match literally.
+    """
+    steps = plan.get("execution_steps") if isinstance(plan, dict) else None
+    if not isinstance(steps, list) or not steps:
+        return None
+    for step in steps:
+        if not isinstance(step, dict) or step.get("environment") not in ENVIRONMENTS or not step.get("action"):
+            return None
+
+    normalized = normalize_instruction(instruction)
+    if not normalized:
+        return None
+
+    # Collect slot values that occur in the instruction, longest first so they do not overlap
+    values = {}
+    for step in steps:
+        for slot, pattern in _LEARNABLE_VALUES:
+            for match in pattern.finditer(step["action"]):
+                value = (match.group(1) if match.groups() else match.group(0)).strip()
+                if len(value) >= 3 and value.lower() in normalized.lower() and value.lower() not in values:
+                    values[value.lower()] = slot
+    ordered = sorted(values.items(), key=lambda item: -len(item[0]))
+
+    # Claim a non-overlapping span of the instruction for each value
+    spans = []
+    lowered = normalized.lower()
+    for value, slot in ordered:
+        start = lowered.find(value)
+        if start < 0 or any(start < end and other_start < start + len(value) for other_start, end, _, _ in spans):
+            continue
+        slot_name = slot if slot not in {span[2] for span in spans} else f"{slot}{len(spans)}"
+        spans.append((start, start + len(value), slot_name, value))
+    spans.sort()
+
+    pattern_parts = []
+    literal_parts = []
+    position = 0
+    for start, end, slot_name, _ in spans:
+        literal_parts.append(normalized[position:start])
+        pattern_parts.append(re.escape(normalized[position:start]))
+        pattern_parts.append("{" + slot_name + "}")
+        position = end
+    literal_parts.append(normalized[position:])
+    pattern_parts.append(re.escape(normalized[position:]))
+    pattern_text = "".join(pattern_parts)
+
+    # A template that is mostly slot, like a bare "{q}", would capture unrelated instructions
+    literal_chars = len(re.sub(r"\W+", "", "".join(literal_parts)))
+    slot_chars = sum(end - start for start, end, _, _ in spans)
+    if spans and (literal_chars < MIN_LEARNED_LITERAL_CHARS or slot_chars > MAX_LEARNED_SLOT_SHARE * len(normalized)):
+        return None
+
+    def parameterize(text):
+        text = _escape_format(text)
+        for _, _, slot_name, value in sorted(spans, key=lambda span: -len(span[3])):
+            text = re.sub(re.escape(_escape_format(value)), "{" + slot_name + "}", text, flags=re.IGNORECASE)
+        return text
+
+    step_texts = [(step["environment"], parameterize(step["action"]), parameterize(step.get("expected_outcome", "")))
+                  for step in steps]
+    task_analysis = parameterize(plan.get("task_analysis", ""))
+
+    return PlanTemplate(name, pattern_text, task_analysis, step_texts, source="learned")
+
+
+class PlanTemplateRegistry:
+    def __init__(self, templates=None, max_learned=200, learn=True):
+        self.max_learned = max_learned
+        self.learn = learn
+        self._builtin = list(templates or [])
+        self._learned = OrderedDict()
+        self._lock = threading.Lock()
+        self._matcher = None
+        self._by_group = {}
+        self._slot_groups = {}
+        self._planning_seconds = {"total": 0.0, "calls": 0}
+        self.counters = {"lookups": 0, "hits": 0, "builtin_hits": 0, "learned_hits": 0, "misses": 0, "learned": 0}
+
+    def _compile(self):
+        """Combine every template into one alternation; earlier templates win"""
+        # Caller must hold the lock
+        alternatives = []
+        self._by_group = {}
+        self._slot_groups = {}
+        templates = self._builtin + list(self._learned.values())
+        for index, template in enumerate(templates):
+            group = f"t{index}"
+            slot_groups = {}
+
+            def slot_group(match, group=group, slot_groups=slot_groups):
+                slot = match.group(1)
+                slot_groups[slot] = f"{group}_{slot}"
+                return f"(?P<{group}_{slot}>{SLOT_PATTERNS.get(slot.rstrip('0123456789'), DEFAULT_SLOT_PATTERN)})"
+
+            alternatives.append(f"(?P<{group}>{_SLOT_RE.sub(slot_group, template.pattern)})")
+            self._by_group[group] = template
+            self._slot_groups[group] = slot_groups
+        self._matcher = re.compile("|".join(alternatives), re.IGNORECASE | re.DOTALL) if alternatives else None
+
+    def match(self, instruction):
+        """Return (plan, template name) for the first matching template, or None"""
+        normalized = normalize_instruction(instruction)
+        with self._lock:
+            if self._matcher is None and (self._builtin or self._learned):
+                self._compile()
+            self.counters["lookups"] += 1
+            match = self._matcher.fullmatch(normalized) if self._matcher else None
+            if match is None:
+                self.counters["misses"] += 1
+                return None
+
+            group = match.lastgroup
+            template = self._by_group[group]
+            values = {slot: match.group(name).strip() for slot, name in self._slot_groups[group].items()}
+            self.counters["hits"] += 1
+            self.counters[f"{template.source}_hits"] += 1
+            if template.source == "learned":
+                self._learned.move_to_end(template.name)
+
+        return template.render(instruction, values), template.name
+
+    def learn_plan(self, instruction, plan):
+        """Store an LLM plan as a cached template so the same shape skips planning next time"""
+        if not self.learn or self.max_learned <= 0:
+            return None
+        template = learn_template(instruction, copy.deepcopy(plan), f"learned:{normalize_instruction(instruction).lower()}")
+        if template is None:
+            return None
+        with self._lock:
+            if template.name not in self._learned:
+                self.counters["learned"] += 1
+            self._learned[template.name] = template
+            self._learned.move_to_end(template.name)
+            while len(self._learned) > self.max_learned:
+                self._learned.popitem(last=False)
+            self._matcher = None
+        logger.info(f"Learned plan template with slots {template.slots()}: {template.pattern}")
+        return template
+
+    def record_planning(self, seconds):
+        """Record how long an LLM planning call took, used to estimate the time saved by hits"""
+        with self._lock:
+            self._planning_seconds["total"] += seconds
+            self._planning_seconds["calls"] += 1
+
+    def stats(self):
+        with self._lock:
+            calls = self._planning_seconds["calls"]
+            average = self._planning_seconds["total"] / calls if calls else 0.0
+            lookups = self.counters["lookups"]
+            return {
+                **self.counters,
+                "templates": len(self._builtin) + len(self._learned),
+                "learned_templates": len(self._learned),
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                "planning_seconds_avg": round(average, 3),
+                "planning_seconds_saved": round(self.counters["hits"] * average, 3),
+            }
+
+
+# Report and document wording matches the checks in general_response_execution
+_REPORT = r"(?:create|make|generate) (?:a )?report"
+_DOCUMENT = r"(?:create|make|generate) (?:a )?document"
+
+BUILTIN_TEMPLATES = [
+    PlanTemplate(
+        "pdf_report", rf"(?=.*pdf)(?=.*{_REPORT}).*",
+        "Creating a report in PDF format about: {instruction}",
+        [("general_response", "respond to query: {instruction}", "Generate a PDF report based on the user's request")]
+    ),
+    PlanTemplate(
+        "pdf_document", rf"(?=.*pdf)(?=.*{_DOCUMENT}).*",
+        "Creating a document in PDF format about: {instruction}",
+        [("general_response", "respond to query: {instruction}", "Generate a PDF document based on the user's request")]
+    ),
+    PlanTemplate(
+        "mobile_search",
+        r"(?:(?=.*(?:mobile phone|smartphone|latest phones|new phones|best phones))|(?=.*list)(?=.*(?:mobile|phone|smartphone))).*",
+        "Searching for and listing the latest mobile phones",
+        [("browser", "search for latest mobile phones 2024", "Find information about the latest mobile phones"),
+         ("browser", "extract headlines from search results", "Extract a list of the latest mobile phones with their features")]
+    ),
+    PlanTemplate(
+        "laptop_search",
+        r"(?:(?=.*(?:laptop|notebook))|(?=.*list)(?=.*(?:laptop|notebook|computer))).*",
+        "Searching for and listing the latest laptops",
+        [("browser", "search for latest laptops 2024", "Find information about the latest laptops"),
+         ("browser", "extract headlines from search results", "Extract a list of the latest laptops with their features"),
+         ("general_response", "respond to query: Create a report on the latest laptops based on the search results",
+          "Generate a comprehensive report on the latest laptops")]
+    ),
+    PlanTemplate(
+        "search_and_save",
+        r"(?:search for|search|find|look up) {q},? and (?:then )?(?:save|write|store) (?:it|them|the results|the headlines)? ?(?:to|in|into|as) (?:a )?(?:file )?{file}",
+        "Searching for {q} and saving the results to {file}",
+        [("browser", "search for {q}", "Find information about {q}"),
+         ("browser", "extract headlines from search results", "Extract the key results about {q}"),
+         ("file_system", "save headlines to file {file}", "Save the extracted results to {file}")]
+    ),
+    PlanTemplate(
+        "search",
+        r"(?:search for|search the web for|look up) {q}",
+        "Searching for {q}",
+        [("browser", "search for {q}", "Find information about {q}"),
+         ("browser", "extract headlines from search results", "Extract the key results about {q}")]
+    ),
+    PlanTemplate(
+        "navigate",
+        r"(?:navigate to|go to|open|visit) {url}",
+        "Opening {url}",
+        [("browser", "navigate to {url}", "Load the page and extract its main content")]
+    ),
+    PlanTemplate(
+        "run_command",
+        r"(?:run|execute) (?:the )?command:? {command}",
+        "Running the command {command}",
+        [("terminal", "{command}", "Show the output of the command")]
+    ),
+    PlanTemplate(
+        "read_file",
+        r"(?:read|show|display) (?:the )?(?:contents of )?(?:the )?file {file}",
+        "Reading the file {file}",
+        [("file_system", "read file {file}", "Show the contents of {file}")]
+    ),
+]
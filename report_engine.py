@@ -0,0 +1,108 @@
+"""
+Deterministic execution reports rendered from Jinja templates.
+Trivial jobs (an echo, a file read, a directory listing) do not need Gemini to write their
+report. The report engine renders the Executive Summary / Execution Details / Results
+report from one template per environment, and decides per request whether the LLM
+report is worth its latency: only when the instruction asks for analysis or the results
+are complex enough.
+"""
+
+import os
+import re
+
+from jinja2 import Environment, FileSystemLoader
+
+REPORT_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "reports")
+
+REPORT_MODES = ("auto", "template", "llm")
+
+# Instructions asking for these get a written analysis from Gemini
+ANALYSIS_RE = re.compile(
+    r"\b(?:analy[sz]e|analysis|compare|comparison|evaluate|assess|summar(?:y|ize|ise)|insights?|trends?|"
+    r"recommend\w*|explain|pros and cons|report)\b",
+    re.IGNORECASE
+)
+
+# Complexity added by each step on top of one point per step
+ENVIRONMENT_WEIGHTS = {"browser": 1, "general_response": 2, "terminal": 0, "file_system": 0}
+
+STEP_ENVIRONMENTS = {"browser", "terminal", "file_system", "general_response"}
+
+# Keys tried in order to describe a result item in one line
+_ITEM_LABEL_KEYS = ("headline", "title", "product", "name", "summary", "value")
+
+
+def brief(item, length=160):
+    """One-line description of a result item"""
+    if isinstance(item, dict):
+        for key in _ITEM_LABEL_KEYS:
+            if item.get(key):
+                item = item[key]
+                break
+        else:
+            item = ", ".join(f"{key}: {value}" for key, value in item.items() if not isinstance(value, (dict, list)))
+    text = " ".join(str(item).split())
+    return text if len(text) <= length else text[:length - 3].rstrip() + "..."
+
+
+def complexity(plan, results):
+    """Score how much synthesis a report needs
+
+    Each step counts one point plus the weight of its environment, and each result
+    that carries a list of findings (search results, extracted content) one more.
+    """
+    score = 0
+    for step in plan.get("execution_steps", []) if isinstance(plan, dict) else []:
+        score += 1 + ENVIRONMENT_WEIGHTS.get(step.get("environment", "").lower(), 1)
+    for result in results:
+        if isinstance(result, dict) and any(isinstance(result.get(key), list) and result[key]
+                                            for key in ("results", "extracted_content")):
+            score += 1
+    return score
+
+
+def choose_report_mode(requested, instruction, plan, results, threshold):
+    """Resolve the report mode of a request to "template" or "llm"
+
+    auto uses Gemini only when the instruction asks for analysis or the complexity
+    of the plan reaches the threshold.
+    """
+    if requested in ("template", "llm"):
+        return requested
+    if instruction and ANALYSIS_RE.search(instruction):
+        return "llm"
+    return "llm" if complexity(plan, results) >= threshold else "template"
+
+
+class ReportEngine:
+    def __init__(self, template_dir=REPORT_TEMPLATE_DIR, max_items=5):
+        self.max_items = max_items
+        self.env = Environment(loader=FileSystemLoader(template_dir), trim_blocks=True, lstrip_blocks=True,
+                               keep_trailing_newline=True)
+        self.env.filters["brief"] = brief
+
+    def render(self, task, plan, results, status):
+        """Render the report for an executed plan"""
+        steps = []
+        plan_steps = plan.get("execution_steps", []) if isinstance(plan, dict) else []
+        for i, (step, result) in enumerate(zip(plan_steps, results)):
+            environment = step.get("environment", "").lower()
+            steps.append({
+                "number": i + 1,
+                "action": step.get("action", ""),
+                "expected_outcome": step.get("expected_outcome", ""),
+                "environment": environment,
+                "template": f"steps/{environment if environment in STEP_ENVIRONMENTS else 'default'}.md.j2",
+                "result": result if isinstance(result, dict) else {"status": "success", "value": result},
+            })
+
+        succeeded = sum(1 for step in steps if step["result"].get("status") == "success")
+        return self.env.get_template("report.md.j2").render(
+            task=task,
+            status=status,
+            task_analysis=plan.get("task_analysis", "") if isinstance(plan, dict) else "",
+            steps=steps,
+            succeeded=succeeded,
+            failed=len(steps) - succeeded,
+            max_items=self.max_items,
+        ).strip() + "\n"
@@ -0,0 +1,93 @@
+"""
+Compact digest of step results for the report prompt.
+Search results repeated across steps (for example the previous_results copies attached
+to every extraction) are sent only once, large text fields are truncated to a character
+budget, and the digest is serialized without indentation.
+"""
+
+import os
+import json
+
+# Result keys that repeat what the step wrapper already says
+STEP_KEYS = {"step_number", "environment", "action", "expected_outcome"}
+
+# Result keys holding lists of search results
+SEARCH_RESULT_KEYS = {"results", "previous_results"}
+
+# Placeholder links, such as the "#" used when a result has no link, identify nothing
+PLACEHOLDER_IDENTITIES = {"", "#"}
+
+
+def _truncate(text, budget):
+    if len(text) <= budget:
+        return text
+    return f"{text[:budget]}... [{len(text) - budget} more characters]"
+
+
+class ResultDigester:
+    def __init__(self, field_budget=None, max_items=None):
+        self.field_budget = field_budget or int(os.getenv("REPORT_DIGEST_FIELD_BUDGET", "600"))
+        self.max_items = max_items or int(os.getenv("REPORT_DIGEST_MAX_ITEMS", "10"))
+
+    def digest(self, steps_results):
+        """Return a compact copy of the step results for the report prompt"""
+        seen_results = {}
+        digested = []
+        for step in steps_results:
+            step_copy = {key: value for key, value in step.items() if key != "result"}
+            result = step.get("result")
+            if isinstance(result, dict):
+                step_copy["result"] = self._digest_result(result, step.get("step_number"), seen_results)
+            else:
+                step_copy["result"] = self._compact(result)
+            digested.append(step_copy)
+        return digested
+
+    def serialize(self, steps_results):
+        return json.dumps(self.digest(steps_results), separators=(",", ":"), ensure_ascii=False, default=str)
+
+    def _digest_result(self, result, step_number, seen_results):
+        digested = {}
+        for key, value in result.items():
+            if key in STEP_KEYS:
+                continue
+            if key in SEARCH_RESULT_KEYS and isinstance(value, list):
+                value = self._dedupe_search_results(value, step_number, seen_results)
+                if not value:
+                    continue
+            digested[key] = self._compact(value)
+        return digested
+
+    def _dedupe_search_results(self, items, step_number, seen_results):
+        unique = []
+        repeated_from = set()
+        for item in items:
+            if not isinstance(item, dict):
+                unique.append(item)
+                continue
+            identity = next((item[key] for key in ("link", "url", "title")
+                             if item.get(key) is not None and item[key] not in PLACEHOLDER_IDENTITIES), None)
+            if identity is None:
+                # Nothing to recognize a repeat by
+                unique.append(item)
+                continue
+            if identity in seen_results:
+                repeated_from.add(seen_results[identity])
+                continue
+            seen_results[identity] = step_number
+            unique.append(item)
+        if repeated_from:
+            unique.append({"same_as_results_of_step": sorted(repeated_from, key=str)})
+        return unique
+
+    def _compact(self, value):
+        if isinstance(value, str):
+            return _truncate(value, self.field_budget)
+        if isinstance(value, list):
+            compacted = [self._compact(item) for item in value[:self.max_items]]
+            if len(value) > self.max_items:
+                compacted.append(f"... {len(value) - self.max_items} more items")
+            return compacted
+        if isinstance(value, dict):
+            return {key: self._compact(item) for key, item in value.items()}
+        return value
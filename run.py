@@ -52,17 +52,22 @@ def start_server():
     print("🚀 Starting the Autonomous AI Agent server...")
 
     try:
-        # Import the app and check API key validity
-        from app import app, api_key_valid
+        # Create the app; the API key is validated in the background
+        from app import create_app, wait_for_api_key_validation
+        app = create_app()
 
-        if not api_key_valid:
-            print("\n" + "⚠️ " + "=" * 58 + " ⚠️")
-            print("WARNING: API key is missing or invalid.")
-            print("The application will run with limited functionality.")
-            print("Please set up a valid API key for full functionality.")
-            print("⚠️ " + "=" * 58 + " ⚠️" + "\n")
-        else:
-            print("\n✅ API key is valid. Full functionality is available.\n")
+        def report_api_key_status():
+            if not wait_for_api_key_validation():
+                print("\n" + "⚠️ " + "=" * 58 + " ⚠️")
+                print("WARNING: API key is missing or invalid.")
+                print("The application will run with limited functionality.")
+                print("Please set up a valid API key for full functionality.")
+                print("⚠️ " + "=" * 58 + " ⚠️" + "\n")
+            else:
+                print("\n✅ API key is valid. Full functionality is available.\n")
+
+        import threading
+        threading.Thread(target=report_api_key_status, daemon=True).start()
 
         # Open browser after a short delay
         def open_browser():
@@ -70,7 +75,6 @@ def start_server():
             print("\n🌐 Opening browser at http://127.0.0.1:5000\n")
             webbrowser.open('http://127.0.0.1:5000')
 
-        import threading
         threading.Thread(target=open_browser).start()
 
         print("\n" + "=" * 60)
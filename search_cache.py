@@ -0,0 +1,168 @@
+"""
+Result cache for SerpAPI searches.
+Concurrent users ask for the same things, and every SerpAPI call is paid for. Results are
+cached on the normalized query (and the other search parameters, never the API key) with
+a TTL. Identical searches that arrive while one is in flight wait for it and share its
+result instead of making their own call. Each call asks for fetch_num results, so a later
+search for fewer results of the same query is served from the cache. A search that
+bypasses the cache always makes its own call, and its result replaces the cached one.
+"""
+
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Parameters that select how many results come back rather than which ones
+COUNT_PARAMS = ("num",)
+SECRET_PARAMS = ("api_key",)
+
+DEFAULT_NUM = 10
+
+
+def normalize_query(query):
+    """Lower-case query with collapsed whitespace and without surrounding quotes"""
+    return re.sub(r"\s+", " ", str(query or "")).strip().strip("\"'").strip().lower()
+
+
+def _requested_num(params):
+    try:
+        return max(1, int(params.get("num", DEFAULT_NUM)))
+    except (TypeError, ValueError):
+        return DEFAULT_NUM
+
+
+def _trim(results, num):
+    """A copy of results with at most num organic results"""
+    results = json.loads(json.dumps(results))
+    if isinstance(results.get("organic_results"), list):
+        results["organic_results"] = results["organic_results"][:num]
+    return results
+
+
+class _Flight:
+    """A search in progress that identical searches wait for"""
+
+    def __init__(self, num):
+        self.num = num
+        self.event = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class SearchCache:
+    """TTL cache with single-flight calls
+
+    search(params) performs the SerpAPI call for a parameter dict and returns its results.
+    """
+
+    def __init__(self, ttl=3600, max_entries=500, fetch_num=10, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.fetch_num = fetch_num
+        self.clock = clock
+        self._lock = threading.Lock()
+        # key -> {"created", "num", "results"} in least recently used order
+        self._entries = OrderedDict()
+        self._flights = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "calls": 0, "errors": 0,
+                         "expired": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(params):
+        material = {k: v for k, v in params.items() if k not in COUNT_PARAMS + SECRET_PARAMS}
+        material["q"] = normalize_query(material.get("q"))
+        return json.dumps(material, sort_keys=True, default=str)
+
+    def get(self, params, search, timeout=None, bypass_cache=False):
+        """Results for params from the cache, an identical search in flight, or search()
+
+        With bypass_cache search() is always called, and its results are still stored.
+        """
+        key = self.make_key(params)
+        num = _requested_num(params)
+
+        if bypass_cache:
+            flight = _Flight(max(num, self.fetch_num))
+            with self._lock:
+                self.counters["bypassed"] += 1
+            self._run(key, params, flight, search)
+            if flight.error is not None:
+                raise flight.error
+            return _trim(flight.results, num)
+
+        with self._lock:
+            entry = self._lookup(key, num)
+            if entry is not None:
+                self.counters["hits"] += 1
+                return _trim(entry["results"], num)
+            flight = self._flights.get(key)
+            if flight is not None and flight.num >= num:
+                self.counters["coalesced"] += 1
+                leader = False
+            else:
+                flight = _Flight(max(num, self.fetch_num))
+                self._flights[key] = flight
+                self.counters["misses"] += 1
+                leader = True
+
+        if leader:
+            self._run(key, params, flight, search)
+        elif not flight.event.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for the in-flight search for {params.get('q')!r}")
+
+        if flight.error is not None:
+            raise flight.error
+        return _trim(flight.results, num)
+
+    def _lookup(self, key, num):
+        # Caller must hold the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.clock() - entry["created"] > self.ttl:
+            del self._entries[key]
+            self.counters["expired"] += 1
+            return None
+        organic = entry["results"].get("organic_results")
+        # A search that returned fewer results than it asked for has no more to give
+        if entry["num"] < num and isinstance(organic, list) and len(organic) >= entry["num"]:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _run(self, key, params, flight, search):
+        call_params = {**params, "num": flight.num}
+        try:
+            flight.results = search(call_params)
+        except Exception as e:
+            flight.error = e
+        with self._lock:
+            self.counters["calls"] += 1
+            if flight.error is not None:
+                self.counters["errors"] += 1
+            elif isinstance(flight.results, dict) and "error" not in flight.results:
+                # SerpAPI reports failures in the body; those are not cached
+                self._entries[key] = {"created": self.clock(), "num": flight.num, "results": flight.results}
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.counters["evictions"] += 1
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.event.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "in_flight": len(self._flights),
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                "coalesce_rate": round(self.counters["coalesced"] / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,201 @@
+"""
+Single-pass extraction of organic results from a Google results page.
+The selector cascade ran a full-tree select for each known layout, three more selects per
+result and possibly a scan of every link. The extractor walks the parsed tree once,
+classifying each element against precompiled layout rules as it goes: result containers
+are opened and closed with their subtree, and every element inside an open container is
+offered to its title, link and snippet slots. Layouts are data, so a new Google layout is
+one more entry in SERP_LAYOUTS.
+
+Rules are simple selectors: "tag", ".class" or "tag.class[.class...]".
+"""
+
+import re
+
+# Result layouts in order of preference; the first one whose containers yield a result wins
+SERP_LAYOUTS = [
+    {"name": "classic", "container": "div.g"},
+    {"name": "tf2cxc", "container": "div.tF2Cxc"},
+    {"name": "yurubf", "container": "div.yuRUbf"},
+    {"name": "basic", "container": "div.kCrYT"},
+]
+
+# Result fields: each takes the first element (in document order) matching its first rule
+# that matches anything in the container, like select_one over the rules in turn. A layout
+# may override them with its own "fields".
+SERP_FIELDS = {
+    "title": ["h3", ".LC20lb"],
+    "link": ["a"],
+    "snippet": [".VwiC3b", ".st", ".aCOpRe"],
+}
+
+# Redirect prefixes stripped from result links
+LINK_REDIRECT_PREFIXES = ("/url?q=",)
+
+NO_SNIPPET = "No description available"
+
+SELECTOR_RE = re.compile(r"^([A-Za-z][\w-]*)?((?:\.[\w-]+)*)$")
+
+
+class Rule:
+    """A compiled simple selector"""
+
+    __slots__ = ("selector", "tag", "classes")
+
+    def __init__(self, selector):
+        match = SELECTOR_RE.match(selector.strip())
+        if not match or not (match.group(1) or match.group(2)):
+            raise ValueError(f"Unsupported SERP selector: {selector!r}")
+        self.selector = selector
+        self.tag = match.group(1).lower() if match.group(1) else None
+        self.classes = frozenset(name for name in match.group(2).split(".") if name)
+
+    def matches(self, name, classes):
+        return (self.tag is None or self.tag == name) and self.classes <= classes
+
+
+class Layout:
+    __slots__ = ("name", "container", "fields")
+
+    def __init__(self, spec, default_fields):
+        self.name = spec["name"]
+        self.container = Rule(spec["container"])
+        self.fields = [(field, [Rule(selector) for selector in selectors])
+                       for field, selectors in spec.get("fields", default_fields).items()]
+
+
+class _Container:
+    """A result container being filled during the walk"""
+
+    __slots__ = ("layout", "depth", "slots")
+
+    def __init__(self, layout, depth):
+        self.layout = layout
+        self.depth = depth
+        # (field, rule index) -> first matching element
+        self.slots = {}
+
+    def offer(self, name, classes, element):
+        for field, rules in self.layout.fields:
+            for index, rule in enumerate(rules):
+                if (field, index) not in self.slots and rule.matches(name, classes):
+                    self.slots[(field, index)] = element
+
+    def field(self, field):
+        rules = dict(self.layout.fields)[field]
+        for index in range(len(rules)):
+            element = self.slots.get((field, index))
+            if element is not None:
+                return element
+        return None
+
+
+def _element_classes(element):
+    value = element.get("class")
+    if not value:
+        return frozenset()
+    if isinstance(value, str):
+        value = value.split()
+    return frozenset(value)
+
+
+def _clean_link(link):
+    for prefix in LINK_REDIRECT_PREFIXES:
+        if link.startswith(prefix):
+            return link.split(prefix)[1].split("&")[0]
+    return link
+
+
+class SerpExtractor:
+    def __init__(self, layouts=SERP_LAYOUTS, fields=SERP_FIELDS):
+        self.layouts = [Layout(spec, fields) for spec in layouts]
+        # Tags and classes any rule looks at, to pass over other elements quickly
+        rules = [layout.container for layout in self.layouts]
+        rules += [rule for layout in self.layouts for _, field_rules in layout.fields for rule in field_rules]
+        self._tags = {rule.tag for rule in rules if rule.tag and not rule.classes}
+        self._classes = {name for rule in rules for name in rule.classes}
+        self._container_tags = {layout.container.tag for layout in self.layouts}
+
+    @property
+    def container_classes(self):
+        """Classes of the result containers of all layouts"""
+        return sorted({name for layout in self.layouts for name in layout.container.classes})
+
+    def extract(self, soup, limit=5, fallback_links=True):
+        """Results of the first layout with a result, else the plain links of the page
+
+        With fallback_links=False a page without layout results gives an empty list, for
+        trees that do not hold all of the page's links.
+        """
+        containers = [[] for _ in self.layouts]
+        link_candidates = []
+        active = []
+
+        for depth, element in self._walk(soup, active):
+            name = element.name
+            classes = _element_classes(element)
+            if fallback_links and name == "a" and element.get("href", "").startswith("http"):
+                link_candidates.append(element)
+            if name not in self._tags and not (classes & self._classes):
+                continue
+
+            for container in active:
+                container.offer(name, classes, element)
+            if name in self._container_tags or None in self._container_tags:
+                for index, layout in enumerate(self.layouts):
+                    if len(containers[index]) < limit and layout.container.matches(name, classes):
+                        container = _Container(layout, depth)
+                        containers[index].append(container)
+                        active.append(container)
+
+        for layout_containers in containers:
+            results = [result for result in map(self._result, layout_containers) if result]
+            if results:
+                return results
+        return self._links(link_candidates, limit)
+
+    @staticmethod
+    def _walk(root, active):
+        """Elements below root in document order with their depth, closing containers on the way out"""
+        stack = [iter(root.contents)]
+        while stack:
+            for child in stack[-1]:
+                # Strings and comments have no name
+                if child.name is not None:
+                    yield len(stack), child
+                    stack.append(iter(child.contents))
+                    break
+            else:
+                stack.pop()
+                # Containers entered at this depth have ended
+                while active and active[-1].depth >= len(stack):
+                    active.pop()
+
+    @staticmethod
+    def _result(container):
+        title_elem = container.field("title")
+        link_elem = container.field("link")
+        if title_elem is None or link_elem is None or link_elem.get("href") is None:
+            return None
+        snippet_elem = container.field("snippet")
+        return {
+            "title": title_elem.get_text(),
+            "link": _clean_link(link_elem.get("href")),
+            "snippet": snippet_elem.get_text() if snippet_elem is not None else NO_SNIPPET,
+        }
+
+    def extract_links(self, soup, limit=5):
+        """Plain links of a page, for pages without a known result layout"""
+        candidates = [a_tag for a_tag in soup.find_all("a") if a_tag.get("href", "").startswith("http")]
+        return self._links(candidates, limit)
+
+    @staticmethod
+    def _links(candidates, limit):
+        results = []
+        for a_tag in candidates:
+            text = a_tag.text
+            if text and len(text.strip()) > 10:
+                results.append({"title": text.strip(), "link": a_tag.get("href"), "snippet": NO_SNIPPET})
+                if len(results) >= limit:
+                    break
+        return results
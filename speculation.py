@@ -0,0 +1,161 @@
+"""
+Speculative browser searches.
+For instructions that mention searching, finding or the latest news, the first planned
+step is nearly always a browser search. The likely search is started as soon as the
+instruction arrives, while the planning call is still in flight. If the plan contains a
+matching search step its result is reused; otherwise, or if the plan finishes without
+that step claiming it, the speculative search is discarded.
+"""
+
+import re
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+TRIGGER_RE = re.compile(r"\b(?:search|find|latest)\b", re.IGNORECASE)
+QUERY_RE = re.compile(r"\b(?:search(?: the web)?(?: for| about)?|find(?: out)?(?: about)?|look up)\s+(.+)", re.IGNORECASE)
+LATEST_RE = re.compile(r"\b(latest\b.+)", re.IGNORECASE)
+# The query usually ends where the next part of the instruction begins
+QUERY_END_RE = re.compile(r",|;|:|\band\b|\bthen\b|\b(?:to|in|into|as) (?:a )?file\b", re.IGNORECASE)
+STOP_WORDS = {"the", "a", "an", "me", "some"}
+
+
+def guess_search_query(instruction):
+    """Guess the query of the first search step, or None if the instruction is not a search"""
+    if not instruction or not TRIGGER_RE.search(instruction):
+        return None
+    match = QUERY_RE.search(instruction) or LATEST_RE.search(instruction)
+    if not match:
+        return None
+    query = QUERY_END_RE.split(match.group(1), maxsplit=1)[0]
+    query = query.strip().strip("\"'").rstrip(".!?").strip()
+    return query if len(query) >= 2 else None
+
+
+def query_signature(query):
+    """Order-insensitive form of a query used to decide whether two searches are the same"""
+    words = re.findall(r"\w+", (query or "").lower())
+    return frozenset(word for word in words if word not in STOP_WORDS)
+
+
+def search_query(action):
+    """The query of a "search for ..." browser action, parsed the same way browser_execution does"""
+    action_lower = (action or "").lower()
+    if "search for" not in action_lower:
+        return None
+    return action_lower.split("search for")[1].strip().strip('"\'')
+
+
+class SpeculationTracker:
+    """Process-wide counters for speculative searches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"started": 0, "hits": 0, "misses": 0, "failed": 0,
+                         "saved_seconds": 0.0, "wasted_seconds": 0.0}
+
+    def start(self, executor, query, search):
+        """Run search("search for <query>") on the executor and return the Speculation tracking it"""
+        speculation = Speculation(self, query)
+        speculation.future = executor.submit(speculation._run, search)
+        self.add("started")
+        logger.info(f"Started speculative search for: {query}")
+        return speculation
+
+    def add(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def stats(self):
+        with self._lock:
+            resolved = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "saved_seconds": round(self.counters["saved_seconds"], 3),
+                "wasted_seconds": round(self.counters["wasted_seconds"], 3),
+                "hit_rate": round(self.counters["hits"] / resolved, 4) if resolved else 0.0,
+            }
+
+
+class Speculation:
+    """A single speculative search started for one instruction"""
+
+    def __init__(self, tracker, query):
+        self.tracker = tracker
+        self.query = query
+        self.signature = query_signature(query)
+        self.future = None
+        self.run_started = None
+        self.run_finished = None
+        self.info = {"query": query, "outcome": "pending"}
+        self._discarded = False
+        self._claimed = False
+        self._lock = threading.Lock()
+
+    def _run(self, search):
+        if self._discarded:
+            return None
+        self.run_started = time.perf_counter()
+        try:
+            return search(f"search for {self.query}")
+        finally:
+            with self._lock:
+                self.run_finished = time.perf_counter()
+                wasted = self._discarded
+            if wasted:
+                # The plan did not use this search after all
+                self.tracker.add("wasted_seconds", self.run_finished - self.run_started)
+
+    def matches(self, action):
+        query = search_query(action)
+        return query is not None and query_signature(query) == self.signature
+
+    def resolve(self, plan):
+        """Keep the search if the plan has a matching browser step, otherwise discard it"""
+        for step in plan.get("execution_steps", []) if isinstance(plan, dict) else []:
+            if step.get("environment", "").lower() == "browser" and self.matches(step.get("action", "")):
+                return True
+        self.discard()
+        return False
+
+    def discard(self):
+        with self._lock:
+            if self._discarded or self._claimed:
+                return
+            self._discarded = True
+            finished = self.run_finished
+        self.future.cancel()
+        if finished is not None:
+            self.tracker.add("wasted_seconds", finished - self.run_started)
+        self.tracker.add("misses")
+        self.info["outcome"] = "miss"
+        logger.info(f"Discarded speculative search for: {self.query}")
+
+    def claim(self, action):
+        """Return the speculative result for a matching search step, or None to run it normally"""
+        if not self.matches(action):
+            return None
+        with self._lock:
+            if self._discarded or self._claimed:
+                return None
+            self._claimed = True
+        claimed_at = time.perf_counter()
+        try:
+            result = self.future.result()
+        except Exception as e:
+            logger.warning(f"Speculative search failed: {str(e)}")
+            result = None
+        if not isinstance(result, dict) or result.get("status") != "success":
+            self.tracker.add("failed")
+            self.info["outcome"] = "failed"
+            return None
+
+        # Time the search had already been running when the step asked for it
+        saved = max(0.0, min(self.run_finished, claimed_at) - self.run_started)
+        self.tracker.add("hits")
+        self.tracker.add("saved_seconds", saved)
+        self.info.update({"outcome": "hit", "saved_seconds": round(saved, 3)})
+        logger.info(f"Reused speculative search for: {self.query}")
+        return result
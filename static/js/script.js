@@ -16,11 +16,14 @@ document.addEventListener('DOMContentLoaded', function() {
     const terminalContent = document.getElementById('terminal-content');
     const filesystemContent = document.getElementById('filesystem-content');
     
+    // The instruction in progress, cancelled when a new one is submitted
+    let currentJob = null;
+    
     // Event Listeners
     submitBtn.addEventListener('click', processInstruction);
     downloadReportBtn.addEventListener('click', downloadReport);
     
-    // Process the user instruction
+    // Process the user instruction, rendering progress as the server streams it
     async function processInstruction() {
         const instruction = instructionTextarea.value.trim();
         
@@ -29,42 +32,142 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
         
+        // Stop the previous instruction so the server does not keep working on it
+        cancelCurrentJob();
+        const job = { id: null, controller: new AbortController() };
+        currentJob = job;
+        
         // Update UI to show processing state
         setStatus('processing');
-        showLoading('Processing your instruction...');
+        showLoading('Planning your instruction...');
         resetEnvironments();
         
         try {
-            const response = await fetch('/api/process', {
+            const response = await fetch('/api/process/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ instruction })
+                body: JSON.stringify({ instruction }),
+                signal: job.controller.signal
             });
             
-            const result = await response.json();
-            
-            // Hide loading overlay
-            hideLoading();
-            
-            // Update UI based on result
-            if (result.status === 'completed') {
-                setStatus('completed');
-                displayResults(result);
-                displayReport(result.report);
-                downloadReportBtn.disabled = false;
-            } else {
+            if (!response.ok || !response.body) {
+                const result = await response.json();
+                hideLoading();
                 setStatus('failed');
                 displayError(result.message);
+                return;
             }
+            
+            let reportText = '';
+            await readEventStream(response.body, (event, data) => {
+                if (event === 'job_created') {
+                    job.id = data.job_id;
+                    return;
+                }
+                reportText = handleStreamEvent(event, data, reportText);
+            });
         } catch (error) {
+            if (error.name === 'AbortError') {
+                // Replaced by a newer instruction, which owns the UI now
+                return;
+            }
             hideLoading();
             setStatus('failed');
             displayError('An error occurred while processing your instruction: ' + error.message);
         }
     }
     
+    // Abort the stream of the instruction in progress and cancel its job on the server
+    function cancelCurrentJob() {
+        if (!currentJob) {
+            return;
+        }
+        currentJob.controller.abort();
+        if (currentJob.id) {
+            fetch(`/api/jobs/${currentJob.id}`, { method: 'DELETE' }).catch(() => {});
+        }
+        currentJob = null;
+    }
+    
+    // Read Server-Sent Events from a fetch response body
+    async function readEventStream(body, onEvent) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let event = 'message';
+                let data = '';
+                message.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                
+                if (data) {
+                    onEvent(event, JSON.parse(data));
+                }
+            }
+        }
+    }
+    
+    // Update the UI for a single streamed event and return the report text so far
+    function handleStreamEvent(event, data, reportText) {
+        switch (event) {
+            case 'plan_created':
+                hideLoading();
+                reportContent.innerHTML = `<p class="report-placeholder">Executing ${(data.execution_steps || []).length} steps...</p>`;
+                break;
+            case 'step_started':
+                reportContent.innerHTML = `<p class="report-placeholder">Running step ${data.step_number}: ${data.action}</p>`;
+                break;
+            case 'step_finished':
+                displayResults({ results: [data] });
+                break;
+            case 'report_token':
+                reportText += data.text;
+                displayReport(reportText);
+                break;
+            case 'done':
+                hideLoading();
+                if (data.status === 'completed') {
+                    setStatus('completed');
+                    displayReport(data.report);
+                    downloadReportBtn.disabled = false;
+                } else if (data.status === 'partial') {
+                    // Deadline exceeded: show the report of the steps that finished
+                    setStatus('partial');
+                    displayReport(`> ${data.message}\n\n${data.report}`);
+                    downloadReportBtn.disabled = false;
+                } else {
+                    setStatus('failed');
+                    displayError(data.message);
+                }
+                break;
+            case 'error':
+                hideLoading();
+                setStatus('failed');
+                displayError(data.message);
+                break;
+        }
+        return reportText;
+    }
+    
     // Update the status badge
     function setStatus(status) {
         statusBadge.className = 'status-badge ' + status;
@@ -3,6 +3,7 @@ Test script for the Autonomous AI Agent.
 This script tests the AI agent's ability to perform tasks in different environments.
 """
 
+import time
 import unittest
 import json
 from app import AIAgent
@@ -57,5 +58,30 @@ class TestAIAgent(unittest.TestCase):
         result = self.agent.file_system_execution("corrupt file system")
         self.assertEqual(result["status"], "error")
 
+class TestConcurrentGeneration(unittest.TestCase):
+    def test_independent_calls_overlap(self):
+        """Test that independent Gemini calls run at the same time and their timing is reported"""
+        agent = AIAgent()
+
+        def slow_generate(prompt, call_type):
+            time.sleep(0.2)
+            return f"{call_type}: {prompt}"
+
+        agent._generate = slow_generate
+        start = time.perf_counter()
+        texts, timing = agent._generate_concurrently({"response": ("hello", "response"),
+                                                      "document": ("a report", "document")})
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(texts, {"response": "response: hello", "document": "document: a report"})
+        self.assertLess(elapsed, 0.35)
+        self.assertEqual(set(timing["calls"]), {"response", "document"})
+        for call in timing["calls"].values():
+            self.assertGreaterEqual(call["duration_seconds"], 0.2)
+            self.assertLess(call["started_after_seconds"], 0.1)
+        self.assertGreaterEqual(timing["sequential_seconds"], 0.4)
+        self.assertLess(timing["wall_seconds"], timing["sequential_seconds"])
+        self.assertGreater(timing["overlap_seconds"], 0.1)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
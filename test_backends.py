@@ -0,0 +1,77 @@
+"""
+Test script for the record/replay backends.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import requests
+from backends import RecordingBackend, ReplayBackend, CassetteMissError
+
+def fake_response(url, body):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers["Content-Type"] = "text/html; charset=utf-8"
+    response.encoding = "utf-8"
+    response._content = body.encode("utf-8")
+    return response
+
+class TestBackends(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cassette = os.path.join(self.tmp_dir, "cassette.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def record_exchanges(self):
+        recorder = RecordingBackend(self.cassette)
+        recorder.llm_generate("planning", "plan this", lambda: '{"execution_steps": []}')
+        recorder.http_get("https://example.com/", lambda: fake_response("https://example.com/", "<title>Example</title>"))
+        recorder.serpapi_search({"q": "python", "api_key": "secret", "num": 5}, lambda: {"organic_results": [{"title": "Python"}]})
+        list(recorder.llm_stream("report", "report this", lambda: iter(["# Rep", "ort"])))
+        return recorder
+
+    def test_record_then_replay(self):
+        """Test that recorded exchanges are served back without calling the live service"""
+        self.assertEqual(self.record_exchanges().recorded, 4)
+
+        def live_call():
+            raise AssertionError("replay must not call the live service")
+
+        replay = ReplayBackend(self.cassette, latency=0)
+        self.assertEqual(replay.llm_generate("planning", "plan this", live_call), '{"execution_steps": []}')
+        self.assertIn("Example", replay.http_get("https://example.com/", live_call).text)
+        self.assertEqual(replay.serpapi_search({"q": "python", "api_key": "other", "num": 5}, live_call)["organic_results"][0]["title"], "Python")
+        self.assertEqual(list(replay.llm_stream("report", "report this", live_call)), ["# Rep", "ort"])
+        self.assertEqual(replay.stats()["exact_hits"], 4)
+
+    def test_api_key_is_not_recorded(self):
+        """Test that the SerpAPI key never reaches the cassette"""
+        self.record_exchanges()
+        with open(self.cassette, "r", encoding="utf-8") as f:
+            self.assertNotIn("secret", f.read())
+
+    def test_loose_and_strict_matching(self):
+        """Test that unrecorded prompts fall back to the same call type unless strict"""
+        self.record_exchanges()
+        loose = ReplayBackend(self.cassette, latency=0)
+        self.assertEqual(loose.llm_generate("planning", "a different prompt", None), '{"execution_steps": []}')
+        self.assertEqual(loose.stats()["loose_hits"], 1)
+
+        strict = ReplayBackend(self.cassette, latency=0, strict=True)
+        with self.assertRaises(CassetteMissError):
+            strict.llm_generate("planning", "a different prompt", None)
+
+    def test_synthetic_latency(self):
+        """Test that a fixed synthetic latency is applied to each exchange"""
+        self.record_exchanges()
+        replay = ReplayBackend(self.cassette, latency=0.05)
+        replay.llm_generate("planning", "plan this", None)
+        self.assertGreaterEqual(replay.stats()["simulated_latency_seconds"], 0.05)
+
+if __name__ == "__main__":
+    unittest.main()
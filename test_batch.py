@@ -0,0 +1,90 @@
+"""
+Test script for batch instruction processing.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import app as agent_app
+from backends import RecordingBackend, ReplayBackend, set_backend
+
+def general_plan(number, query):
+    return {
+        "instruction_number": number,
+        "task_analysis": f"Answer {query}",
+        "environments_needed": ["general_response"],
+        "execution_steps": [
+            {"step_number": 1, "environment": "general_response",
+             "action": f"respond to query: {query}", "expected_outcome": "An answer"}
+        ]
+    }
+
+class CountingReplayBackend(ReplayBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.planning_prompts = []
+
+    def llm_generate(self, call_type, prompt, live_call):
+        if call_type == "planning":
+            self.planning_prompts.append(prompt)
+        return super().llm_generate(call_type, prompt, live_call)
+
+class TestBatchProcessing(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        cassette = os.path.join(self.tmp_dir, "batch.json")
+        recorder = RecordingBackend(cassette)
+        plans = [general_plan(1, "What is Python?"), general_plan(2, "What is Flask?")]
+        recorder.llm_generate("planning", "batch", lambda: json.dumps(plans))
+        recorder.llm_generate("response", "answer", lambda: "An answer.")
+        recorder.llm_generate("report", "report", lambda: "# Report")
+        self.backend = CountingReplayBackend(cassette, latency=0)
+        self.previous_backend = set_backend(self.backend)
+        # Learned templates would let later tests skip the planning calls they count
+        self.previous_learn, agent_app.plan_templates.learn = agent_app.plan_templates.learn, False
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+        agent_app.plan_templates.learn = self.previous_learn
+        shutil.rmtree(self.tmp_dir)
+
+    def test_instructions_are_planned_together(self):
+        """Test that one planning call covers a chunk of instructions"""
+        instructions = ["What is Python?", "What is Flask?", "What is Django?"]
+        records = list(agent_app.process_batch_iter(instructions, bypass_cache=True, planning_size=2, max_workers=2))
+
+        self.assertEqual(sorted(record["index"] for record in records), [0, 1, 2])
+        self.assertEqual(len(self.backend.planning_prompts), 2)
+        # The two chunks are planned concurrently, so their prompts arrive in either order
+        self.assertTrue(any('1. "What is Python?"' in prompt for prompt in self.backend.planning_prompts))
+        for record in records:
+            self.assertEqual(record["status"], "completed")
+            self.assertEqual(record["plan_source"], "batch")
+            self.assertEqual(record["instruction"], instructions[record["index"]])
+            self.assertIn("elapsed_seconds", record)
+
+    def test_template_instructions_skip_planning(self):
+        """Test that instructions with a hard-coded plan do not need a planning call"""
+        records = list(agent_app.process_batch_iter(["Generate a report on solar power as a PDF"], bypass_cache=True))
+        self.assertEqual(records[0]["plan_source"], "template")
+        self.assertEqual(self.backend.planning_prompts, [])
+
+    def test_batch_endpoint_streams_ndjson(self):
+        """Test that the endpoint returns one JSON line per instruction"""
+        client = agent_app.create_app(validate_api_key=False).test_client()
+        response = client.post("/api/process/batch", json={"instructions": ["What is Python?", "What is Flask?"], "bypass_cache": True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(sorted(record["index"] for record in records), [0, 1])
+
+    def test_batch_endpoint_validates_instructions(self):
+        """Test that malformed batches are rejected"""
+        client = agent_app.create_app(validate_api_key=False).test_client()
+        self.assertEqual(client.post("/api/process/batch", json={"instructions": []}).status_code, 400)
+        self.assertEqual(client.post("/api/process/batch", json={"instructions": ["ok", 3]}).status_code, 400)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Test script for cooperative cancellation of jobs.
+"""
+
+import time
+import threading
+import subprocess
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import app as agent_app
+from app import AIAgent
+from cancellation import CancellationToken, JobCancelled, kill_process_tree, popen_group_options
+from jobs import JobManager
+
+class SlowBodyHandler(BaseHTTPRequestHandler):
+    """Sends a large body a little at a time"""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.end_headers()
+        try:
+            for _ in range(50):
+                self.wfile.write(b"x" * 1024)
+                self.wfile.flush()
+                time.sleep(0.1)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def cancel_later(token, seconds):
+    timer = threading.Timer(seconds, token.cancel, args=("test",))
+    timer.start()
+    return timer
+
+class TestCancellationToken(unittest.TestCase):
+    def test_callbacks(self):
+        """Test that callbacks run once on cancel, and at once when registered afterwards"""
+        token = CancellationToken()
+        calls = []
+        token.on_cancel(lambda: calls.append("first"))
+        unregister = token.on_cancel(lambda: calls.append("removed"))
+        unregister()
+
+        self.assertTrue(token.cancel("user"))
+        self.assertFalse(token.cancel("again"))
+        token.on_cancel(lambda: calls.append("late"))
+        self.assertEqual(calls, ["first", "late"])
+        with self.assertRaises(JobCancelled):
+            token.check()
+
+    def test_kill_process_tree(self):
+        """Test that killing a command also kills the processes it started"""
+        process = subprocess.Popen("sleep 5 & sleep 5; wait", shell=True, **popen_group_options())
+        start = time.perf_counter()
+        kill_process_tree(process)
+        process.wait(2)
+        self.assertLess(time.perf_counter() - start, 2)
+
+    def test_http_fetch_is_aborted(self):
+        """Test that cancelling closes a slow download instead of waiting for it"""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SlowBodyHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            token = CancellationToken()
+            cancel_later(token, 0.3)
+            start = time.perf_counter()
+            with self.assertRaises(JobCancelled):
+                agent_app.http_get(f"http://127.0.0.1:{server.server_address[1]}/", cancel_token=token, timeout=10)
+            self.assertLess(time.perf_counter() - start, 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class SlowStepAgent(AIAgent):
+    def terminal_execution(self, action):
+        time.sleep(0.05 if action == "echo fast" else 2)
+        return {"status": "success", "command": action, "stdout": "", "stderr": "", "return_code": 0}
+
+class TestPlanCancellation(unittest.TestCase):
+    def test_cancel_stops_the_plan_and_skips_the_report(self):
+        """Test that a cancelled plan returns at once, starts no more steps and writes no report"""
+        agent = SlowStepAgent(report_mode="llm")
+        agent._generate = lambda prompt, call_type: self.fail("a cancelled job must not write a report")
+        plan = {"execution_steps": [
+            {"step_number": 1, "environment": "terminal", "action": "echo fast"},
+            {"step_number": 2, "environment": "terminal", "action": "echo slow"},
+            {"step_number": 3, "environment": "terminal", "action": "echo never"},
+        ]}
+        cancel_later(agent.cancel_token, 0.3)
+        start = time.perf_counter()
+        result = agent.execute_plan(plan)
+
+        self.assertLess(time.perf_counter() - start, 1.5)
+        self.assertEqual(result["status"], "cancelled")
+        self.assertEqual(result["skipped_steps"], [3])
+        self.assertTrue(result["results"][1]["cancelled"])
+        self.assertEqual(result["report"], "")
+
+    def test_cancelled_terminal_step(self):
+        agent = AIAgent()
+        agent.cancel_token.cancel("test")
+        result = agent.terminal_execution("echo hello")
+        self.assertEqual(result["status"], "error")
+        self.assertTrue(result["cancelled"])
+
+class TestJobCancellation(unittest.TestCase):
+    def test_queued_job_never_runs(self):
+        """Test that a job cancelled while queued finishes as cancelled without running"""
+        release = threading.Event()
+        ran = []
+        manager = JobManager(lambda job: ran.append(job.instruction) or release.wait(2) and {"status": "completed"},
+                             max_workers=1)
+        manager.submit("first")
+        second = manager.submit("second")
+        manager.cancel(second.id)
+        release.set()
+        self.assertTrue(second.wait(2))
+        self.assertEqual(second.status, "cancelled")
+        self.assertEqual(ran, ["first"])
+        self.assertEqual(manager.stats()["cancelled"], 1)
+
+    def test_delete_endpoint(self):
+        client = agent_app.create_app(validate_api_key=False).test_client()
+        self.assertEqual(client.delete("/api/jobs/missing").status_code, 404)
+
+        job = agent_app.job_manager.create("echo hello")
+        response = client.delete(f"/api/jobs/{job.id}")
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(job.cancel_token.cancelled)
+
+        agent_app.job_manager.complete(job, {"status": "cancelled"})
+        self.assertEqual(client.delete(f"/api/jobs/{job.id}").status_code, 409)
+
+if __name__ == "__main__":
+    unittest.main()
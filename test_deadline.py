@@ -0,0 +1,133 @@
+"""
+Test script for request deadlines and per-call timeouts.
+"""
+
+import time
+import threading
+import unittest
+from unittest import mock
+import app as agent_app
+from app import AIAgent
+from deadline import Deadline, DeadlineExceeded
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestDeadline(unittest.TestCase):
+    def test_timeouts_are_capped_by_the_budget(self):
+        """Test that a call gets the smaller of its cap and the remaining budget"""
+        clock = FakeClock()
+        deadline = Deadline(10, clock=clock)
+        self.assertEqual(deadline.timeout(15), 10)
+        clock.now = 7
+        self.assertEqual(deadline.timeout(15), 3)
+        self.assertEqual(deadline.timeout(2), 2)
+
+        clock.now = 10
+        self.assertTrue(deadline.expired())
+        with self.assertRaises(DeadlineExceeded):
+            deadline.timeout(15, "fetching the page")
+
+    def test_no_deadline(self):
+        """Test that a zero or missing budget never expires"""
+        for seconds in (None, 0):
+            deadline = Deadline(seconds)
+            self.assertIsNone(deadline.remaining())
+            self.assertFalse(deadline.expired())
+            self.assertEqual(deadline.timeout(15), 15)
+
+    def test_terminal_step_after_deadline(self):
+        """Test that a command is not started once the deadline has passed"""
+        clock = FakeClock()
+        agent = AIAgent()
+        agent.deadline = Deadline(5, clock=clock)
+        clock.now = 6
+        result = agent.execute_step({"step_number": 1, "environment": "terminal", "action": "echo hello"})
+        self.assertEqual(result["status"], "error")
+        self.assertTrue(result["timed_out"])
+
+    def test_llm_call_timeout(self):
+        """Test that a Gemini call that does not return in time raises DeadlineExceeded"""
+        with self.assertRaises(DeadlineExceeded):
+            agent_app._call_with_timeout(lambda: time.sleep(0.5), 0.05, "Gemini test call")
+        self.assertEqual(agent_app._call_with_timeout(lambda: "ok", 1, "Gemini test call"), "ok")
+
+    def test_llm_stream_timeout(self):
+        """Test that a stream whose first chunk never comes does not outlive its timeout"""
+        def slow_stream():
+            time.sleep(0.5)
+            yield "late"
+
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            list(agent_app._stream_with_timeout(slow_stream, 0.05, "Gemini test stream"))
+        self.assertLess(time.perf_counter() - start, 0.3)
+        self.assertEqual(list(agent_app._stream_with_timeout(lambda: iter(["a", "b"]), 1, "Gemini test stream")), ["a", "b"])
+
+    def test_streamed_report_waits_for_the_governor_within_the_deadline(self):
+        """Test that a streamed report stuck waiting for a governor slot gives up at the deadline"""
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        class BusyGovernor:
+            def stream(self, fn, call_type="general"):
+                release.wait(5)
+                yield from ()
+
+        agent = AIAgent(report_mode="llm", deadline_seconds=0.2, bypass_cache=True)
+        plan = {"task_analysis": "Print a word", "execution_steps": [
+            {"step_number": 1, "environment": "terminal", "action": "echo hi"}]}
+        results = [{"status": "success", "command": "echo hi", "stdout": "hi", "stderr": "", "return_code": 0}]
+        start = time.perf_counter()
+        with mock.patch.object(agent_app, "llm_governor", BusyGovernor()):
+            chunks = list(agent.generate_report_stream(plan, results))
+
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(chunks, [])
+        self.assertTrue(agent.report)
+
+class SlowStepAgent(AIAgent):
+    """Agent whose terminal steps take longer than the deadline allows"""
+
+    def terminal_execution(self, action):
+        time.sleep(0.1 if action == "echo fast" else 1)
+        return {"status": "success", "command": action, "stdout": action[5:], "stderr": "", "return_code": 0}
+
+class TestPartialResults(unittest.TestCase):
+    def test_deadline_returns_partial_results(self):
+        """Test that a plan cut off by its deadline returns what finished with a template report"""
+        agent = SlowStepAgent(report_mode="llm", deadline_seconds=0.4)
+        agent.current_task = "Print some words"
+        agent._generate = lambda prompt, call_type: self.fail("no Gemini report after the deadline")
+        plan = {"task_analysis": "Print some words", "execution_steps": [
+            {"step_number": 1, "environment": "terminal", "action": "echo fast"},
+            {"step_number": 2, "environment": "terminal", "action": "echo slow"},
+            {"step_number": 3, "environment": "terminal", "action": "echo never"},
+        ]}
+        before = agent_app.timeout_counter.stats()
+        start = time.perf_counter()
+        result = agent.execute_plan(plan)
+
+        self.assertLess(time.perf_counter() - start, 0.9)
+        self.assertEqual(result["status"], "partial")
+        self.assertEqual(result["skipped_steps"], [3])
+        self.assertEqual(len(result["results"]), 2)
+        self.assertTrue(result["results"][1]["timed_out"])
+        self.assertEqual(result["metrics"]["report_mode"], "template")
+        self.assertIn("## Executive Summary", result["report"])
+
+        after = agent_app.timeout_counter.stats()
+        self.assertEqual(after["deadlines_exceeded"], before["deadlines_exceeded"] + 1)
+        self.assertEqual(after["by_environment"].get("terminal", 0), before["by_environment"].get("terminal", 0) + 1)
+
+    def test_endpoint_rejects_bad_deadline(self):
+        client = agent_app.create_app(validate_api_key=False).test_client()
+        response = client.post("/api/process", json={"instruction": "echo hello", "deadline_seconds": -1})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == "__main__":
+    unittest.main()
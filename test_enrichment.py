@@ -0,0 +1,92 @@
+"""
+Test script for search result enrichment.
+"""
+
+import time
+import threading
+import unittest
+from cancellation import CancellationToken, JobCancelled
+from enrichment import ResultEnricher
+
+def make_results(*links):
+    return [{"title": f"Result {i}", "link": link, "snippet": "snippet"} for i, link in enumerate(links)]
+
+class SlowFetch:
+    """Fake page fetch that sleeps per URL and tracks concurrent fetches per host"""
+
+    def __init__(self, delays=None, failing=()):
+        self.delays = delays or {}
+        self.failing = failing
+        self._lock = threading.Lock()
+        self.active = {}
+        self.max_active = {}
+        self.aborted = []
+
+    def __call__(self, url, cancel_token, timeout):
+        host = url.split("/")[2]
+        with self._lock:
+            self.active[host] = self.active.get(host, 0) + 1
+            self.max_active[host] = max(self.max_active.get(host, 0), self.active[host])
+        try:
+            if url in self.failing:
+                raise ConnectionError("refused")
+            if cancel_token._event.wait(self.delays.get(url, 0.05)):
+                self.aborted.append(url)
+                raise JobCancelled("aborted")
+            return {"title": f"Page {url}", "text": f"text of {url}"}
+        finally:
+            with self._lock:
+                self.active[host] -= 1
+
+class TestResultEnricher(unittest.TestCase):
+    def test_pages_are_attached_to_their_results(self):
+        fetch = SlowFetch(failing=("https://c.com/3",))
+        enricher = ResultEnricher(fetch, max_workers=4)
+        results = make_results("https://a.com/1", "ftp://x/y", "https://b.com/2", "https://c.com/3", "https://d.com/4")
+        enriched, summary = enricher.enrich(results, top_n=3, budget_seconds=5)
+
+        self.assertEqual(enriched[0]["page"]["text"], "text of https://a.com/1")
+        self.assertNotIn("page", enriched[1])
+        self.assertEqual(enriched[2]["page"]["title"], "Page https://b.com/2")
+        self.assertNotIn("page", enriched[3])
+        self.assertNotIn("page", enriched[4])
+        self.assertNotIn("page", results[0])
+        self.assertEqual((summary["requested"], summary["enriched"], summary["failed"]), (3, 2, 1))
+
+    def test_fetches_run_concurrently_within_host_limits(self):
+        fetch = SlowFetch(delays={url: 0.2 for url in ("https://a.com/1", "https://a.com/2", "https://b.com/1", "https://c.com/1")})
+        enricher = ResultEnricher(fetch, max_workers=4, per_host=1)
+        results = make_results("https://a.com/1", "https://a.com/2", "https://b.com/1", "https://c.com/1")
+        start = time.perf_counter()
+        _, summary = enricher.enrich(results, top_n=4, budget_seconds=5)
+
+        self.assertEqual(summary["enriched"], 4)
+        self.assertEqual(fetch.max_active["a.com"], 1)
+        # The other hosts were fetched alongside a.com's two pages
+        self.assertLess(time.perf_counter() - start, 0.2 * 3)
+
+    def test_slow_hosts_are_dropped_at_the_budget(self):
+        fetch = SlowFetch(delays={"https://slow.com/1": 5})
+        enricher = ResultEnricher(fetch)
+        start = time.perf_counter()
+        enriched, summary = enricher.enrich(make_results("https://fast.com/1", "https://slow.com/1"),
+                                            top_n=2, budget_seconds=0.5)
+
+        self.assertLess(time.perf_counter() - start, 1.5)
+        self.assertIn("page", enriched[0])
+        self.assertNotIn("page", enriched[1])
+        self.assertEqual(summary["dropped"], 1)
+        time.sleep(0.1)
+        self.assertEqual(fetch.aborted, ["https://slow.com/1"])
+        self.assertEqual(enricher.stats()["dropped"], 1)
+
+    def test_cancelled_job(self):
+        fetch = SlowFetch(delays={"https://slow.com/1": 5})
+        enricher = ResultEnricher(fetch)
+        token = CancellationToken()
+        threading.Timer(0.2, token.cancel).start()
+        with self.assertRaises(JobCancelled):
+            enricher.enrich(make_results("https://slow.com/1"), budget_seconds=10, cancel_token=token)
+
+if __name__ == "__main__":
+    unittest.main()
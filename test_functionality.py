@@ -9,11 +9,25 @@ import sys
 import json
 import logging
 from app import AIAgent
+from backends import ReplayBackend, set_backend
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Recorded Gemini, web and SerpAPI exchanges used to run the tests offline
+CASSETTE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "cassettes", "functionality.json")
+_previous_backend = None
+
+def setup_module(module=None):
+    """Serve all network calls from the cassette"""
+    global _previous_backend
+    _previous_backend = set_backend(ReplayBackend(CASSETTE_PATH, latency=0))
+
+def teardown_module(module=None):
+    """Restore the backend that was active before the tests"""
+    set_backend(_previous_backend)
+
 def test_browser_extraction():
     """Test the browser extraction functionality"""
     agent = AIAgent()
@@ -169,6 +183,7 @@ def test_execution_plan():
 
 def main():
     """Run all tests"""
+    setup_module()
     try:
         test_browser_extraction()
         test_file_system_operations()
@@ -179,6 +194,8 @@ def main():
     except Exception as e:
         logger.error(f"Test failed: {str(e)}")
         return 1
+    finally:
+        teardown_module()
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Test script for the indexed, bounded agent history.
+"""
+
+import unittest
+from app import AIAgent
+from history import HistoryStore
+
+def search(query):
+    return {"status": "success", "query": query, "results": [{"title": query}]}
+
+def extraction(extraction_type, step_number=None):
+    return {"status": "success", "action_type": "extraction", "extraction_type": extraction_type,
+            "extracted_content": [], "step_number": step_number}
+
+class TestHistoryStore(unittest.TestCase):
+    def test_latest_by_kind(self):
+        """Test that the newest entry of each kind is found"""
+        history = HistoryStore()
+        history.append({"role": "user", "content": "find news"})
+        history.append(search("solar power"))
+        history.append(extraction("headlines", step_number=2))
+        history.append(search("wind power"))
+
+        self.assertEqual(history.latest("search")["query"], "wind power")
+        self.assertEqual(history.latest("extraction")["extraction_type"], "headlines")
+        self.assertEqual(history.latest("message")["content"], "find news")
+        self.assertIsNone(history.latest("navigation"))
+        self.assertEqual(history.latest_extraction("headlines")["step_number"], 2)
+        self.assertEqual(history.by_step(2)["action_type"], "extraction")
+
+    def test_mark(self):
+        """Test that lookups up to a mark ignore the entries added after it"""
+        history = HistoryStore()
+        history.append(search("solar power"))
+        mark = history.mark()
+        history.append(search("wind power"))
+        self.assertEqual(history.latest("search", until=mark)["query"], "solar power")
+
+    def test_eviction(self):
+        """Test that the oldest entries are evicted from the store and its indexes"""
+        history = HistoryStore(max_entries=3)
+        history.append(extraction("headlines", step_number=1))
+        for query in ("a", "b", "c"):
+            history.append(search(query))
+
+        self.assertEqual(len(history), 3)
+        self.assertIsNone(history.latest("extraction"))
+        self.assertIsNone(history.by_step(1))
+        self.assertEqual([entry["query"] for entry in history], ["a", "b", "c"])
+        self.assertEqual(history.stats()["evicted"], 1)
+
+class TestAgentHistory(unittest.TestCase):
+    def test_save_uses_latest_extraction(self):
+        """Test that "save ... to file" saves the latest extraction"""
+        agent = AIAgent()
+        agent.history.append(dict(extraction("headlines"), extracted_content=[{"headline": "Old news"}]))
+        agent.history.append(dict(extraction("headlines"), extracted_content=[{"headline": "New news"}]))
+        self.assertEqual(agent._latest_result("extraction")["extracted_content"][0]["headline"], "New news")
+
+if __name__ == "__main__":
+    unittest.main()
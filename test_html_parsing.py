@@ -0,0 +1,102 @@
+"""
+Test script for HTML parsing and the parse pool.
+"""
+
+import os
+import unittest
+from html_parsing import PagePreview, ParsePool, declared_charset, decode_html, parse_page, parse_serp
+
+SERP_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "serp", "python_programming_language.html")
+# Result containers with more than one class: <div class="egMi0 kCrYT">
+MULTI_CLASS_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "serp", "basic_layout_electric_cars.html")
+
+class TestHtmlParsing(unittest.TestCase):
+    def setUp(self):
+        with open(SERP_FIXTURE, "rb") as f:
+            self.serp = f.read()
+
+    def test_parse_serp(self):
+        """Test that the organic results are extracted from the raw bytes"""
+        results = parse_serp(self.serp, "utf-8")
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0], {
+            "title": "Welcome to Python.org",
+            "link": "https://www.python.org/",
+            "snippet": "The official home of the Python Programming Language. Python is a programming language that lets you work quickly and integrate systems more effectively."
+        })
+
+    def test_parse_serp_generic_links(self):
+        """Test the fallback to plain links on pages without a known result layout"""
+        html = b'<html><body><a href="https://example.com/a">An example article</a><a href="/local">Local link text</a></body></html>'
+        self.assertEqual(parse_serp(html), [{"title": "An example article", "link": "https://example.com/a",
+                                             "snippet": "No description available"}])
+
+    def test_parse_page(self):
+        page = parse_page(b"<html><head><title>Example</title></head><body><main>Hello world</main></body></html>")
+        self.assertEqual(page, {"title": "Example", "content_preview": "Hello world..."})
+        self.assertIs(type(page["title"]), str)
+
+    def test_targeted_matches_full(self):
+        """Test that the targeted parse extracts the same fields as the full tree"""
+        self.assertEqual(parse_serp(self.serp, "utf-8"), parse_serp(self.serp, "utf-8", mode="full"))
+        page = b"<html><head><title>T</title><script>var a;</script></head><body><p>" + b"word " * 300 + b"</p></body></html>"
+        targeted = parse_page(page)
+        self.assertEqual(targeted, parse_page(page, mode="full"))
+        self.assertEqual(len(targeted["content_preview"]), 503)
+
+    def test_targeted_strainer_keeps_multi_class_containers(self):
+        """Test that result containers with several classes survive the targeted strainer"""
+        with open(MULTI_CLASS_FIXTURE, "rb") as f:
+            serp = f.read()
+        results = parse_serp(serp, "utf-8")
+        self.assertEqual(results, parse_serp(serp, "utf-8", mode="full"))
+        self.assertEqual(results[0]["title"], "Electric car - Wikipedia")
+        self.assertEqual(results[0]["link"], "https://en.wikipedia.org/wiki/Electric_car")
+
+    def test_charset_decoding(self):
+        """Test that the declared charset wins over a <meta> charset, which wins over UTF-8"""
+        self.assertEqual(declared_charset("text/html; charset=ISO-8859-1"), "ISO-8859-1")
+        self.assertIsNone(declared_charset("text/html"))
+        latin = '<meta charset="latin-1"><p>caf\u00e9</p>'.encode("latin-1")
+        self.assertIn("caf\u00e9", decode_html(latin))
+        self.assertIn("caf\u00e9", decode_html("<p>caf\u00e9</p>".encode("utf-8")))
+        self.assertIn("caf\u00e9", decode_html("<p>caf\u00e9</p>".encode("cp1252"), "windows-1252"))
+        self.assertIn("caf", decode_html(b"<p>caf\xe9</p>", "no-such-charset"))
+
+    def test_page_preview_matches_parse_page(self):
+        """Test that the incremental parser fed in small chunks agrees with parse_page"""
+        pages = [
+            b"<html><head><title>T &amp; U</title><script>var a = '<b>';</script></head><body><nav>menu</nav>"
+            b"<main><p>" + "caf\u00e9 ".encode("utf-8") * 300 + b"</p></main></body></html>",
+            b"<html><title></title><body>" + b"word " * 400 + b"<main>late main</main></body></html>",
+            b"<p>no body</p>",
+            self.serp,
+        ]
+        for page in pages:
+            preview = PagePreview()
+            for i in range(0, len(page), 7):
+                preview.feed_bytes(page[i:i + 7])
+            preview.close()
+            self.assertEqual(preview.result(), parse_page(page, mode="full"))
+
+    def test_page_preview_is_done_early(self):
+        page = b"<html><head><title>T</title></head><body><main>" + b"word " * 200 + b"</main>" + b"x" * 100000
+        preview = PagePreview("utf-8")
+        for i in range(0, len(page), 1024):
+            preview.feed_bytes(page[i:i + 1024])
+            if preview.done:
+                break
+        self.assertTrue(preview.done)
+        self.assertLess(preview.bytes_fed, 2048)
+
+    def test_pool_matches_inline(self):
+        """Test that a worker process returns the same fields as an inline parse"""
+        pool = ParsePool(workers=1, timeout=60)
+        try:
+            self.assertEqual(pool.run(parse_serp, self.serp, "utf-8"), parse_serp(self.serp, "utf-8"))
+            self.assertEqual(pool.stats()["pool_parses"], 1)
+        finally:
+            pool.shutdown()
+
+if __name__ == "__main__":
+    unittest.main()
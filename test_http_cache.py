@@ -0,0 +1,136 @@
+"""
+Test script for the HTTP page cache.
+"""
+
+import shutil
+import tempfile
+import unittest
+import requests
+from requests.structures import CaseInsensitiveDict
+from http_cache import HttpCache, freshness, parse_cache_control
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+def make_response(status=200, body="<html>page</html>", headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.url = "https://example.com/page"
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.encoding = "utf-8"
+    response._content = body.encode("utf-8")
+    response._content_consumed = True
+    return response
+
+class Server:
+    """Fake fetch function that records the conditional headers it receives"""
+
+    def __init__(self, headers, body="<html>page</html>"):
+        self.headers = headers
+        self.body = body
+        self.requests = []
+
+    def __call__(self, extra_headers):
+        self.requests.append(dict(extra_headers or {}))
+        etag = self.headers.get("ETag")
+        if etag and (extra_headers or {}).get("If-None-Match") == etag:
+            return make_response(304, "", {"ETag": etag, "Cache-Control": self.headers.get("Cache-Control", "")})
+        return make_response(200, self.body, self.headers)
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_cache(self, **kwargs):
+        return HttpCache(self.tmp_dir, clock=self.clock, **kwargs)
+
+    def test_cache_control_parsing(self):
+        self.assertEqual(parse_cache_control('public, max-age=60, stale-while-revalidate="30"'),
+                         {"public": None, "max-age": "60", "stale-while-revalidate": "30"})
+        self.assertEqual(freshness({"Cache-Control": "max-age=60, stale-while-revalidate=30"}, 0), (60, 30))
+        self.assertEqual(freshness({"Cache-Control": "no-cache, max-age=60"}, 0), (0, 0))
+
+    def test_fresh_pages_are_served_from_the_cache(self):
+        """Test that a page is not fetched again while its max-age lasts"""
+        cache = self.make_cache()
+        server = Server({"Cache-Control": "max-age=60"})
+        self.assertEqual(cache.get("https://example.com/page", server).text, "<html>page</html>")
+        self.clock.now += 30
+        self.assertEqual(cache.get("https://example.com/page", server).text, "<html>page</html>")
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_stale_pages_are_revalidated(self):
+        """Test that a stale page is revalidated with its ETag and a 304 keeps the stored body"""
+        cache = self.make_cache()
+        server = Server({"Cache-Control": "max-age=10", "ETag": '"v1"'})
+        cache.get("https://example.com/page", server)
+        self.clock.now += 20
+        response = cache.get("https://example.com/page", server)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, "<html>page</html>")
+        self.assertEqual(server.requests[1], {"If-None-Match": '"v1"'})
+        stats = cache.stats()
+        self.assertEqual((stats["misses"], stats["revalidations"]), (1, 1))
+        self.assertEqual(stats["revalidation_rate"], 0.5)
+
+        # The 304 renewed the freshness
+        cache.get("https://example.com/page", server)
+        self.assertEqual(len(server.requests), 2)
+
+    def test_no_store(self):
+        cache = self.make_cache()
+        server = Server({"Cache-Control": "no-store", "ETag": '"v1"'})
+        cache.get("https://example.com/page", server)
+        cache.get("https://example.com/page", server)
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used pages are evicted beyond max_bytes"""
+        server = Server({"Cache-Control": "max-age=60"}, body="x" * 1000)
+        cache = self.make_cache(max_bytes=3000)
+        for name in ("a", "b"):
+            cache.get(f"https://example.com/{name}", server)
+        cache.get("https://example.com/a", server)
+        cache.get("https://example.com/c", server)
+
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        requests_before = len(server.requests)
+        cache.get("https://example.com/a", server)
+        self.assertEqual(len(server.requests), requests_before)
+
+    def test_stale_while_revalidate_for_hot_urls(self):
+        """Test that a hot stale page is served at once and revalidated in the background"""
+        cache = self.make_cache(swr_seconds=60, hot_after=2)
+        server = Server({"Cache-Control": "max-age=10", "ETag": '"v1"'})
+        cache.get("https://example.com/page", server)
+        cache.get("https://example.com/page", server)
+        self.clock.now += 20
+
+        response = cache.get("https://example.com/page", server)
+        self.assertEqual(response.text, "<html>page</html>")
+        self.assertEqual(cache.stats()["stale_hits"], 1)
+        cache.close()
+        self.assertEqual(server.requests[-1], {"If-None-Match": '"v1"'})
+        self.assertEqual(cache.stats()["revalidations"], 1)
+
+    def test_pages_survive_restarts(self):
+        server = Server({"Cache-Control": "max-age=60"})
+        self.make_cache().get("https://example.com/page", server)
+        self.make_cache().get("https://example.com/page", server)
+        self.assertEqual(len(server.requests), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Test script for the shared HTTP client.
+"""
+
+import gzip
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http_client import HttpClient
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures_left = 0
+    seen_headers = []
+
+    def do_GET(self):
+        Handler.seen_headers.append(dict(self.headers))
+        if self.path == "/flaky" and Handler.failures_left > 0:
+            Handler.failures_left -= 1
+            self.reply(503, b"busy")
+            return
+        body = b"hello " * 100
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            self.reply(200, gzip.compress(body), {"Content-Encoding": "gzip"})
+        else:
+            self.reply(200, body)
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        Handler.seen_headers = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.client = HttpClient(max_retries=2, backoff_factor=0, user_agent="agent-test/1.0")
+
+    def tearDown(self):
+        self.client.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        """Test that consecutive fetches of one host share a keep-alive connection"""
+        for _ in range(3):
+            self.assertEqual(self.client.get(f"{self.base}/page").status_code, 200)
+        stats = self.client.stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["new_connections"], 1)
+        self.assertEqual(stats["reused_connections"], 2)
+
+    def test_compression_and_user_agent(self):
+        """Test that gzip is negotiated and decoded and the User-Agent is sent"""
+        response = self.client.get(f"{self.base}/page")
+        self.assertEqual(response.text, "hello " * 100)
+        self.assertEqual(Handler.seen_headers[0]["User-Agent"], "agent-test/1.0")
+        self.assertIn("gzip", Handler.seen_headers[0]["Accept-Encoding"])
+
+    def test_transient_errors_are_retried(self):
+        """Test that a 503 is retried and the retry counted"""
+        Handler.failures_left = 1
+        response = self.client.get(f"{self.base}/flaky")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.stats()["retries"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Test script for the asynchronous job API.
+"""
+
+import time
+import threading
+import unittest
+from unittest import mock
+import app as agent_app
+from app import AIAgent
+from jobs import JobManager, JobQueueFull
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def run_two_steps(job):
+    job.record("plan_created", {"execution_steps": [{}, {}]})
+    job.record("step_started", {"step_number": 1, "environment": "terminal", "action": "echo one"})
+    job.record("step_finished", {"step_number": 1, "status": "success"})
+    return {"status": "completed", "results": [{"status": "success"}], "report": "# Report"}
+
+class TestJobManager(unittest.TestCase):
+    def test_job_lifecycle(self):
+        """Test that a job runs in the background and keeps its progress and result"""
+        manager = JobManager(run_two_steps, max_workers=1)
+        job = manager.submit("echo one")
+        self.assertTrue(job.wait(2))
+
+        state = manager.get(job.id).to_dict()
+        self.assertEqual(state["status"], "completed")
+        self.assertEqual(state["progress"]["total_steps"], 2)
+        self.assertEqual(state["progress"]["finished_steps"], 1)
+        self.assertEqual(state["progress"]["steps"][0]["action"], "echo one")
+        self.assertEqual(state["result"]["report"], "# Report")
+
+    def test_runner_errors(self):
+        """Test that an exception in the runner fails the job instead of the worker"""
+        def explode(job):
+            raise RuntimeError("boom")
+        manager = JobManager(explode, max_workers=1)
+        job = manager.submit("anything")
+        job.wait(2)
+        self.assertEqual(job.status, "error")
+        self.assertIn("boom", job.result["message"])
+
+    def test_queue_is_bounded(self):
+        """Test that submissions beyond max_queued are rejected"""
+        release = threading.Event()
+        manager = JobManager(lambda job: release.wait(2) and {"status": "completed"}, max_workers=1, max_queued=1)
+        first = manager.submit("first")
+        deadline = time.time() + 2
+        while first.status != "running" and time.time() < deadline:
+            time.sleep(0.01)
+        manager.submit("second")
+        with self.assertRaises(JobQueueFull):
+            manager.submit("third")
+        release.set()
+        self.assertEqual(manager.stats()["rejected"], 1)
+
+    def test_results_expire(self):
+        """Test that finished jobs are forgotten after the TTL"""
+        clock = FakeClock()
+        manager = JobManager(run_two_steps, max_workers=1, result_ttl=60, clock=clock)
+        job = manager.submit("echo one")
+        job.wait(2)
+        clock.now += 30
+        self.assertIs(manager.get(job.id), job)
+        clock.now += 31
+        self.assertIsNone(manager.get(job.id))
+        self.assertEqual(manager.stats()["expired"], 1)
+
+class TestJobEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.client = agent_app.create_app(validate_api_key=False).test_client()
+
+    def test_submit_and_poll(self):
+        """Test that POST /api/jobs returns at once and the job can be polled to completion"""
+        response = self.client.post("/api/jobs", json={"instruction": "run the command echo hello",
+                                                       "report_mode": "template"})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["job_id"]
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            state = self.client.get(f"/api/jobs/{job_id}").get_json()
+            if state["status"] not in ("queued", "running"):
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(state["status"], "completed")
+        self.assertEqual(state["progress"]["total_steps"], 1)
+        self.assertEqual(state["progress"]["steps"][0]["status"], "success")
+        self.assertIn("## Executive Summary", state["result"]["report"])
+
+    def test_sync_endpoint_waits_for_the_job(self):
+        response = self.client.post("/api/process", json={"instruction": "run the command echo hello",
+                                                          "report_mode": "template"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["status"], "completed")
+
+    def test_sync_endpoint_gives_up_after_the_deadline(self):
+        """Test that /api/process answers 504 with the job id when the job outlives its deadline"""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        slow_plan = lambda agent, instruction: (release.wait(5), {"execution_steps": []})[1]
+        with mock.patch.object(AIAgent, "create_plan", slow_plan), \
+                mock.patch.object(agent_app, "PROCESS_WAIT_MARGIN_SECONDS", 0.1):
+            response = self.client.post("/api/process", json={"instruction": "run the command echo hello",
+                                                              "deadline_seconds": 0.1})
+            self.assertEqual(response.status_code, 504)
+            job_id = response.get_json()["job_id"]
+            self.assertEqual(self.client.get(f"/api/jobs/{job_id}").get_json()["status"], "running")
+            release.set()
+            self.assertTrue(agent_app.job_manager.get(job_id).wait(5))
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get("/api/jobs/missing").status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
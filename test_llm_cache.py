@@ -0,0 +1,75 @@
+"""
+Test script for the Gemini response cache.
+"""
+
+import unittest
+import tempfile
+import shutil
+from llm_cache import LLMResponseCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestLLMResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LLMResponseCache(max_entries=2, ttls={"planning": 60, "report": 10}, clock=self.clock)
+
+    def test_key_depends_on_model_config_and_prompt(self):
+        """Test that the key changes with model name, generation config and prompt"""
+        key = LLMResponseCache.make_key("gemini-1.5-flash", {"temperature": 0.2}, "Hello")
+        self.assertEqual(key, LLMResponseCache.make_key("gemini-1.5-flash", {"temperature": 0.2}, "Hello"))
+        self.assertNotEqual(key, LLMResponseCache.make_key("gemini-1.5-pro", {"temperature": 0.2}, "Hello"))
+        self.assertNotEqual(key, LLMResponseCache.make_key("gemini-1.5-flash", {"temperature": 0.7}, "Hello"))
+        self.assertNotEqual(key, LLMResponseCache.make_key("gemini-1.5-flash", {"temperature": 0.2}, "Hello!"))
+
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted as hits and misses"""
+        self.assertIsNone(self.cache.get("a", "planning"))
+        self.cache.set("a", "planning", "plan text")
+        self.assertEqual(self.cache.get("a", "planning"), "plan text")
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_per_call_type_ttl(self):
+        """Test that entries expire according to the TTL of their call type"""
+        self.cache.set("plan", "planning", "plan text")
+        self.cache.set("report", "report", "report text")
+        self.clock.now += 30
+
+        self.assertEqual(self.cache.get("plan", "planning"), "plan text")
+        self.assertIsNone(self.cache.get("report", "report"))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        self.cache.set("a", "planning", "A")
+        self.cache.set("b", "planning", "B")
+        self.cache.get("a", "planning")
+        self.cache.set("c", "planning", "C")
+
+        self.assertIsNone(self.cache.get("b", "planning"))
+        self.assertEqual(self.cache.get("a", "planning"), "A")
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_disk_tier_survives_restart(self):
+        """Test that a new cache instance reads entries written by a previous one"""
+        cache_dir = tempfile.mkdtemp()
+        try:
+            first = LLMResponseCache(disk_dir=cache_dir, clock=self.clock)
+            first.set("key", "response", "persisted text")
+
+            second = LLMResponseCache(disk_dir=cache_dir, clock=self.clock)
+            self.assertEqual(second.get("key", "response"), "persisted text")
+            self.assertEqual(second.stats()["disk_hits"], 1)
+        finally:
+            shutil.rmtree(cache_dir)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Test script for the Gemini concurrency governor.
+"""
+
+import time
+import threading
+import unittest
+from llm_governor import LLMGovernor, is_retryable
+
+class ResourceExhausted(Exception):
+    code = 429
+
+class TestLLMGovernor(unittest.TestCase):
+    def test_max_concurrency(self):
+        """Test that no more than max_concurrency calls run at once"""
+        governor = LLMGovernor(max_concurrency=2, rate_per_second=0)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+        threads = [threading.Thread(target=governor.call, args=(work,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(governor.stats()["calls"], 6)
+        self.assertEqual(governor.stats()["in_flight"], 0)
+
+    def test_priority_order(self):
+        """Test that waiting planning calls are admitted before report calls"""
+        governor = LLMGovernor(max_concurrency=1, rate_per_second=0)
+        order = []
+        governor.acquire("report")
+
+        def waiter(call_type):
+            governor.call(lambda: order.append(call_type), call_type=call_type)
+
+        report_thread = threading.Thread(target=waiter, args=("report",))
+        report_thread.start()
+        time.sleep(0.05)
+        planning_thread = threading.Thread(target=waiter, args=("planning",))
+        planning_thread.start()
+        time.sleep(0.05)
+        self.assertEqual(governor.stats()["queue_depth"], 2)
+
+        governor.release()
+        report_thread.join()
+        planning_thread.join()
+        self.assertEqual(order, ["planning", "report"])
+
+    def test_retry_with_backoff(self):
+        """Test that 429 errors are retried with backoff and then succeed"""
+        delays = []
+        governor = LLMGovernor(rate_per_second=0, max_retries=3, backoff_base=0.5, sleep=delays.append)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ResourceExhausted("quota exceeded")
+            return "ok"
+
+        self.assertEqual(governor.call(flaky, call_type="planning"), "ok")
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(all(0 <= delay <= 0.5 * 2 ** i for i, delay in enumerate(delays)))
+        self.assertEqual(governor.stats()["retries"], 2)
+
+    def test_non_retryable_errors_are_raised(self):
+        """Test that other errors fail immediately"""
+        governor = LLMGovernor(rate_per_second=0, sleep=lambda seconds: None)
+        with self.assertRaises(ValueError):
+            governor.call(lambda: (_ for _ in ()).throw(ValueError("bad prompt")))
+        self.assertEqual(governor.stats()["failures"], 1)
+        self.assertFalse(is_retryable(ValueError("bad prompt")))
+
+    def test_token_bucket_paces_calls(self):
+        """Test that the token bucket spaces out calls beyond the burst"""
+        governor = LLMGovernor(max_concurrency=4, rate_per_second=20, burst=1)
+        start = time.monotonic()
+        for _ in range(3):
+            governor.call(lambda: None)
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_stream_holds_slot(self):
+        """Test that a stream is yielded through the governor"""
+        governor = LLMGovernor(rate_per_second=0)
+        self.assertEqual(list(governor.stream(lambda: iter(["a", "b"]), call_type="report")), ["a", "b"])
+        self.assertEqual(governor.stats()["in_flight"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+Test script for the local BM25 index.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import app as agent_app
+from app import AIAgent
+from local_index import LocalIndex, tokenize
+
+DOCUMENTS = [
+    ("https://example.com/solar", "Solar power", "Solar panels convert sunlight into electricity. Solar power capacity grew fast."),
+    ("https://example.com/wind", "Wind power", "Wind turbines generate electricity from moving air. Offshore wind farms are growing."),
+    ("https://example.com/python", "Python", "Python is a programming language that lets you work quickly."),
+    ("https://example.com/django", "Django", "Django is a Python web framework for perfectionists with deadlines."),
+    ("https://example.com/cooking", "Pasta", "Boil the pasta in salted water for ten minutes."),
+]
+
+class TestLocalIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # Cleanups run last first, so the indexes are closed before their directory goes
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def make_index(self, **kwargs):
+        index = LocalIndex(self.tmp_dir, **kwargs)
+        self.addCleanup(index.close)
+        return index
+
+    def fill(self, index):
+        for url, title, text in DOCUMENTS:
+            index.add(f"page:{url}", text, url=url, title=title)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("What is the Python 3 language?"), ["python", "language"])
+
+    def test_bm25_ranking(self):
+        index = self.make_index()
+        self.fill(index)
+        hits = index.search("solar electricity")
+        self.assertEqual(hits[0]["url"], "https://example.com/solar")
+        self.assertEqual(hits[1]["url"], "https://example.com/wind")
+        self.assertGreater(hits[0]["score"], hits[1]["score"])
+        self.assertEqual(index.search("quantum chromodynamics"), [])
+
+    def test_buffered_documents_rank_as_flushed_ones(self):
+        """Test that the postings kept for the buffer give the same hits as the flushed segment"""
+        index = self.make_index()
+        self.fill(index)
+        buffered = index.search("python electricity")
+        index.flush()
+        self.assertEqual(index.stats()["buffered"], 0)
+        self.assertEqual(index.search("python electricity"), buffered)
+
+    def test_documents_are_replaced_by_key(self):
+        index = self.make_index()
+        self.fill(index)
+        index.add("page:https://example.com/cooking", "Risotto needs constant stirring.",
+                  url="https://example.com/cooking", title="Risotto")
+        self.assertEqual(index.search("pasta"), [])
+        self.assertEqual(index.search("risotto")[0]["title"], "Risotto")
+        self.assertFalse(index.add("page:https://example.com/cooking", "Risotto needs constant stirring.",
+                                   url="https://example.com/cooking", title="Risotto"))
+        self.assertEqual(index.stats()["documents"], len(DOCUMENTS))
+
+    def test_segments_survive_restarts_and_merge(self):
+        """Test that flushed segments are reloaded and merging drops replaced documents"""
+        index = self.make_index(flush_docs=2, max_segments=100)
+        self.fill(index)
+        index.add("page:https://example.com/solar", "Solar panels on every roof.", url="https://example.com/solar", title="Solar")
+        index.flush()
+        self.assertEqual(index.stats()["segments"], 3)
+
+        reopened = self.make_index()
+        self.assertEqual(reopened.stats()["documents"], len(DOCUMENTS))
+        self.assertEqual(reopened.search("roof")[0]["url"], "https://example.com/solar")
+
+        reopened.merge()
+        stats = reopened.stats()
+        self.assertEqual((stats["segments"], stats["documents"]), (1, len(DOCUMENTS)))
+        self.assertEqual(reopened.search("sunlight"), [])
+        self.assertEqual(self.make_index().search("django")[0]["url"], "https://example.com/django")
+
+    def test_background_merge(self):
+        index = self.make_index(flush_docs=1, max_segments=2)
+        self.fill(index)
+        index._merger.submit(lambda: None).result()
+        self.assertLessEqual(index.stats()["segments"], 2)
+        self.assertGreaterEqual(index.stats()["merges"], 1)
+        self.assertEqual(index.search("pasta")[0]["url"], "https://example.com/cooking")
+
+    def test_old_documents_are_left_out(self):
+        """Test that max_age drops documents added too long ago, unless they were seen again"""
+        clock = FakeClock()
+        index = self.make_index(clock=clock)
+        self.fill(index)
+        clock.now += 7200
+        index.add("page:https://example.com/wind", DOCUMENTS[1][2], url="https://example.com/wind", title="Wind power")
+        self.assertEqual([hit["url"] for hit in index.search("electricity", max_age=3600)], ["https://example.com/wind"])
+        self.assertEqual(len(index.search("electricity")), 2)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+class TestLocalSearchStep(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.index = LocalIndex(self.tmp_dir)
+        self.addCleanup(self.index.close)
+        for url, title, text in DOCUMENTS:
+            self.index.add(f"page:{url}", text, url=url, title=title)
+        # Kept for the test of the scan itself
+        self.index_downloads = agent_app.index_downloads
+        patchers = [mock.patch.object(agent_app, "get_local_index", return_value=self.index),
+                    mock.patch.object(agent_app, "LOCAL_INDEX_MIN_SCORE", 1.0),
+                    mock.patch.object(agent_app, "index_downloads", lambda: None)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_search_is_answered_locally(self):
+        """Test that a search with enough good local hits skips the network"""
+        for i in range(3):
+            self.index.add(f"page:https://example.com/{i}", f"Renewable energy trends report number {i}",
+                           url=f"https://example.com/{i}", title=f"Renewable energy {i}")
+        with mock.patch.object(agent_app, "http_get", side_effect=AssertionError("network used")):
+            result = AIAgent().browser_execution("search for renewable energy trends")
+        self.assertEqual(result["source"], "local_index")
+        self.assertEqual(len(result["results"]), 3)
+        self.assertIn("Renewable energy trends", result["results"][0]["page"]["text"])
+        self.assertIn("local", agent_app.search_latency.stats())
+
+    def test_network_results_are_indexed(self):
+        """Test that a step's search snippets are indexed for the next search"""
+        agent = AIAgent()
+        agent.browser_execution = lambda action: {
+            "status": "success", "query": "wind", "source": "serpapi",
+            "results": [{"title": f"Wind farm {i}", "link": f"https://wind.example/{i}",
+                         "snippet": "Offshore wind farms generate electricity"} for i in range(3)]}
+        agent.execute_step({"step_number": 1, "environment": "browser", "action": "search for offshore wind"})
+        self.assertEqual([hit["url"] for hit in self.index.search("offshore wind farms")][:3],
+                         [f"https://wind.example/{i}" for i in range(3)])
+
+    def test_downloads_are_scanned_when_files_are_added(self):
+        """Test that the downloads directory is only listed again after it changed"""
+        downloads = os.path.join(self.tmp_dir, "downloads")
+        os.makedirs(downloads)
+        with open(os.path.join(downloads, "notes.txt"), "w") as f:
+            f.write("Geothermal heat pumps")
+        os.utime(downloads, (1_700_000_000, 1_700_000_000))
+
+        with mock.patch.object(agent_app.os, "listdir", wraps=os.listdir) as listdir:
+            self.index_downloads(downloads)
+            self.index_downloads(downloads)
+            self.assertEqual(listdir.call_count, 1)
+            with open(os.path.join(downloads, "later.txt"), "w") as f:
+                f.write("Tidal power stations")
+            self.index_downloads(downloads)
+            self.assertEqual(listdir.call_count, 2)
+        self.assertEqual(self.index.search("tidal")[0]["title"], "later.txt")
+
+if __name__ == "__main__":
+    unittest.main()
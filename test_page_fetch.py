@@ -0,0 +1,156 @@
+"""
+Test script for streamed page fetches.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import app as agent_app
+from backends import RecordingBackend, ReplayBackend
+from html_parsing import parse_page
+from http_cache import HttpCache
+
+LARGE_PAGE = (b"<html><head><title>Large page</title></head><body><main><p>" + b"lorem ipsum " * 200
+              + b"</p></main><div>" + b"filler " * 300_000 + b"</div></body></html>")
+NO_MAIN_PAGE = b"<html><head><title>No main</title></head><body><div>" + b"filler " * 300_000 + b"</div></body></html>"
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # (path, If-None-Match) of each request
+    requests = []
+    # Cache-Control sent with the /cached pages
+    cache_control = "max-age=600"
+
+    def do_GET(self):
+        PageHandler.requests.append((self.path, self.headers.get("If-None-Match")))
+        body = NO_MAIN_PAGE if self.path == "/no-main" else LARGE_PAGE
+        if self.path.startswith("/cached") and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if self.path.startswith("/cached"):
+            self.send_header("Cache-Control", self.cache_control)
+            self.send_header("ETag", '"v1"')
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+class TestPageFetch(unittest.TestCase):
+    def setUp(self):
+        PageHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_stops_once_the_preview_is_complete(self):
+        """Test that a streamed fetch stops early and matches a full parse"""
+        page, fetch = agent_app.fetch_page(f"{self.base}/large", timeout=10)
+        self.assertEqual(page, parse_page(LARGE_PAGE, "utf-8", mode="full"))
+        self.assertTrue(fetch["stopped_early"])
+        self.assertLess(fetch["bytes_downloaded"], len(LARGE_PAGE) // 10)
+        self.assertIsNotNone(fetch["ttfb_ms"])
+
+    def test_byte_cap(self):
+        """Test that a page without <main> is read up to the lookahead or the byte cap"""
+        with mock.patch.object(agent_app, "PAGE_FETCH_MAX_BYTES", 32 * 1024):
+            page, fetch = agent_app.fetch_page(f"{self.base}/no-main", timeout=10)
+        self.assertTrue(fetch["truncated"])
+        self.assertLess(fetch["bytes_downloaded"], 100 * 1024)
+        self.assertEqual(page["title"], "No main")
+        self.assertTrue(page["content_preview"].startswith("filler filler"))
+
+    def test_full_mode(self):
+        with mock.patch.object(agent_app, "PAGE_FETCH_MODE", "full"), \
+                mock.patch.object(agent_app, "get_http_cache", return_value=None):
+            page, fetch = agent_app.fetch_page(f"{self.base}/large", timeout=10)
+        self.assertEqual(page["title"], "Large page")
+        self.assertEqual(fetch["bytes_downloaded"], len(LARGE_PAGE))
+
+class TestCachedPageFetch(TestPageFetch):
+    """Streamed fetches through the page cache"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = HttpCache(self.tmp_dir)
+        patcher = mock.patch.object(agent_app, "get_http_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        super().tearDown()
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_fresh_pages_are_not_fetched_again(self):
+        """Test that what a streamed fetch read is served from the cache while fresh"""
+        pages = [agent_app.fetch_page(f"{self.base}/cached", timeout=10) for _ in range(3)]
+        self.assertEqual(len(PageHandler.requests), 1)
+        self.assertEqual([fetch["source"] for _, fetch in pages], ["network", "cache", "cache"])
+        self.assertEqual(pages[1][0], pages[0][0])
+        stats = self.cache.stats()
+        self.assertEqual((stats["stores"], stats["hits"]), (1, 2))
+
+    def test_stale_pages_are_revalidated(self):
+        """Test that a stale stored page is revalidated and a 304 is answered from the cache"""
+        with mock.patch.object(PageHandler, "cache_control", "max-age=0"):
+            first, _ = agent_app.fetch_page(f"{self.base}/cached", timeout=10)
+            page, fetch = agent_app.fetch_page(f"{self.base}/cached", timeout=10)
+        self.assertEqual(PageHandler.requests[1], ("/cached", '"v1"'))
+        self.assertEqual(fetch["source"], "revalidated")
+        self.assertEqual(page, first)
+        self.assertEqual(self.cache.stats()["revalidations"], 1)
+
+    def test_partial_pages_are_not_served_to_full_fetches(self):
+        """Test that the start of a page stored by a streamed fetch is not used as the whole page"""
+        agent_app.fetch_page(f"{self.base}/cached", timeout=10)
+        response = agent_app.http_get(f"{self.base}/cached", timeout=10)
+        self.assertEqual(response.content, LARGE_PAGE)
+        self.assertEqual(PageHandler.requests, [("/cached", None), ("/cached", None)])
+
+    def test_recording_and_replay_skip_the_cache(self):
+        """Test that a recording holds a fetch whose page was cached and a replay serves it from the cassette"""
+        url = f"{self.base}/cached"
+        agent_app.fetch_page(url, timeout=10)
+        cassette = os.path.join(self.tmp_dir, "cassette.json")
+        recorder = RecordingBackend(cassette)
+        with mock.patch.object(agent_app, "get_backend", return_value=recorder):
+            _, fetch = agent_app.fetch_page(url, timeout=10)
+        self.assertEqual(fetch["source"], "network")
+        self.assertEqual(recorder.recorded, 1)
+
+        with mock.patch.object(agent_app, "get_backend", return_value=ReplayBackend(cassette, latency=0)):
+            page, fetch = agent_app.fetch_page(url, timeout=10)
+        self.assertEqual(fetch["source"], "network")
+        self.assertEqual(page["title"], "Large page")
+        self.assertEqual(len(PageHandler.requests), 2)
+        self.assertEqual(self.cache.stats()["hits"], 0)
+
+    def test_longer_previews_fetch_the_page_again(self):
+        """Test that a stored start of a page too short for a longer preview is not used"""
+        with mock.patch.object(agent_app, "PAGE_FETCH_CHUNK_BYTES", 256):
+            agent_app.fetch_page(f"{self.base}/cached", timeout=10, preview_length=100)
+        page, fetch = agent_app.fetch_page(f"{self.base}/cached", timeout=10, preview_length=2000)
+        self.assertEqual(fetch["source"], "network")
+        self.assertEqual(page, parse_page(LARGE_PAGE, "utf-8", mode="full", limit=2000))
+
+if __name__ == "__main__":
+    unittest.main()
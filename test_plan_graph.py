@@ -0,0 +1,166 @@
+"""
+Test script for the plan dependency graph and the parallel plan executor.
+"""
+
+import time
+import threading
+import unittest
+from unittest import mock
+import app as agent_app
+from app import AIAgent
+from plan_graph import plan_dependencies
+
+def step(number, environment, action, **extra):
+    return {"step_number": number, "environment": environment, "action": action, **extra}
+
+class TestPlanDependencies(unittest.TestCase):
+    def test_inferred_dependencies(self):
+        """Test that data dependencies are inferred from the step types"""
+        steps = [
+            step(1, "browser", "search for solar power"),
+            step(2, "browser", "search for wind power"),
+            step(3, "terminal", "python --version"),
+            step(4, "browser", "extract headlines from search results"),
+            step(5, "file_system", "save headlines to file energy.txt"),
+            step(6, "file_system", "create file notes.txt with content hello"),
+            step(7, "file_system", "read file notes.txt"),
+        ]
+        self.assertEqual(plan_dependencies(steps), [set(), set(), set(), {0, 1}, {0, 1, 2, 3}, {2}, {2, 5}])
+
+    def test_critical_steps_are_barriers(self):
+        """Test that nothing after a general_response step starts before it finishes"""
+        steps = [
+            step(1, "browser", "search for solar power"),
+            step(2, "general_response", "respond to query: What is solar power?"),
+            step(3, "browser", "search for wind power"),
+        ]
+        self.assertEqual(plan_dependencies(steps), [set(), set(), {1}])
+
+    def test_explicit_dependencies(self):
+        """Test that depends_on replaces the inferred dependencies"""
+        steps = [
+            step(1, "browser", "search for solar power"),
+            step(2, "browser", "search for wind power", depends_on=[1]),
+            step(3, "browser", "extract headlines from search results", depends_on=[2, 3, 9]),
+        ]
+        self.assertEqual(plan_dependencies(steps), [set(), {0}, {1}])
+
+class FakeStepAgent(AIAgent):
+    """Agent whose environments record what ran and when instead of doing real work"""
+
+    def __init__(self):
+        super().__init__(report_mode="template")
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.seen_queries = {}
+
+    def _work(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+
+    def browser_execution(self, action):
+        self._work()
+        if action.startswith("search for"):
+            return {"status": "success", "query": action[11:], "results": [{"title": action[11:]}]}
+        self.seen_queries[action] = self._latest_result("search")["query"]
+        return {"status": "success", "action_type": "extraction", "extracted_content": []}
+
+    def terminal_execution(self, action):
+        self._work()
+        return {"status": "success", "command": action, "stdout": "", "stderr": "", "return_code": 0}
+
+    def general_response_execution(self, action):
+        self._work()
+        return {"status": "error", "message": "Gemini is unavailable"}
+
+class TestParallelExecution(unittest.TestCase):
+    def test_independent_steps_overlap(self):
+        """Test that independent steps run together and results keep the plan order"""
+        agent = FakeStepAgent()
+        plan = {"execution_steps": [
+            step(1, "browser", "search for solar power"),
+            step(2, "browser", "search for wind power"),
+            step(3, "terminal", "python --version"),
+            step(4, "browser", "extract headlines from search results"),
+        ]}
+        result = agent.execute_plan(plan)
+
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual([r["step_number"] for r in result["results"]], [1, 2, 3, 4])
+        self.assertGreater(agent.max_active, 1)
+        # The extraction sees the latest earlier search, as it would in a sequential run
+        self.assertEqual(agent.seen_queries["extract headlines from search results"], "wind power")
+
+    def test_critical_failure_stops_the_plan(self):
+        """Test that a failed general_response step stops the steps after it"""
+        agent = FakeStepAgent()
+        plan = {"execution_steps": [
+            step(1, "terminal", "echo one"),
+            step(2, "general_response", "respond to query: hello"),
+            step(3, "terminal", "echo three"),
+        ]}
+        events = list(agent.execute_plan_iter(plan))
+        finished = [data["step_number"] for event, data in events if event == "step_finished"]
+        done = events[-1][1]
+
+        self.assertEqual(sorted(finished), [1, 2])
+        self.assertEqual(done["status"], "failed")
+        self.assertEqual(done["message"], "Gemini is unavailable")
+
+    def test_critical_failure_lets_earlier_steps_finish(self):
+        """Test that steps before a failed critical step still run and the report lines up with them"""
+        agent = FakeStepAgent()
+        plan = {"execution_steps": [
+            step(1, "browser", "search for solar power"),
+            step(2, "browser", "extract headlines from search results"),
+            step(3, "general_response", "respond to query: hello"),
+            step(4, "terminal", "echo four"),
+        ]}
+        with mock.patch.object(agent, "_report_iter", return_value=iter(())) as report:
+            events = list(agent.execute_plan_iter(plan))
+        finished = [data["step_number"] for event, data in events if event == "step_finished"]
+
+        self.assertEqual(sorted(finished), [1, 2, 3])
+        self.assertEqual(events[-1][1]["status"], "failed")
+        reported_plan, results, _ = report.call_args.args
+        self.assertEqual([s["step_number"] for s in reported_plan["execution_steps"]], [1, 2, 3])
+        self.assertEqual([r["step_number"] for r in results], [1, 2, 3])
+
+    def test_non_critical_failure_continues(self):
+        """Test that an error in an earlier step does not stop independent later steps"""
+        agent = FakeStepAgent()
+        agent.terminal_execution = lambda action: {"status": "error", "message": f"Command not allowed: {action}"}
+        plan = {"execution_steps": [
+            step(1, "terminal", "rm -rf build"),
+            step(2, "browser", "search for wind power"),
+        ]}
+        events = list(agent.execute_plan_iter(plan))
+        self.assertEqual(len([event for event, _ in events if event == "step_finished"]), 2)
+        self.assertEqual(events[-1][1]["message"], "Command not allowed: rm -rf build")
+
+    def test_plans_do_not_share_step_threads(self):
+        """Test that the steps of concurrent plans do not queue behind each other"""
+        # Each step waits for the other plan's step; a shared single thread would deadlock
+        barrier = threading.Barrier(2, timeout=5)
+        statuses = []
+
+        def run_plan():
+            agent = FakeStepAgent()
+            agent.terminal_execution = lambda action: (barrier.wait(), {"status": "success", "command": action})[1]
+            statuses.append(agent.execute_plan({"execution_steps": [step(1, "terminal", "echo hi")]})["status"])
+
+        with mock.patch.object(agent_app, "PLAN_MAX_PARALLEL_STEPS", 1):
+            threads = [threading.Thread(target=run_plan) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(statuses, ["completed", "completed"])
+
+if __name__ == "__main__":
+    unittest.main()
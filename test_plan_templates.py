@@ -0,0 +1,107 @@
+"""
+Test script for the plan template registry.
+"""
+
+import unittest
+from plan_templates import PlanTemplateRegistry, BUILTIN_TEMPLATES, normalize_instruction
+
+def actions(plan):
+    return [(step["environment"], step["action"]) for step in plan["execution_steps"]]
+
+class TestPlanTemplateRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = PlanTemplateRegistry(BUILTIN_TEMPLATES, max_learned=2)
+
+    def test_builtin_fast_paths(self):
+        """Test that the former hard-coded fast paths are served from templates"""
+        plan, name = self.registry.match("Generate a report on solar power in PDF")
+        self.assertEqual(name, "pdf_report")
+        self.assertEqual(actions(plan), [("general_response", "respond to query: Generate a report on solar power in PDF")])
+
+        self.assertEqual(self.registry.match("List the best phones of the year")[1], "mobile_search")
+        self.assertEqual(self.registry.match("Compare gaming laptops")[1], "laptop_search")
+
+    def test_slots_are_extracted(self):
+        """Test that slot values are captured from the instruction and substituted into the steps"""
+        plan, name = self.registry.match("Search for Rust web frameworks and save the results to rust.txt.")
+        self.assertEqual(name, "search_and_save")
+        self.assertEqual(actions(plan), [
+            ("browser", "search for Rust web frameworks"),
+            ("browser", "extract headlines from search results"),
+            ("file_system", "save headlines to file rust.txt"),
+        ])
+        self.assertEqual(plan["environments_needed"], ["browser", "file_system"])
+
+        plan, name = self.registry.match("search for python tutorials")
+        self.assertEqual(name, "search")
+        self.assertEqual(actions(plan)[0], ("browser", "search for python tutorials"))
+
+    def test_complex_instructions_are_not_matched(self):
+        """Test that multi-part instructions still go to the planning call"""
+        self.assertIsNone(self.registry.match("Search for renewable energy, analyze trends and create a summary"))
+        self.assertEqual(self.registry.stats()["misses"], 1)
+
+    def test_learned_templates(self):
+        """Test that an LLM plan is generalized over its file name and search query"""
+        llm_plan = {
+            "task_analysis": "Collect python news into news.txt",
+            "environments_needed": ["browser", "file_system"],
+            "execution_steps": [
+                {"step_number": 1, "environment": "browser", "action": "search for python news", "expected_outcome": "Results"},
+                {"step_number": 2, "environment": "browser", "action": "summarize the search results", "expected_outcome": "Summary"},
+                {"step_number": 3, "environment": "file_system", "action": "save extracted information as file news.txt", "expected_outcome": "Saved"},
+            ]
+        }
+        instruction = "Gather python news; store in news.txt"
+        self.assertIsNone(self.registry.match(instruction))
+        self.assertIsNotNone(self.registry.learn_plan(instruction, llm_plan))
+
+        plan, name = self.registry.match("Gather golang news; store in go.txt")
+        self.assertTrue(name.startswith("learned:"))
+        self.assertEqual(actions(plan), [
+            ("browser", "search for golang news"),
+            ("browser", "summarize the search results"),
+            ("file_system", "save extracted information as file go.txt"),
+        ])
+        self.assertEqual(plan["task_analysis"], "Collect golang news into go.txt")
+
+        stats = self.registry.stats()
+        self.assertEqual(stats["learned_hits"], 1)
+        self.assertEqual(stats["learned_templates"], 1)
+
+    def test_invalid_plans_are_not_learned(self):
+        """Test that plans with unknown environments or no steps are not cached"""
+        self.assertIsNone(self.registry.learn_plan("do something", {"execution_steps": []}))
+        self.assertIsNone(self.registry.learn_plan("do something", {"execution_steps": [{"environment": "space", "action": "x"}]}))
+
+    def test_bare_topic_plans_are_not_learned(self):
+        """Test that a template that would be nothing but a slot does not capture other instructions"""
+        plan = {"execution_steps": [
+            {"environment": "browser", "action": "search for renewable energy trends"},
+            {"environment": "browser", "action": "extract headlines from search results"},
+        ]}
+        self.assertIsNone(self.registry.learn_plan("renewable energy trends", plan))
+        self.assertIsNone(self.registry.learn_plan("Find renewable energy trends", plan))
+        for instruction in ["Write a poem about cats", "What is the capital of France", "create a pdf file on AI"]:
+            self.assertIsNone(self.registry.match(instruction))
+
+    def test_learned_templates_are_bounded(self):
+        """Test that the least recently used learned template is evicted"""
+        plan = {"execution_steps": [{"environment": "general_response", "action": "respond to query: hi"}]}
+        for instruction in ["first question", "second question", "third question"]:
+            self.registry.learn_plan(instruction, plan)
+        self.assertIsNone(self.registry.match("first question"))
+        self.assertIsNotNone(self.registry.match("third question"))
+
+    def test_time_saved(self):
+        """Test that hits are credited with the average planning time"""
+        self.registry.record_planning(2.0)
+        self.registry.record_planning(4.0)
+        self.registry.match("search for python tutorials")
+        self.assertEqual(self.registry.stats()["planning_seconds_saved"], 3.0)
+
+    def test_normalize_instruction(self):
+        self.assertEqual(normalize_instruction("  search   for x!  "), "search for x")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Test script for the template report engine.
+"""
+
+import unittest
+import app as agent_app
+from report_engine import ReportEngine, choose_report_mode, complexity
+
+ECHO_PLAN = {
+    "task_analysis": "Print a greeting",
+    "execution_steps": [{"step_number": 1, "environment": "terminal", "action": "echo hello", "expected_outcome": "hello"}]
+}
+ECHO_RESULTS = [{"status": "success", "command": "echo hello", "stdout": "hello\n", "stderr": "", "return_code": 0}]
+
+SEARCH_PLAN = {
+    "task_analysis": "Find news",
+    "execution_steps": [
+        {"step_number": 1, "environment": "browser", "action": "search for ai news"},
+        {"step_number": 2, "environment": "browser", "action": "extract headlines from search results"},
+    ]
+}
+SEARCH_RESULTS = [
+    {"status": "success", "query": "ai news", "results": [{"title": f"Story {i}", "link": f"https://example.com/{i}"} for i in range(8)]},
+    {"status": "success", "action_type": "extraction", "extraction_type": "headlines",
+     "extracted_content": [{"headline": "Story 0", "source": "Example"}]},
+]
+
+class TestReportEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = ReportEngine(max_items=5)
+
+    def test_sections(self):
+        """Test that the report has the summary, details and results sections"""
+        report = self.engine.render("Say hello", ECHO_PLAN, ECHO_RESULTS, "completed")
+        for heading in ("## Executive Summary", "## Execution Details", "## Results"):
+            self.assertIn(heading, report)
+        self.assertIn("1 step executed, 1 succeeded", report)
+        self.assertIn("`echo hello` exited with code 0: hello", report)
+
+    def test_environment_templates(self):
+        """Test that browser results are listed and truncated to max_items"""
+        report = self.engine.render("Find AI news", SEARCH_PLAN, SEARCH_RESULTS, "completed")
+        self.assertIn("Story 4 <https://example.com/4>", report)
+        self.assertNotIn("Story 5 <", report)
+        self.assertIn("... 3 more", report)
+        self.assertIn("8 search results for \"ai news\"", report)
+
+    def test_failed_steps(self):
+        """Test that failed steps show their error message"""
+        results = [{"status": "error", "message": "Command not allowed for security reasons: rm"}]
+        report = self.engine.render("Remove files", ECHO_PLAN, results, "failed")
+        self.assertIn("did not complete", report)
+        self.assertIn("Error: Command not allowed", report)
+
+    def test_mode_selection(self):
+        """Test that Gemini writes the report only for analysis requests or complex results"""
+        self.assertEqual(choose_report_mode("auto", "echo hello", ECHO_PLAN, ECHO_RESULTS, 4), "template")
+        self.assertEqual(choose_report_mode("auto", "Analyze the output of echo", ECHO_PLAN, ECHO_RESULTS, 4), "llm")
+        self.assertGreaterEqual(complexity(SEARCH_PLAN, SEARCH_RESULTS), 4)
+        self.assertEqual(choose_report_mode("auto", "find ai news", SEARCH_PLAN, SEARCH_RESULTS, 4), "llm")
+        self.assertEqual(choose_report_mode("template", "Analyze news", SEARCH_PLAN, SEARCH_RESULTS, 4), "template")
+        self.assertEqual(choose_report_mode("llm", "echo hello", ECHO_PLAN, ECHO_RESULTS, 4), "llm")
+
+    def test_agent_skips_report_call(self):
+        """Test that a trivial job gets its report without a Gemini call"""
+        agent = agent_app.AIAgent(report_mode="auto")
+        agent.current_task = "echo hello"
+        agent.task_status = "completed"
+        agent._generate = lambda prompt, call_type: self.fail("the report must not call Gemini")
+
+        events = list(agent._report_iter(ECHO_PLAN, ECHO_RESULTS, stream_report=True))
+        self.assertEqual(events, [("report_token", {"text": agent.report})])
+        self.assertEqual(agent.metrics["report_mode"], "template")
+        self.assertIn("report_seconds", agent.metrics)
+
+    def test_endpoint_rejects_unknown_mode(self):
+        client = agent_app.create_app(validate_api_key=False).test_client()
+        response = client.post("/api/process", json={"instruction": "echo hello", "report_mode": "fancy"})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Test script for the report result digest.
+"""
+
+import json
+import unittest
+from result_digest import ResultDigester
+
+SEARCH_RESULTS = [
+    {"title": f"Result {i}", "link": f"https://example.com/{i}", "snippet": f"Snippet {i}"}
+    for i in range(5)
+]
+
+def sample_steps():
+    return [
+        {"step_number": 1, "step_description": "search for python", "environment": "browser",
+         "result": {"status": "success", "query": "python", "results": SEARCH_RESULTS,
+                    "step_number": 1, "environment": "browser", "action": "search for python"}},
+        {"step_number": 2, "step_description": "extract information", "environment": "browser",
+         "result": {"status": "success", "action_type": "extraction", "extracted_content": [],
+                    "previous_results": SEARCH_RESULTS[:3]}},
+        {"step_number": 3, "step_description": "read file notes.txt", "environment": "file_system",
+         "result": {"status": "success", "action": "read_file", "content": "x" * 5000}},
+    ]
+
+class TestResultDigester(unittest.TestCase):
+    def setUp(self):
+        self.digester = ResultDigester(field_budget=100, max_items=10)
+
+    def test_repeated_search_results_are_sent_once(self):
+        """Test that previous_results copies are replaced by a reference to the original step"""
+        digest = self.digester.digest(sample_steps())
+        self.assertEqual(len(digest[0]["result"]["results"]), 5)
+        self.assertEqual(digest[1]["result"]["previous_results"], [{"same_as_results_of_step": [1]}])
+
+    def test_results_without_identity_are_kept(self):
+        """Test that results without a link, url or title are not taken for repeats of each other"""
+        items = [{"snippet": "First"}, {"snippet": "Second"}]
+        steps = [{"step_number": 1, "step_description": "search", "environment": "browser",
+                  "result": {"status": "success", "results": items}}]
+        self.assertEqual(self.digester.digest(steps)[0]["result"]["results"], items)
+
+    def test_placeholder_links_are_not_identities(self):
+        """Test that results whose link is "#" or empty are told apart by their title"""
+        items = [{"title": "First", "link": "#"}, {"title": "Second", "link": "#"},
+                 {"snippet": "Third", "link": ""}, {"snippet": "Fourth", "link": ""}]
+        steps = [{"step_number": 1, "step_description": "search", "environment": "browser",
+                  "result": {"status": "success", "results": items}}]
+        self.assertEqual(self.digester.digest(steps)[0]["result"]["results"], items)
+
+    def test_large_fields_are_truncated(self):
+        """Test that large text fields are cut to the configured budget"""
+        content = self.digester.digest(sample_steps())[2]["result"]["content"]
+        self.assertTrue(content.startswith("x" * 100))
+        self.assertIn("4900 more characters", content)
+
+    def test_step_fields_are_not_repeated(self):
+        """Test that step information already in the wrapper is dropped from the result"""
+        result = self.digester.digest(sample_steps())[0]["result"]
+        self.assertNotIn("action", result)
+        self.assertNotIn("step_number", result)
+
+    def test_digest_is_smaller_than_raw_dump(self):
+        """Test that the compact serialization is smaller than the indented raw dump"""
+        raw = json.dumps(sample_steps(), indent=2)
+        compact = self.digester.serialize(sample_steps())
+        self.assertLess(len(compact), len(raw) / 3)
+        json.loads(compact)
+
+if __name__ == "__main__":
+    unittest.main()
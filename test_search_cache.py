@@ -0,0 +1,115 @@
+"""
+Test script for the SerpAPI search cache.
+"""
+
+import time
+import threading
+import unittest
+from search_cache import SearchCache, normalize_query
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeSerpApi:
+    """Returns num organic results per call, after a delay, and records the calls"""
+
+    def __init__(self, delay=0.0, available=20):
+        self.delay = delay
+        self.available = available
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, params):
+        with self._lock:
+            self.calls.append(dict(params))
+        time.sleep(self.delay)
+        count = min(params["num"], self.available)
+        return {"organic_results": [{"title": f"{params['q']} {i}"} for i in range(count)]}
+
+class TestSearchCache(unittest.TestCase):
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  "Latest  Mobile Phones 2024" '), "latest mobile phones 2024")
+
+    def test_repeated_and_smaller_searches_are_served_from_the_cache(self):
+        clock = FakeClock()
+        cache = SearchCache(ttl=60, fetch_num=10, clock=clock)
+        serpapi = FakeSerpApi()
+        first = cache.get({"q": "latest laptops 2024", "num": 5, "api_key": "secret"}, serpapi)
+        second = cache.get({"q": "Latest  laptops 2024", "num": 3, "api_key": "other"}, serpapi)
+
+        self.assertEqual(len(first["organic_results"]), 5)
+        self.assertEqual(len(second["organic_results"]), 3)
+        self.assertEqual(len(serpapi.calls), 1)
+        self.assertEqual(serpapi.calls[0]["num"], 10)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+        # More results than were fetched need a new call; an expired entry does too
+        cache.get({"q": "latest laptops 2024", "num": 20}, serpapi)
+        self.assertEqual(len(serpapi.calls), 2)
+        clock.now += 61
+        cache.get({"q": "latest laptops 2024", "num": 5}, serpapi)
+        self.assertEqual(len(serpapi.calls), 3)
+        self.assertEqual(cache.stats()["expired"], 1)
+
+    def test_short_result_lists_are_complete(self):
+        """Test that a query with fewer results than were fetched serves larger requests"""
+        cache = SearchCache(fetch_num=10)
+        serpapi = FakeSerpApi(available=4)
+        cache.get({"q": "rare query", "num": 5}, serpapi)
+        self.assertEqual(len(cache.get({"q": "rare query", "num": 20}, serpapi)["organic_results"]), 4)
+        self.assertEqual(len(serpapi.calls), 1)
+
+    def test_concurrent_identical_searches_share_one_call(self):
+        cache = SearchCache()
+        serpapi = FakeSerpApi(delay=0.2)
+        outcomes = []
+        threads = [threading.Thread(target=lambda: outcomes.append(cache.get({"q": "latest mobile phones 2024", "num": 5}, serpapi)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(serpapi.calls), 1)
+        self.assertEqual(len(outcomes), 5)
+        stats = cache.stats()
+        self.assertEqual((stats["misses"], stats["coalesced"]), (1, 4))
+        # Waiters get their own copies
+        outcomes[0]["organic_results"].clear()
+        self.assertEqual(len(outcomes[1]["organic_results"]), 5)
+
+    def test_errors_are_shared_and_not_cached(self):
+        cache = SearchCache()
+        calls = []
+
+        def failing(params):
+            calls.append(params)
+            raise ConnectionError("quota exceeded")
+
+        with self.assertRaises(ConnectionError):
+            cache.get({"q": "python"}, failing)
+        with self.assertRaises(ConnectionError):
+            cache.get({"q": "python"}, failing)
+        self.assertEqual(len(calls), 2)
+        cache.get({"q": "python"}, lambda params: {"error": "Invalid API key"})
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_bypass_makes_a_call_and_stores_it(self):
+        """Test that a search bypassing the cache is not served from it but refreshes it"""
+        cache = SearchCache()
+        serpapi = FakeSerpApi()
+        cache.get({"q": "python", "num": 5}, serpapi)
+        fresh = cache.get({"q": "python", "num": 5}, lambda params: {"organic_results": [{"title": "fresh"}]},
+                          bypass_cache=True)
+        self.assertEqual(fresh["organic_results"], [{"title": "fresh"}])
+        self.assertEqual(cache.get({"q": "python", "num": 1}, serpapi)["organic_results"], [{"title": "fresh"}])
+        self.assertEqual(len(serpapi.calls), 1)
+        stats = cache.stats()
+        self.assertEqual((stats["bypassed"], stats["hits"], stats["calls"]), (1, 1, 2))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Test script for the single-pass SERP extractor.
+"""
+
+import os
+import glob
+import unittest
+from bs4 import BeautifulSoup
+from html_parsing import parse_serp, select_serp_results
+from serp_extractor import SERP_FIELDS, SERP_LAYOUTS, Rule, SerpExtractor
+
+SERP_FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "serp", "*.html")))
+
+class TestSerpExtractor(unittest.TestCase):
+    def test_matches_the_selector_cascade(self):
+        """Test that the extractor agrees with the cascade on every fixture page and limit"""
+        extractor = SerpExtractor()
+        self.assertGreaterEqual(len(SERP_FIXTURES), 5)
+        for path in SERP_FIXTURES:
+            with open(path, "rb") as f:
+                content = f.read()
+            soup = BeautifulSoup(content, "html.parser", from_encoding="utf-8")
+            for limit in (1, 3, 5, 10):
+                with self.subTest(page=os.path.basename(path), limit=limit):
+                    expected = select_serp_results(soup, limit)
+                    self.assertTrue(expected)
+                    self.assertEqual(extractor.extract(soup, limit), expected)
+                    self.assertEqual(parse_serp(content, "utf-8", limit), expected)
+
+    def test_layouts_are_data(self):
+        """Test that a new layout is picked up from its rules alone"""
+        html = ('<div class="card"><span class="headline">New layout result</span>'
+                '<a href="https://example.com/new">link</a><p class="summary">Summary text</p></div>')
+        soup = BeautifulSoup(html, "html.parser")
+        layouts = SERP_LAYOUTS + [{"name": "cards", "container": "div.card",
+                                   "fields": {**SERP_FIELDS, "title": [".headline"], "snippet": ["p.summary"]}}]
+        self.assertEqual(SerpExtractor(layouts).extract(soup), [
+            {"title": "New layout result", "link": "https://example.com/new", "snippet": "Summary text"}])
+        self.assertEqual(SerpExtractor().extract(soup), [])
+
+    def test_rules(self):
+        rule = Rule("div.g.card")
+        self.assertTrue(rule.matches("div", frozenset({"g", "card", "x"})))
+        self.assertFalse(rule.matches("span", frozenset({"g", "card"})))
+        self.assertTrue(Rule(".st").matches("span", frozenset({"st"})))
+        with self.assertRaises(ValueError):
+            Rule("div > a")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Test script for speculative browser searches.
+"""
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import app as agent_app
+from backends import RecordingBackend, ReplayBackend, set_backend
+from speculation import SpeculationTracker, guess_search_query
+
+def search_plan(query):
+    return {
+        "task_analysis": f"Search for {query}",
+        "environments_needed": ["browser"],
+        "execution_steps": [
+            {"step_number": 1, "environment": "browser", "action": f"search for {query}", "expected_outcome": "Results"},
+            {"step_number": 2, "environment": "browser", "action": "extract headlines from search results", "expected_outcome": "Headlines"}
+        ]
+    }
+
+class TestGuessSearchQuery(unittest.TestCase):
+    def test_queries(self):
+        self.assertEqual(guess_search_query("Find top 5 AI headlines and save to file"), "top 5 AI headlines")
+        self.assertEqual(guess_search_query("Search for renewable energy trends, then write a summary"), "renewable energy trends")
+        self.assertEqual(guess_search_query("What are the latest mobile phones?"), "latest mobile phones")
+        self.assertIsNone(guess_search_query("Create a file notes.txt with content hello"))
+
+class TestSpeculation(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.tracker = SpeculationTracker()
+        self.searches = []
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def search(self, action):
+        self.searches.append(action)
+        time.sleep(0.01)
+        return {"status": "success", "query": action, "results": []}
+
+    def test_matching_step_reuses_result(self):
+        """Test that a plan with the same search reuses the speculative result"""
+        speculation = self.tracker.start(self.executor, "AI headlines", self.search)
+        # The planning call takes longer than the search
+        time.sleep(0.02)
+        self.assertTrue(speculation.resolve(search_plan("the ai headlines")))
+        self.assertIsNone(speculation.claim("extract headlines from search results"))
+        self.assertEqual(speculation.claim("search for headlines AI")["status"], "success")
+
+        stats = self.tracker.stats()
+        self.assertEqual((stats["started"], stats["hits"], stats["misses"]), (1, 1, 0))
+        self.assertGreater(stats["saved_seconds"], 0)
+        self.assertEqual(speculation.info["outcome"], "hit")
+
+    def test_unmatched_plan_discards_result(self):
+        """Test that a plan without the search discards it and counts the wasted work"""
+        speculation = self.tracker.start(self.executor, "AI headlines", self.search)
+        speculation.future.result()
+        self.assertFalse(speculation.resolve(search_plan("machine learning news")))
+        self.assertIsNone(speculation.claim("search for AI headlines"))
+
+        stats = self.tracker.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 1))
+        self.assertGreater(stats["wasted_seconds"], 0)
+
+class TestAgentSpeculation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        cassette = os.path.join(self.tmp_dir, "speculation.json")
+        RecordingBackend(cassette).llm_generate("planning", "plan", lambda: json.dumps(search_plan("AI research labs")))
+        self.previous_backend = set_backend(ReplayBackend(cassette, latency=0))
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_search_runs_once(self):
+        """Test that the planned search step is served by the speculative search"""
+        agent = agent_app.AIAgent(bypass_cache=True)
+        searches = []
+
+        def browser_execution(action):
+            searches.append(action)
+            return {"status": "success", "action_type": "search", "results": []}
+
+        agent.browser_execution = browser_execution
+        plan = agent.create_plan("Find AI research labs, compare their focus areas")
+        result = agent.execute_step(plan["execution_steps"][0])
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(searches, ["search for AI research labs"])
+        self.assertEqual(agent.metrics["speculative_search"]["outcome"], "hit")
+
+    def test_unclaimed_search_is_a_miss(self):
+        """Test that a speculative search the plan never reached is counted as a miss"""
+        agent = agent_app.AIAgent(bypass_cache=True)
+        agent.browser_execution = lambda action: {"status": "success", "action_type": "search", "results": []}
+        # The other test may have taught the registry a template for this instruction
+        with mock.patch.object(agent_app.plan_templates, "match", return_value=None):
+            plan = agent.create_plan("Find AI research labs, compare their focus areas")
+        misses = agent_app.speculation_tracker.stats()["misses"]
+        agent.cancel_token.cancel("test")
+        events = list(agent.execute_plan_iter(plan))
+
+        self.assertEqual(events[-1][1]["status"], "cancelled")
+        self.assertEqual(agent.metrics["speculative_search"]["outcome"], "miss")
+        self.assertEqual(agent_app.speculation_tracker.stats()["misses"], misses + 1)
+
+if __name__ == "__main__":
+    unittest.main()
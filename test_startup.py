@@ -0,0 +1,65 @@
+"""
+Startup-time benchmark for the Autonomous AI Agent.
+Importing app.py and creating the Flask app must stay within a cold-start budget,
+must not import the Gemini client or BeautifulSoup and must not open the page
+cache or the local index.
+"""
+
+import os
+import sys
+import json
+import unittest
+import subprocess
+
+# Seconds allowed for a cold `import app` plus create_app(); override with STARTUP_IMPORT_BUDGET
+IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.5"))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app(validate_api_key=False)
+created = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "create_app_seconds": created - imported,
+    "heavy_modules": [name for name in ("google.generativeai", "bs4") if name in sys.modules],
+    "opened_stores": [name for name in ("_http_cache", "_local_index") if getattr(app, name) is not None],
+}))
+"""
+
+class TestStartup(unittest.TestCase):
+    def run_probe(self):
+        project_dir = os.path.dirname(os.path.abspath(__file__))
+        output = subprocess.run([sys.executable, "-c", PROBE], cwd=project_dir,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(output.returncode, 0, output.stderr)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+    def test_cold_import_budget(self):
+        """Test that a cold import and app creation fit within the startup budget"""
+        timings = self.run_probe()
+        total = timings["import_seconds"] + timings["create_app_seconds"]
+        self.assertLess(total, IMPORT_BUDGET)
+
+    def test_heavy_imports_are_deferred(self):
+        """Test that the Gemini client and BeautifulSoup are not imported at startup"""
+        timings = self.run_probe()
+        self.assertEqual(timings["heavy_modules"], [])
+
+    def test_stores_are_opened_on_first_use(self):
+        """Test that the page cache and the local index are not read from disk at startup"""
+        timings = self.run_probe()
+        self.assertEqual(timings["opened_stores"], [])
+
+    def test_health_before_validation(self):
+        """Test that the health endpoint answers without waiting for the API key check"""
+        import app
+        client = app.create_app(validate_api_key=False).test_client()
+        data = client.get("/api/health").get_json()
+        self.assertEqual(data["status"], "ok")
+        self.assertIn(data["api_key_status"], ["unchecked", "pending", "valid", "invalid"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Test script for the Server-Sent Events endpoint.
+"""
+
+import json
+import unittest
+from unittest import mock
+import app as agent_app
+from app import AIAgent, format_sse
+
+def read_events(chunks):
+    """Yield (event, data) pairs from the chunks of an SSE response"""
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        while "\n\n" in buffer:
+            message, buffer = buffer.split("\n\n", 1)
+            fields = dict(line.split(": ", 1) for line in message.splitlines())
+            yield fields["event"], json.loads(fields["data"])
+
+class TestProcessStream(unittest.TestCase):
+    def setUp(self):
+        self.client = agent_app.create_app(validate_api_key=False).test_client()
+
+    def stream(self, instruction, **options):
+        return self.client.post("/api/process/stream", json={"instruction": instruction, **options}, buffered=False)
+
+    def test_format_sse(self):
+        self.assertEqual(format_sse("done", {"status": "completed"}), 'event: done\ndata: {"status": "completed"}\n\n')
+
+    def test_events_arrive_in_order(self):
+        """Test that the plan, the steps, the report and the result are streamed in order"""
+        response = self.stream("run the command echo hello", report_mode="template")
+        self.assertEqual(response.mimetype, "text/event-stream")
+        events = list(read_events(response.response))
+
+        self.assertEqual([event for event, _ in events],
+                         ["job_created", "plan_created", "step_started", "step_finished", "report_token", "done"])
+        data = dict(events)
+        self.assertEqual(data["plan_created"]["execution_steps"][0]["environment"], "terminal")
+        self.assertEqual(data["step_finished"]["status"], "success")
+        self.assertIn("## Executive Summary", data["report_token"]["text"])
+        self.assertEqual(data["done"]["status"], "completed")
+        self.assertEqual(data["done"]["report"], data["report_token"]["text"])
+        self.assertEqual(agent_app.job_manager.get(data["job_created"]["job_id"]).status, "completed")
+
+    def test_errors_are_sent_as_events(self):
+        """Test that a failure while processing ends the stream with an error event"""
+        with mock.patch.object(AIAgent, "create_plan", side_effect=RuntimeError("planner is down")):
+            events = list(read_events(self.stream("run the command echo hello", report_mode="template").response))
+
+        self.assertEqual([event for event, _ in events], ["job_created", "error"])
+        self.assertEqual(events[-1][1]["status"], "error")
+        self.assertIn("planner is down", events[-1][1]["message"])
+
+    def test_client_disconnect_cancels_the_job(self):
+        """Test that closing the stream cancels the job, so no later step is started"""
+        with mock.patch.object(AIAgent, "terminal_execution", side_effect=AssertionError("step ran")) as run:
+            response = self.stream("run the command echo hello", report_mode="template")
+            events = read_events(response.response)
+            job_id = next(events)[1]["job_id"]
+            self.assertEqual(next(events)[0], "plan_created")
+            response.close()
+
+        job = agent_app.job_manager.get(job_id)
+        self.assertTrue(job.cancel_token.cancelled)
+        self.assertEqual(job.status, "cancelled")
+        self.assertEqual(job.cancel_token.reason, "client disconnected")
+        run.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()